@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+""" This file is part of OctoPNP
+
+    Accuracy and latency check for the coarse-to-fine tray box detection in
+    ImageProcessing.locatePartInBox: compares the part offsets found with
+    box_detection_levels 1 against the full resolution detection on the head
+    camera test images. Higher levels are limited to
+    ImageProcessing.MAX_BOX_DETECTION_LEVELS.
+"""
+
+import glob
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "octoprint_OctoPNP"))
+
+import ImageProcessing
+
+ITERATIONS = 20
+LEVELS = range(ImageProcessing.ImageProcessing.MAX_BOX_DETECTION_LEVELS + 1)
+THRESHOLDS = [150, 180, 200]
+TESTIMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils", "testimages")
+
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+for thresh in THRESHOLDS:
+    for path in sorted(glob.glob(os.path.join(TESTIMAGES, "head*.png"))):
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        results = []
+        for levels in LEVELS:
+            im = ImageProcessing.ImageProcessing(15.0, 120, thresh, levels)
+            im._debug = False
+            times = []
+            for i in range(ITERATIONS):
+                start_time = time.time()
+                offset = im.locatePartInBox(img, True)
+                times.append(time.time() - start_time)
+            results.append((offset, median(times)))
+
+        print("%s (%dx%d), threshold %d" % (path, img.shape[1], img.shape[0], thresh))
+        reference = results[0][0]
+        for levels, (offset, duration) in zip(LEVELS, results):
+            if offset and reference:
+                error = max(abs(offset[0] - reference[0]), abs(offset[1] - reference[1]))
+                print("    levels %d: %.2fms, offset [%.3f, %.3f], deviation %.3fmm"
+                      % (levels, duration * 1000, offset[0], offset[1], error))
+            else:
+                print("    levels %d: %.2fms, offset %s" % (levels, duration * 1000, offset))
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+""" This file is part of OctoPNP
+
+    Benchmark for the contour filtering in ImageProcessing._boundingBoxOfContours:
+    compares the former per contour minAreaRect loop with the bulk prefilter on
+    the head camera test images, with and without salt and pepper noise that
+    produces thousands of small contours. The resulting boxes must be identical.
+"""
+
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "octoprint_OctoPNP"))
+
+import ImageProcessing
+
+ITERATIONS = 20
+NOISE = [0.0, 0.01, 0.05]
+TESTIMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils", "testimages")
+
+
+# the implementation used before the bulk prefilter was introduced
+def legacyBoundingBoxOfContours(contours, shape, min_area_factor, max_area_factor):
+    minArea = shape[0] * shape[1] * min_area_factor
+    maxArea = shape[0] * shape[1] * max_area_factor
+    rectPoints = []
+    for contour in contours:
+        rect = cv2.minAreaRect(contour)
+        rectArea = rect[1][0] * rect[1][1]
+        if(rectArea > minArea and rectArea < maxArea):
+            box = ImageProcessing._boxPoints(rect)
+            for point in box:
+                rectPoints.append(np.array(point, dtype=np.int32))
+    if (len(rectPoints) >= 4):
+        return cv2.minAreaRect(np.array(rectPoints))
+    return False
+
+
+def median(values):
+    return sorted(values)[len(values) // 2]
+
+
+im = ImageProcessing.ImageProcessing(15.0, 150, 150)
+im._debug = False
+random = np.random.RandomState(0)
+
+for path in sorted(glob.glob(os.path.join(TESTIMAGES, "head*.png"))):
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    gray_img = cv2.blur(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), (3,3))
+    ret, binary_img = cv2.threshold(gray_img, im.head_binary_thresh, 255, cv2.THRESH_BINARY)
+
+    for noise in NOISE:
+        noisy_img = binary_img.copy()
+        noisy_img[random.random_sample(noisy_img.shape) < noise / 2] = 0
+        noisy_img[random.random_sample(noisy_img.shape) < noise / 2] = 255
+        contours = im._findContours(img, im.head_binary_thresh, noisy_img.copy())
+
+        legacy_times = []
+        for i in range(ITERATIONS):
+            start_time = time.time()
+            legacy_rect = legacyBoundingBoxOfContours(contours, noisy_img.shape, 0.6, 0.95)
+            legacy_times.append(time.time() - start_time)
+
+        times = []
+        for i in range(ITERATIONS):
+            start_time = time.time()
+            rect, accepted = im._boundingBoxOfContours(img, contours, noisy_img.shape, 0.6, 0.95)
+            times.append(time.time() - start_time)
+        assert rect == legacy_rect
+
+        print("%s, %.0f%% noise, %d contours: legacy %.2fms, prefiltered %.2fms"
+              % (path, noise * 100, len(contours), median(legacy_times) * 1000, median(times) * 1000))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+""" This file is part of OctoPNP
+
+    Peak memory of the layer coordinates extracted by GCode_processor: generates
+    a large gcode file with dense layers and extracts the XY moves of every layer
+    once as lists of Coordinate objects (former storage, with and without
+    __slots__), as float64 and as float32 (N, 2) arrays. Every variant runs in a
+    fresh interpreter, the reported value is the growth of the peak resident set
+    size over a run which only reads the file.
+
+        python benchmarks/CoordinateMemoryBenchmark.py [layers] [moves per layer]
+"""
+
+import array
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "octoprint_OctoPNP"))
+
+import GCode_processor
+
+LAYERS = 100
+MOVES_PER_LAYER = 10000
+Z_STEPPING = 0.25
+VARIANTS = ["read", "objects", "slots", "float64", "float32"]
+
+
+# Coordinate before it used __slots__
+class LegacyCoordinate:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def generate(path, layers, moves):
+    random.seed(layers)
+    with open(path, "w") as f:
+        f.write("G28\nG90\n")
+        for layer in range(1, layers + 1):
+            f.write("T0\nG1 Z%.2f F3000\n" % (layer * Z_STEPPING))
+            for i in range(moves):
+                f.write("G1 X%.3f Y%.3f E%.5f\n" % (random.uniform(0, 200), random.uniform(0, 200), i * 0.01))
+
+
+# single pass over the file, the coordinates of each layer are collected with add(bucket, x, y)
+def collect(path, newBucket, add):
+    layers = {}
+    bucket = None
+    for line in open(path, "r"):
+        if line.startswith("G1 X"):
+            xy_values = GCode_processor.xyPattern.match(line)
+            if xy_values != None and bucket is not None:
+                add(bucket, float(xy_values.group(1)), float(xy_values.group(2)))
+        elif line.startswith("G1 Z"):
+            z_values = GCode_processor.zPattern.match(line)
+            if z_values != None:
+                bucket = layers.setdefault(float(z_values.group(1)), newBucket())
+    return layers
+
+
+def extend(bucket, x, y):
+    bucket.append(x)
+    bucket.append(y)
+
+
+def run(variant, path):
+    if variant == "read":
+        collect(path, lambda: None, lambda bucket, x, y: None)
+    elif variant == "objects":
+        layers = collect(path, list, lambda bucket, x, y: bucket.append(LegacyCoordinate(x, y)))
+    elif variant == "slots":
+        layers = collect(path, list, lambda bucket, x, y: bucket.append(GCode_processor.Coordinate(x, y)))
+    elif variant == "float64":
+        layers = collect(path, lambda: array.array('d'), extend)
+    elif variant == "float32":
+        extractor = GCode_processor.CameraGCodeExtraction(Z_STEPPING, "T0")
+        extractor.extractCameraGCode(extractor.openFiles(path))
+        layers = extractor.getCoordList()
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+if len(sys.argv) == 4 and sys.argv[1] == "--variant":
+    print(run(sys.argv[2], sys.argv[3]))
+    sys.exit(0)
+
+layers = int(sys.argv[1]) if len(sys.argv) > 1 else LAYERS
+moves = int(sys.argv[2]) if len(sys.argv) > 2 else MOVES_PER_LAYER
+directory = tempfile.mkdtemp()
+try:
+    path = os.path.join(directory, "generated.gcode")
+    generate(path, layers, moves)
+    print("%d layers, %d points, %.1fMB" % (layers, layers * moves, os.path.getsize(path) / (1024.0 * 1024.0)))
+
+    baseline = None
+    for variant in VARIANTS:
+        start_time = time.time()
+        peak = int(subprocess.check_output([sys.executable, os.path.abspath(__file__), "--variant", variant, path]))
+        duration = time.time() - start_time
+        if baseline is None:
+            baseline = peak
+            print("%-8s peak %7dkB, %.2fs" % (variant, peak, duration))
+        else:
+            print("%-8s peak %7dkB, +%7dkB for the coordinates, %.2fs" % (variant, peak, peak - baseline, duration))
+finally:
+    shutil.rmtree(directory)
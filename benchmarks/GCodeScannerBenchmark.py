@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+""" This file is part of OctoPNP
+
+    Benchmark of the camera gcode extraction in GCode_processor: generates gcode
+    files with two extruders and a growing number of layers and compares the
+    single pass scanner streaming the file (extractCameraGCode) with the former
+    extraction, which loaded the file with readlines() and rescanned all lines
+    for every Z value. Checks that both find the same coordinates and reports
+    the duration and the growth of the peak resident set size.
+"""
+
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "octoprint_OctoPNP"))
+
+import GCode_processor
+
+LAYERS = [10, 50, 200]
+MOVES_PER_LAYER = 250
+Z_STEPPING = 0.25
+
+
+def generate(path, layers):
+    random.seed(layers)
+    with open(path, "w") as f:
+        f.write("G28\nG90\n")
+        for layer in range(1, layers + 1):
+            z = layer * Z_STEPPING
+            for extruder, moves in [("T0", MOVES_PER_LAYER), ("T1", MOVES_PER_LAYER // 5)]:
+                f.write(extruder + "\n")
+                f.write("G1 Z%.2f F3000\n" % z)
+                for i in range(moves):
+                    f.write("G1 X%.3f Y%.3f E%.5f\n" % (random.uniform(0, 200), random.uniform(0, 200), i * 0.01))
+                f.write("G1 E-1 F2400\n")
+
+
+# extraction as implemented before the single pass scanner
+def legacyExtraction(path):
+    extractor = GCode_processor.CameraGCodeExtraction(Z_STEPPING, "T0")
+    gcode = open(path, "r")
+    Data = gcode.readlines()
+    gcode.close()
+    for z in extractor.findAllZValues(Data):
+        extractor.Z_layer = z
+        extractor.findAllGCodesInLayer(Data)
+    return extractor.getCoordList()
+
+
+def streamingExtraction(path):
+    extractor = GCode_processor.CameraGCodeExtraction(Z_STEPPING, "T0")
+    extractor.extractCameraGCode(extractor.openFiles(path))
+    return extractor.getCoordList()
+
+
+def run(function, path):
+    memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start_time = time.time()
+    result = function(path)
+    duration = time.time() - start_time
+    return result, duration, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - memory
+
+
+def coordinates(layers):
+    return [layer.tolist() for layer in layers]
+
+
+directory = tempfile.mkdtemp()
+try:
+    for layers in LAYERS:
+        path = os.path.join(directory, "generated_%d.gcode" % layers)
+        generate(path, layers)
+        size = os.path.getsize(path) / (1024.0 * 1024.0)
+
+        # the streaming extraction runs first, the peak memory only grows
+        streamed, streamed_duration, streamed_memory = run(streamingExtraction, path)
+        legacy, legacy_duration, legacy_memory = run(legacyExtraction, path)
+
+        print("%4d layers, %5.1fMB: single pass %7.3fs (+%6dkB peak), rescan per layer %7.3fs (+%6dkB peak), %s"
+              % (layers, size, streamed_duration, streamed_memory, legacy_duration, legacy_memory,
+                 "identical" if coordinates(streamed) == coordinates(legacy) else "DIFFERENT"))
+        os.remove(path)
+finally:
+    shutil.rmtree(directory)
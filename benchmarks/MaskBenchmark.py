@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+""" This file is part of OctoPNP
+
+    Benchmark for ImageProcessing._maskBackground on the bed camera test images:
+    compares latency and per-call allocations of the former implementation,
+    which allocated all intermediate images for every call, with the cached
+    corner masks and scratch buffers.
+"""
+
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "octoprint_OctoPNP"))
+
+import ImageProcessing
+
+ITERATIONS = 50
+TESTIMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils", "testimages")
+
+
+# the implementation used before the mask buffers were introduced,
+# returns the mask and the number of bytes allocated for intermediate images
+def legacyMaskBackground(im, img):
+    h,w,c = np.shape(img)
+    blur_img=cv2.blur(img, (5,5))
+    hsv = cv2.cvtColor(blur_img, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, im.lower_mask_color, im.upper_mask_color)
+    circle_mask = np.zeros((h, w), np.uint8)
+    circle_mask[:, :] = 255
+    cv2.circle(circle_mask,(w//2, h//2), min(w//2, h//2), 0, -1)
+    result = cv2.bitwise_or(mask,circle_mask)
+    return result, blur_img.nbytes + hsv.nbytes + mask.nbytes + circle_mask.nbytes + result.nbytes
+
+
+def percentile(values, p):
+    return sorted(values)[int(round((len(values) - 1) * p / 100.0))]
+
+
+im = ImageProcessing.ImageProcessing(15.0, 120, 120)
+im._debug = False
+
+for path in sorted(glob.glob(os.path.join(TESTIMAGES, "*bed*.png"))):
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+
+    legacy_times = []
+    for i in range(ITERATIONS):
+        start_time = time.time()
+        legacy_mask, allocated = legacyMaskBackground(im, img)
+        legacy_times.append(time.time() - start_time)
+
+    # first call allocates the buffers for this resolution
+    mask = im._maskBackground(img)
+    buffers = im._getMaskBuffers(img.shape[0], img.shape[1])
+    buffer_bytes = buffers.blur.nbytes + buffers.hsv.nbytes + buffers.mask.nbytes + buffers.corners.nbytes
+    assert (mask == legacy_mask).all()
+
+    times = []
+    for i in range(ITERATIONS):
+        start_time = time.time()
+        im._maskBackground(img)
+        times.append(time.time() - start_time)
+
+    print("%s (%dx%d)" % (path, img.shape[1], img.shape[0]))
+    print("    legacy:   p50 %.2fms, p95 %.2fms, %.1f MB allocated per call"
+          % (percentile(legacy_times, 50) * 1000, percentile(legacy_times, 95) * 1000, allocated / 1e6))
+    print("    buffered: p50 %.2fms, p95 %.2fms, %.1f MB allocated once per resolution"
+          % (percentile(times, 50) * 1000, percentile(times, 95) * 1000, buffer_bytes / 1e6))
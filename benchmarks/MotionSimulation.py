@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+""" This file is part of OctoPNP
+
+    Offline check of the MotionPlanner: generates the moves for the placement of
+    one part (camera to tray box, pick, bed camera, align, place) and counts the
+    moves and estimates the travel time from the emitted gcode. Compares the
+    former fixed move sequence with the planner with and without safe travel height.
+"""
+
+import collections
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "octoprint_OctoPNP"))
+
+import MotionPlanner
+
+# same fields as PnpSettings.MotionSettings
+MotionSettings = collections.namedtuple("MotionSettings", ["xy_feedrate", "z_feedrate", "approach_feedrate", "e_feedrate",
+                                                           "safe_z", "z_hop"])
+
+FEEDRATE = 4000.0
+CAMERA = [30.0, 40.0, 25.0]     # head camera above the tray box
+PICK = [62.0, 38.0, 3.0]        # vacuum nozzle at the part
+BED_CAMERA = [150.0, 10.0, 5.0]
+PLACE = [110.0, 120.0, 4.0]
+ROTATION = 90.0
+
+
+# the moves of one part as generated before the MotionPlanner
+def legacyPlacement():
+    commands = ["T0", "G91", "G1 Z5 F" + str(FEEDRATE), "G90",
+                "G1 X" + str(CAMERA[0]) + " Y" + str(CAMERA[1]) + " F" + str(FEEDRATE),
+                "G1 Z" + str(CAMERA[2]) + " F" + str(FEEDRATE)]
+    # pick
+    commands += ["T2", "G1 X" + str(PICK[0]) + " Y" + str(PICK[1]) + " F" + str(FEEDRATE),
+                 "G1 Z" + str(PICK[2]+10),
+                 "G1 Z" + str(PICK[2]) + " F1000",
+                 "G1 Z" + str(PICK[2]+5) + " F1000"]
+    # bed camera
+    commands += ["G1 X" + str(BED_CAMERA[0]) + " Y" + str(BED_CAMERA[1]) + " F" + str(FEEDRATE),
+                 "G1 Z" + str(BED_CAMERA[2]) + " F" + str(FEEDRATE)]
+    # align
+    commands += ["G92 E0", "G1 E" + str(ROTATION) + " F" + str(FEEDRATE)]
+    # place
+    commands += ["G1 Z" + str(PLACE[2]+10) + " F" + str(FEEDRATE),
+                 "G1 X" + str(PLACE[0]) + " Y" + str(PLACE[1]) + " F" + str(FEEDRATE),
+                 "G1 Z" + str(PLACE[2]),
+                 "G1 Z" + str(PLACE[2]+10) + " F" + str(FEEDRATE)]
+    return commands
+
+
+def placement(planner):
+    commands = planner.toolChange(0) + planner.travel(*CAMERA)
+    commands += planner.toolChange(2) + planner.travel(PICK[0], PICK[1], PICK[2]+10)
+    commands += planner.approach(PICK[2]) + planner.approach(PICK[2]+5)
+    commands += planner.travel(*BED_CAMERA)
+    commands += planner.rotate(ROTATION)
+    commands += planner.travel(PLACE[0], PLACE[1], PLACE[2]+10) + planner.approach(PLACE[2])
+    commands += planner.travel(PLACE[0], PLACE[1], PLACE[2]+10)
+    return commands
+
+
+def report(name, planner, commands):
+    moves, duration = planner.estimate(commands)
+    print("%-36s %2d lines, %2d moves, %.2fs" % (name, len(commands), moves, duration))
+
+
+profile = MotionSettings(FEEDRATE, FEEDRATE, 1000.0, FEEDRATE, 0.0, 5.0)
+report("legacy", MotionPlanner.MotionPlanner(profile), legacyPlacement())
+report("planner, no safe height", MotionPlanner.MotionPlanner(profile), placement(MotionPlanner.MotionPlanner(profile)))
+
+profile = MotionSettings(FEEDRATE, 1000.0, 1000.0, FEEDRATE, 20.0, 5.0)
+report("planner, safe height 20mm, Z 1000", MotionPlanner.MotionPlanner(profile), placement(MotionPlanner.MotionPlanner(profile)))
+
+profile = MotionSettings(FEEDRATE, FEEDRATE, 1000.0, FEEDRATE, 20.0, 5.0)
+report("planner, safe height 20mm, Z 4000", MotionPlanner.MotionPlanner(profile), placement(MotionPlanner.MotionPlanner(profile)))
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+""" This file is part of OctoPNP
+
+    Micro-benchmark for SmdParts: compares the former XPath lookups with the
+    index built at load time for boards with 10, 1k and 50k parts.
+"""
+
+import os
+import random
+import sys
+import time
+import xml.etree.cElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "octoprint_OctoPNP"))
+
+import SmdParts
+
+LOOKUPS = 200
+
+
+def createXml(count):
+    parts = []
+    for i in range(1, count + 1):
+        parts.append(
+            '<part id="%d" name="R%d"><position box="%d"/><size height="0.5"/>'
+            '<shape><point x="-1.6" y="-0.8"/><point x="-1.6" y="0.8"/><point x="1.6" y="0.8"/><point x="1.6" y="-0.8"/></shape>'
+            '<pads><pad x1="-1.9" y1="-0.8" x2="-1.1" y2="0.8"/><pad x1="1.1" y1="-0.8" x2="1.9" y2="0.8"/></pads>'
+            '<destination x="%f" y="%f" z="2.75" orientation="90"/></part>'
+            % (i, i, i % 25 + 1, random.uniform(0, 200), random.uniform(0, 200)))
+    return '<object name="benchmark">' + "".join(parts) + '</object>'
+
+
+# the XPath based getters used before the index was introduced
+def xpathLookup(et, partnr):
+    part = "./part[@id='" + str(partnr) + "']"
+    int(et.find(part + "/position").get("box"))
+    float(et.find(part + "/size").get("height"))
+    [[float(elem.get("x")), float(elem.get("y"))] for elem in et.find(part + "/shape")]
+    [[float(elem.get(a)) for a in ["x1", "y1", "x2", "y2"]] for elem in et.find(part + "/pads")]
+    [float(et.find(part + "/destination").get(a)) for a in ["x", "y", "z", "orientation"]]
+
+
+def indexLookup(parts, partnr):
+    parts.getPartPosition(partnr)
+    parts.getPartHeight(partnr)
+    parts.getPartShape(partnr)
+    parts.getPartPads(partnr)
+    parts.getPartDestination(partnr)
+
+
+for count in [10, 1000, 50000]:
+    xml = createXml(count)
+    sample = [random.randint(1, count) for i in range(LOOKUPS)]
+
+    start_time = time.time()
+    et = ET.fromstring(xml)
+    parse_time = time.time() - start_time
+    start_time = time.time()
+    for partnr in sample:
+        xpathLookup(et, partnr)
+    xpath_time = (time.time() - start_time) / LOOKUPS
+
+    start_time = time.time()
+    parts = SmdParts.SmdParts()
+    parts.load(xml)
+    load_time = time.time() - start_time
+    start_time = time.time()
+    for partnr in sample:
+        indexLookup(parts, partnr)
+    index_time = (time.time() - start_time) / LOOKUPS
+
+    print("%6d parts: xpath load %.3fs, %.1fus/part | indexed load %.3fs, %.1fus/part | full UI refresh %.3fs vs %.3fs"
+          % (count, parse_time, xpath_time * 1e6, load_time, index_time * 1e6,
+             xpath_time * count, index_time * count))
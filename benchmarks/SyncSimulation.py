@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+""" This file is part of OctoPNP
+
+    Simulated printer for the synchronization of the pick and place process:
+    loads the parts of utils/testfile_short.gcode into the plugin and places
+    them through the plugin's gcode queuing, sending and received hooks. The
+    printer processes every sent line in LINE_TIME, executes the dwells and
+    answers M114 with a position report. Moves take no time, they are the same
+    for all variants. The camera images are replayed from utils/testimages.
+
+    Compares the M400 / G4 P1 padding with the position report (M400 + M114)
+    at the same dwell settings, so the difference is the saving of the
+    synchronization alone, and shows the share of the settle dwell.
+"""
+
+import collections
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import octoprint.plugin
+import octoprint_OctoPNP
+
+# round trip of a command until the "ok" is received, serial transfer and parsing (s)
+LINE_TIME = 0.005
+
+# wall clock limit for the placement of all parts (s)
+TIMEOUT = 120
+
+UTILS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils")
+GCODE_FILE = os.path.join(UTILS, "testfile_short.gcode")
+HEAD_IMAGES = os.path.join(UTILS, "testimages", "head_resistor_1206.png")
+BED_IMAGES = os.path.join(UTILS, "testimages", "orientation_bed_resistor_1206_green.png")
+
+# mode, settle dwell in ms
+VARIANTS = [("padding", 1000), ("position", 1000), ("position", 0)]
+
+DWELL = re.compile(r"G4 ([PS])(\d+)")
+SYNC_LINES = ("M400", "M114", "G4 P1")
+
+
+# settings of the plugin as stored by OctoPrint, starting from the defaults
+class SimulatedSettings():
+
+    def __init__(self, values):
+        self._values = values
+
+    def get(self, path):
+        value = self._values
+        for key in path:
+            value = value[key]
+        return value
+
+
+# plugin messages for the UI are discarded, the simulation runs without OctoPrint server
+class SimulatedPluginManager():
+
+    def send_plugin_message(self, plugin, message):
+        pass
+
+
+# executes the commands like octoprint and a printer with an empty planner would,
+# all commands pass the gcode hooks of the plugin
+class SimulatedPrinter():
+
+    def __init__(self, plugin):
+        self._plugin = plugin
+        self._queue = collections.deque()
+        self.paused = False
+        self.time = 0.0
+        self.dwell = 0.0
+        self.lines = 0
+        self.sync_lines = 0
+
+    def commands(self, commands, tags = None):
+        if not isinstance(commands, list):
+            commands = [commands]
+        for cmd in commands:
+            if self._plugin.hook_gcode_queuing(None, "queuing", cmd, None, cmd.split(" ")[0], tags = tags) == (None,):
+                continue
+            self._queue.append((cmd, tags))
+
+    def is_printing(self):
+        return not self.paused
+
+    def is_paused(self):
+        return self.paused
+
+    def pause_print(self):
+        self.paused = True
+
+    def resume_print(self):
+        self.paused = False
+
+    # process the next command, returns False if the queue is empty
+    def step(self):
+        if not self._queue:
+            return False
+        cmd, tags = self._queue.popleft()
+        if self._plugin.hook_gcode_sending(None, "sending", cmd, None, cmd.split(" ")[0], tags = tags) == (None,):
+            return True
+
+        self.lines += 1
+        self.time += LINE_TIME
+        if cmd.startswith(SYNC_LINES):
+            self.sync_lines += 1
+        match = DWELL.match(cmd)
+        if match:
+            duration = int(match.group(2)) / (1000.0 if match.group(1) == "P" else 1.0)
+            self.time += duration
+            if cmd != "G4 P1":
+                self.dwell += duration
+        if cmd.startswith("M114"):
+            self._plugin.hook_gcode_received(None, "X:0.00 Y:0.00 Z:0.00 E:0.00 Count X:0 Y:0 Z:0")
+        return True
+
+
+def simulate(mode, settle_dwell, data_folder):
+    octoprint_OctoPNP.__plugin_load__()
+    plugin = octoprint_OctoPNP.__plugin_implementation__
+
+    values = plugin.get_settings_defaults()
+    values["sync"]["mode"] = mode
+    values["sync"]["settle_dwell"] = settle_dwell
+    for camera, device in [("head", HEAD_IMAGES), ("bed", BED_IMAGES)]:
+        values["camera"][camera]["backend"] = "replay"
+        values["camera"][camera]["device"] = device
+
+    printer = SimulatedPrinter(plugin)
+    plugin._printer = printer
+    plugin._settings = SimulatedSettings(values)
+    plugin._logger = logging.getLogger("octoprint.plugins.OctoPNP")
+    plugin.get_plugin_data_folder = lambda: data_folder
+    octoprint.plugin.plugin_manager = lambda *args, **kwargs: SimulatedPluginManager()
+    plugin.on_after_startup()
+    plugin.on_event("FileSelected", dict(file = GCODE_FILE))
+
+    parts = plugin.smdparts.getPartCount()
+    pending = ["M361 P" + str(partnr) for partnr in range(1, parts + 1)]
+    deadline = time.time() + TIMEOUT
+    while time.time() < deadline:
+        if printer.step():
+            continue
+        if printer.paused or plugin._state != plugin.STATE_NONE:
+            # waiting for the vision worker
+            time.sleep(0.001)
+        elif pending:
+            printer.commands(pending.pop(0))
+        else:
+            break
+    else:
+        print("%s: placement did not finish within %ds" % (mode, TIMEOUT))
+    return parts, printer
+
+
+logging.basicConfig(level = logging.WARNING)
+data_folder = tempfile.mkdtemp()
+try:
+    for mode, settle_dwell in VARIANTS:
+        parts, printer = simulate(mode, settle_dwell, data_folder)
+        print("%-8s sync, %4dms settle dwell: %3d lines (%3d for the sync) %.3fs, %.3fs dwell, %.3fs per part"
+              % (mode, settle_dwell, printer.lines, printer.sync_lines, printer.time, printer.dwell, printer.time / parts))
+finally:
+    shutil.rmtree(data_folder)
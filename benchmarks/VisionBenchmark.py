@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+""" This file is part of OctoPNP
+
+    Headless accuracy and latency benchmark of the image processing: runs
+    locatePartInBox on the head camera test images and getPartOrientation and
+    getPartPosition on the bed camera test images in utils/testimages, together
+    with synthetically shifted and rotated variants of every image.
+
+    The expected values of every test image were measured by hand on the images
+    (part corners and center, long edge for the orientation) and compared with
+    the annotated results. The expected value of a variant follows from its
+    transformation: the part offset in the tray box does not change when the
+    whole head image is shifted, on the bed image a shift moves the part by the
+    shift in mm and a rotation rotates the part and its position around the
+    image center.
+
+    A detection failed if no result is returned, or if the result does not
+    change under a shift or rotation which moves the part: then the function
+    did not measure the part at all, and all cases of this image are counted
+    as failed. The error is reported for the remaining cases only.
+
+    Reports latency percentiles, peak memory (growth of the peak resident set
+    size per function), the failed detections per image and the error against
+    the expected values in mm and degrees as JSON, to stdout or to the file
+    given as argument:
+
+        python benchmarks/VisionBenchmark.py [result.json]
+"""
+
+import glob
+import json
+import math
+import os
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "octoprint_OctoPNP"))
+
+import ImageProcessing
+
+ITERATIONS = 10
+BOX_SIZE = 15.0
+# binary thresholds of the default settings
+BED_THRESH = 150
+HEAD_THRESH = 150
+BED_PX_PER_MM = 55.65
+
+# offset of the part from the center of the tray box in mm, y axis points up
+HEAD_EXPECTED = {
+    "head_atmega_SO8.png": [0.84, 0.75],
+    "head_atmega_SO8_2.png": [-0.50, -0.22],
+    "head_large_component.png": [0.14, 0.57],
+    "head_led_1206.png": [0.62, -2.51],
+    "head_resistor_1206.png": [-3.35, 1.38],
+    "head_resistor_1206_2.png": [-2.33, 3.86]
+}
+
+# orientation in degrees (counter clockwise, [-45°:45°]) and position of the part
+# relative to the image center in mm, y axis points down
+BED_EXPECTED = {
+    "bed_atmega_SO8.png": (35.3, [-0.17, 0.99]),
+    "bed_resistor_1206.png": (-13.0, [0.97, -0.73]),
+    "bed_resistor_1206_black_nozzle.png": (0.0, [0.49, 0.39]),
+    "orientation_bed_atmega_SO8_green.png": (-3.4, [-0.81, -0.03]),
+    "orientation_bed_resistor_1206_green.png": (-38.5, [-0.78, -0.30])
+}
+
+# results closer than this to the result on the unmodified image did not change
+UNCHANGED = 1e-6
+
+# shifts in px and rotations in degrees (counter clockwise) of the synthetic variants
+SHIFTS = [(15, 0), (0, -15), (20, 20)]
+ROTATIONS = [5, -5, 10, -10]
+
+TESTIMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils", "testimages")
+
+
+def shift(img, dx, dy):
+    transformation = np.float32([[1, 0, dx], [0, 1, dy]])
+    return cv2.warpAffine(img, transformation, (img.shape[1], img.shape[0]), borderMode=cv2.BORDER_REPLICATE)
+
+
+def rotate(img, angle):
+    transformation = cv2.getRotationMatrix2D((img.shape[1] / 2.0, img.shape[0] / 2.0), angle, 1.0)
+    return cv2.warpAffine(img, transformation, (img.shape[1], img.shape[0]), borderMode=cv2.BORDER_REPLICATE)
+
+
+# position in mm relative to the image center after rotating the image, y axis points down
+def rotatePosition(position, angle):
+    a = math.radians(angle)
+    return [position[0] * math.cos(a) + position[1] * math.sin(a),
+            -position[0] * math.sin(a) + position[1] * math.cos(a)]
+
+
+# difference of two orientations in [-45°:45°]
+def angleError(measured, expected):
+    return (measured - expected + 45.0) % 90.0 - 45.0
+
+
+def positionError(measured, expected):
+    return math.hypot(measured[0] - expected[0], measured[1] - expected[1])
+
+
+# runs function ITERATIONS times, returns the last result and the durations in ms
+def measure(function, *args):
+    durations = []
+    for i in range(ITERATIONS):
+        start_time = time.time()
+        result = function(*args)
+        durations.append((time.time() - start_time) * 1000)
+    return result, durations
+
+
+def peakMemory():
+    # kB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Benchmark():
+
+    def __init__(self):
+        self.im = ImageProcessing.ImageProcessing(BOX_SIZE, BED_THRESH, HEAD_THRESH)
+        self.im._debug = False
+        self.im._interactive = False
+        self.cases = []
+        self.durations = {}
+        self.memory = {}
+
+    # one variant of a test image, returns the case
+    def run(self, name, variant, function, args, expected, error):
+        result, durations = measure(function, *args)
+        self.durations.setdefault(name, []).extend(durations)
+        case = dict(function = name, image = variant[0], variant = variant[1],
+                    detected = result is not False, failure = None if result is not False else "not found",
+                    result = result if result is False else list(np.ravel(result).astype(float)),
+                    expected = list(np.ravel(expected).astype(float)),
+                    error = None, p50_ms = float(np.percentile(durations, 50)))
+        if result is not False:
+            case["error"] = float(error(result, expected))
+        self.cases.append(case)
+        return case
+
+    # cases: all cases of an image, the unmodified image first. moved: the variants
+    # which move the part. A result equal to the one on the unmodified image means
+    # that the part was not measured, all cases of the image are failed detections.
+    def checkUnchanged(self, cases, moved):
+        original = cases[0]["result"]
+        if original is False:
+            return
+        unchanged = [case for case in moved if case["result"] is not False
+                     and np.max(np.abs(np.subtract(case["result"], original))) < UNCHANGED]
+        if not unchanged:
+            return
+        for case in cases:
+            if case["detected"]:
+                case["detected"] = False
+                case["failure"] = "unchanged under " + unchanged[0]["variant"]
+                case["error"] = None
+
+    # the offset in the tray box does not change if the whole image is shifted
+    def head(self, path):
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        image = os.path.basename(path)
+        expected = HEAD_EXPECTED[image]
+        self.run("locatePartInBox", (image, "original"), self.im.locatePartInBox, [img, False], expected, positionError)
+        for dx, dy in SHIFTS:
+            self.run("locatePartInBox", (image, "shift %d,%d" % (dx, dy)), self.im.locatePartInBox,
+                     [shift(img, dx, dy), False], expected, positionError)
+
+    def bed(self, path):
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        image = os.path.basename(path)
+        orientation, position = BED_EXPECTED[image]
+        orientations = [self.run("getPartOrientation", (image, "original"), self.im.getPartOrientation,
+                                 [img, BED_PX_PER_MM, 0], orientation, angleError)]
+        positions = [self.run("getPartPosition", (image, "original"), self.im.getPartPosition,
+                              [img, BED_PX_PER_MM], position, positionError)]
+
+        for dx, dy in SHIFTS:
+            variant = (image, "shift %d,%d" % (dx, dy))
+            shifted = shift(img, dx, dy)
+            orientations.append(self.run("getPartOrientation", variant, self.im.getPartOrientation,
+                                         [shifted, BED_PX_PER_MM, 0], orientation, angleError))
+            positions.append(self.run("getPartPosition", variant, self.im.getPartPosition, [shifted, BED_PX_PER_MM],
+                                      [position[0] + dx / BED_PX_PER_MM, position[1] + dy / BED_PX_PER_MM], positionError))
+
+        for angle in ROTATIONS:
+            variant = (image, "rotate %d" % angle)
+            rotated = rotate(img, angle)
+            orientations.append(self.run("getPartOrientation", variant, self.im.getPartOrientation,
+                                         [rotated, BED_PX_PER_MM, 0], orientation + angle, angleError))
+            positions.append(self.run("getPartPosition", variant, self.im.getPartPosition, [rotated, BED_PX_PER_MM],
+                                      rotatePosition(position, angle), positionError))
+
+        # shifts move the position only, rotations the orientation and the position
+        self.checkUnchanged(orientations, orientations[1 + len(SHIFTS):])
+        self.checkUnchanged(positions, positions[1:])
+
+    def summary(self):
+        result = {}
+        for name, durations in self.durations.items():
+            cases = [case for case in self.cases if case["function"] == name]
+            errors = [abs(case["error"]) for case in cases if case["error"] is not None]
+            failed = [case["image"] for case in cases if not case["detected"]]
+            result[name] = dict(cases = len(cases),
+                                detected = len(cases) - len(failed),
+                                failed = dict((image, failed.count(image)) for image in set(failed)),
+                                unit = "deg" if name == "getPartOrientation" else "mm",
+                                error_mean = float(np.mean(errors)) if errors else None,
+                                error_max = float(np.max(errors)) if errors else None,
+                                p50_ms = float(np.percentile(durations, 50)),
+                                p95_ms = float(np.percentile(durations, 95)),
+                                max_ms = float(np.max(durations)),
+                                memory_growth_kb = self.memory.get(name))
+        return result
+
+
+benchmark = Benchmark()
+memory = peakMemory()
+
+for path in sorted(glob.glob(os.path.join(TESTIMAGES, "head*.png"))):
+    benchmark.head(path)
+benchmark.memory["locatePartInBox"] = peakMemory() - memory
+
+memory = peakMemory()
+for path in sorted(glob.glob(os.path.join(TESTIMAGES, "*bed*.png"))):
+    benchmark.bed(path)
+# orientation and position are measured on the same images
+benchmark.memory["getPartOrientation"] = benchmark.memory["getPartPosition"] = peakMemory() - memory
+
+report = dict(timestamp = time.strftime("%Y-%m-%dT%H:%M:%S"),
+              opencv = cv2.__version__,
+              iterations = ITERATIONS,
+              peak_memory_kb = peakMemory(),
+              summary = benchmark.summary(),
+              cases = benchmark.cases)
+
+if len(sys.argv) > 1:
+    with open(sys.argv[1], "w") as f:
+        json.dump(report, f, indent = 2, sort_keys = True)
+else:
+    print(json.dumps(report, indent = 2, sort_keys = True))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+""" This file is part of OctoPNP
+
+    Benchmark for the file-select latency: compares the old regex scan over every
+    line of a gcode file with the streaming XmlExtractor on synthetic gcode files.
+    Usage: python benchmarks/XmlExtractionBenchmark.py [size in MB] [size in MB] ...
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+
+# the modules are imported from the plugin folder, the benchmark runs without OctoPrint
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "octoprint_OctoPNP"))
+
+import XmlExtractor
+import SmdParts
+
+XML = """;<object name="benchmark">
+;<part id="1" name="ATTINY">
+;  <position box="1"/>
+;  <size height="1"/>
+;  <shape>
+;    <point x="-2.6" y="-3.4"/>
+;    <point x="2.6" y="3.4"/>
+;  </shape>
+;  <destination x="100" y="90" z="2.75" orientation="90"/>
+;</part>
+;</object>
+"""
+
+GCODE_BLOCK = "".join(["G1 X%.3f Y%.3f E%.5f F1800\n" % (i * 0.1, i * 0.2, i * 0.01) for i in range(1000)])
+
+
+def createFile(size_mb, xml_at_start):
+    fd, path = tempfile.mkstemp(suffix=".gcode")
+    f = os.fdopen(fd, "w")
+    if xml_at_start:
+        f.write(XML)
+    written = 0
+    while written < size_mb * 1024 * 1024:
+        f.write(GCODE_BLOCK)
+        written += len(GCODE_BLOCK)
+    if not xml_at_start:
+        f.write(XML)
+    f.close()
+    return path
+
+
+# the implementation used before the XmlExtractor
+def regexScan(path):
+    xml = ""
+    f = open(path, 'r')
+    for line in f:
+        expression = re.search("<.*>", line)
+        if expression:
+            xml += expression.group() + "\n"
+    f.close()
+    return xml
+
+
+def measure(function, path):
+    start_time = time.time()
+    function(path)
+    return time.time() - start_time
+
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [10, 100, 1000]
+extractor = XmlExtractor.XmlExtractor()
+
+for size in sizes:
+    for xml_at_start in [True, False]:
+        path = createFile(size, xml_at_start)
+        try:
+            old = measure(regexScan, path)
+            new = measure(extractor.extract, path)
+            parts = SmdParts.SmdParts()
+            parts.load(extractor.extract(path))
+            assert parts.getPartCount() == 1
+        finally:
+            os.remove(path)
+        print("%5d MB, xml at %s: regex scan %.3fs, streaming extractor %.3fs (%.1fx)"
+              % (size, "start" if xml_at_start else "end  ", old, new, old / max(new, 1e-6)))
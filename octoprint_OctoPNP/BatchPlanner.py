@@ -0,0 +1,111 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import numpy as np
+
+# Plans the order in which a batch of parts is placed. For every part the head travels
+# from the camera position above the tray box to the pick position, to the bed camera and
+# on to the destination. Only the travel from the destination of one part to the tray box
+# of the next part depends on the order. It is minimized by a nearest neighbour tour from
+# every possible start part, improved by 2-opt. Distances are XY travel in mm.
+#
+# With look-ahead the head camera images the tray box of the next part right after the
+# current part is picked, so this detour depends on the order as well.
+class BatchPlanner():
+
+    # 2-opt passes over the whole tour
+    MAX_PASSES = 20
+
+    # head_offset, vacnozzle_offset: [x, y] offsets of head camera and vacuum nozzle
+    # bed_camera: [x, y] position of the bed camera
+    def __init__(self, head_offset, vacnozzle_offset, bed_camera, lookahead = False):
+        self._head = np.array(head_offset[:2], dtype=np.float64)
+        self._vacnozzle = np.array(vacnozzle_offset[:2], dtype=np.float64)
+        self._bed = np.array(bed_camera[:2], dtype=np.float64) - self._vacnozzle
+        self._lookahead = lookahead
+
+    # tray_positions: (n, 3) box centers, destinations: (n, 4) part destinations
+    # returns the planned order as list of indices, the travel of the planned order
+    # and the travel of the given order
+    def plan(self, tray_positions, destinations):
+        camera = np.asarray(tray_positions, dtype=np.float64)[:, :2] - self._head
+        pick = np.asarray(tray_positions, dtype=np.float64)[:, :2] - self._vacnozzle
+        place = np.asarray(destinations, dtype=np.float64)[:, :2] - self._vacnozzle
+
+        # travel of the first and the last part, transitions[i, j]: travel between part i and part j
+        if self._lookahead:
+            # pick i -> camera j -> bed camera, destination i -> pick j
+            start = self._distance(camera, pick)
+            end = self._distance(pick, self._bed)
+            transitions = (self._distances(pick, camera) + self._distance(camera, self._bed)[np.newaxis, :]
+                           + self._distances(place, pick))
+            fixed = self._distance(self._bed, place).sum()
+        else:
+            # destination i -> camera j
+            start = np.zeros(len(camera))
+            end = np.zeros(len(camera))
+            transitions = self._distances(place, camera)
+            fixed = (self._distance(camera, pick) + self._distance(pick, self._bed)
+                     + self._distance(self._bed, place)).sum()
+
+        given = list(range(len(camera)))
+        order = self._improve(self._nearestNeighbour(start, transitions), start, end, transitions)
+        planned = self._cost(order, start, end, transitions)
+        original = self._cost(given, start, end, transitions)
+        # the heuristic is not guaranteed to beat the given order
+        if planned > original:
+            order, planned = given, original
+        return order, fixed + planned, fixed + original
+
+    # distances between corresponding rows of a and b
+    def _distance(self, a, b):
+        return np.hypot(*(np.asarray(a) - np.asarray(b)).T)
+
+    # distances between all rows of a and all rows of b
+    def _distances(self, a, b):
+        return np.hypot(a[:, np.newaxis, 0] - b[np.newaxis, :, 0],
+                        a[:, np.newaxis, 1] - b[np.newaxis, :, 1])
+
+    def _cost(self, order, start, end, transitions):
+        order = np.asarray(order, dtype=np.int64)
+        return start[order[0]] + transitions[order[:-1], order[1:]].sum() + end[order[-1]]
+
+    # shortest nearest neighbour tour over all start parts
+    def _nearestNeighbour(self, start, transitions):
+        count = len(transitions)
+        best, best_cost = list(range(count)), None
+        for first in range(count):
+            visited = np.zeros(count, dtype=bool)
+            order = [first]
+            visited[first] = True
+            cost = start[first]
+            for i in range(count - 1):
+                distances = np.where(visited, np.inf, transitions[order[-1]])
+                following = int(np.argmin(distances))
+                cost += distances[following]
+                order.append(following)
+                visited[following] = True
+            if best_cost is None or cost < best_cost:
+                best, best_cost = order, cost
+        return best
+
+    # 2-opt: reverse segments of the tour as long as this shortens it. Transitions are
+    # not symmetric (destination -> tray box), so the whole tour is evaluated.
+    def _improve(self, order, start, end, transitions):
+        order = np.array(order, dtype=np.int64)
+        cost = self._cost(order, start, end, transitions)
+        for iteration in range(self.MAX_PASSES):
+            improved = False
+            for i in range(len(order) - 1):
+                for j in range(i + 2, len(order) + 1):
+                    candidate = np.concatenate((order[:i], order[i:j][::-1], order[j:]))
+                    candidate_cost = self._cost(candidate, start, end, transitions)
+                    if candidate_cost < cost - 1e-9:
+                        order, cost, improved = candidate, candidate_cost, True
+            if not improved:
+                break
+        return order.tolist()
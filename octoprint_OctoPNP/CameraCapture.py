@@ -0,0 +1,112 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import abc
+import glob
+import os
+import threading
+from subprocess import call
+
+import cv2
+
+# Capture backends provide camera frames as BGR arrays. Backends may raise if the
+# camera can't be accessed at all (e.g. missing grab script).
+class CaptureBackend(object):
+    __metaclass__ = abc.ABCMeta
+
+    # returns the current frame as BGR array or None if the camera is not ready
+    @abc.abstractmethod
+    def grab(self):
+        pass
+
+    # release the camera, the backend is not used afterwards
+    def close(self):
+        pass
+
+
+# Executes the user defined grab script and loads the image it has written.
+# This is the most flexible backend, but the camera is opened for every image.
+class ScriptCaptureBackend(CaptureBackend):
+
+    def __init__(self, script, path):
+        self._script = script
+        self._path = path
+
+    def grab(self):
+        if call([self._script]) != 0:
+            return None
+        return cv2.imread(self._path, cv2.IMREAD_COLOR)
+
+
+# Keeps an OpenCV VideoCapture device open between images. Frames buffered by
+# the driver were exposed before the printer reached the current position and
+# are dropped before reading the actual frame.
+class OpenCVCaptureBackend(CaptureBackend):
+
+    def __init__(self, device, flush_frames = 2):
+        self._device = device
+        self._flush_frames = flush_frames
+        self._capture = None
+        self._lock = threading.Lock()
+
+    def grab(self):
+        with self._lock:
+            if self._capture is None or not self._capture.isOpened():
+                self._capture = cv2.VideoCapture(self._device)
+                if not self._capture.isOpened():
+                    self._capture = None
+                    return None
+
+            for i in range(self._flush_frames):
+                self._capture.grab()
+            ok, frame = self._capture.read()
+            if not ok:
+                # try to reopen the device on the next request
+                self._capture.release()
+                self._capture = None
+                return None
+            return frame
+
+    def close(self):
+        with self._lock:
+            if self._capture is not None:
+                self._capture.release()
+                self._capture = None
+
+
+# Replays images from a folder (or a single file) in alphabetical order.
+# Useful for development and testing without camera hardware, e.g. with utils/testimages.
+class ReplayCaptureBackend(CaptureBackend):
+
+    def __init__(self, path):
+        if os.path.isdir(path):
+            self._files = sorted(glob.glob(os.path.join(path, "*.png")) + glob.glob(os.path.join(path, "*.jpg")))
+        else:
+            self._files = [path]
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def grab(self):
+        with self._lock:
+            if not self._files:
+                return None
+            path = self._files[self._next % len(self._files)]
+            self._next += 1
+        return cv2.imread(path, cv2.IMREAD_COLOR)
+
+
+# create the backend configured in the CameraSettings of a camera
+def createBackend(camera):
+    if camera.backend == "opencv":
+        device = camera.device
+        # numeric devices are opened by index, everything else by name or url
+        if str(device).isdigit():
+            device = int(device)
+        return OpenCVCaptureBackend(device)
+    if camera.backend == "replay":
+        return ReplayCaptureBackend(str(camera.device))
+    return ScriptCaptureBackend(camera.grabScriptPath, camera.path)
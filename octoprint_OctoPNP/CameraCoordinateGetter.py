@@ -6,32 +6,15 @@ Created on 18.07.2017
 
 import cv2
 import numpy as np
-from GCode_processor import Coordinate
+from GCode_processor import toCoordinateArray
+from CameraTilePlanner import CameraTilePlanner
 
 #===============================================================================
 # Global variables
 #===============================================================================
-#Stores the coordinates as tuples of x and y. Implementation in class Coordinate
-workList = []
-
 #Conversion from millimeters to pixel
 MillimeterToPixel = 3.779527559
 
-#Stores the List of found centers for the Camera Run
-CameraCoords = []
-
-#Stores the maximum Pixel size the camera provies. Its in Pixel x Pixel Format
-CamPixelX = 0
-CamPixelY = 0
-
-#Below values store the extreme values found during the processing process
-minX = None
-minY = None
-maxX = None
-maxY = None
-centerX = None
-centerY = None
-
 #===============================================================================
 # Help Classes
 #===============================================================================
@@ -53,13 +36,13 @@ class ImageOperations:
     def drawCenterCircle(self,x,y):
         cv2.circle(self.img,(x,y),1,(0,0,255),-1)
 
-    def drawExtremaBounds(self):
+    def drawExtremaBounds(self, minX, minY, maxX, maxY):
         self.drawCenterCircle(int(minX), int(minY))
         self.drawCenterCircle(int(minX), int(maxY))
         self.drawCenterCircle(int(maxX), int(minY))
         self.drawCenterCircle(int(maxX), int(maxY))
 
-    def drawBoxFromCenter(self, xStart , yStart):
+    def drawBoxFromCenter(self, xStart , yStart, CamPixelX, CamPixelY):
         cv2.circle(self.img,(xStart,yStart),1,(0,255,255),-1)
         cv2.rectangle(self.img,(xStart - int(CamPixelX / 2), yStart - int(CamPixelY / 2)),(xStart + int(CamPixelX / 2), yStart + int(CamPixelY / 2)),(0,255,0),0)
 
@@ -79,240 +62,94 @@ class ImageOperations:
 #===============================================================================
 class CameraGridMaker:
 
-    #Stores the incoming List of coordinates
-    CordList = []
-
+    #All state belongs to the instance, so several grids can be computed
+    #one after another or in parallel without affecting each other.
+    #Coordinates are kept as (N, 2) arrays of x and y, the layer as float32 array.
     def __init__(self,incomingCoordList,layer,CamResX,CamResY):
-        global CamPixelX
-        global CamPixelY
-        CamPixelX = CamResX
-        CamPixelY = CamResY
-        self.CordList = incomingCoordList[layer]
+        #Stores the maximum Pixel size the camera provies. Its in Pixel x Pixel Format
+        self.CamPixelX = CamResX
+        self.CamPixelY = CamResY
+        #Stores the incoming array of coordinates in mm
+        self.CordList = toCoordinateArray(incomingCoordList[layer])
+        #Stores the coordinates in pixel
+        self.workList = np.zeros((0, 2), dtype=np.int64)
+        #Stores the found centers for the Camera Run in pixel and in mm
+        self.CameraCoords = np.zeros((0, 2), dtype=np.float64)
+        self.cameraPositions = np.zeros((0, 2), dtype=np.float64)
+        #Below values store the extreme values found during the processing process
+        self.minX = None
+        self.minY = None
+        self.maxX = None
+        self.maxY = None
+        self.centerX = None
+        self.centerY = None
 
     #Creates the work list we're using for our computations
     #and sets up the Bounding Box values
     def getCoordinates(self):
-        global workList
-        for eachEntry in self.CordList:
-            Coord = Coordinate(
-                int(eachEntry.x*MillimeterToPixel),
-                int(eachEntry.y*MillimeterToPixel))
-            self.findXYExtremas(Coord.x, Coord.y)
+        #truncate towards zero like int()
+        self.workList = (self.CordList.astype(np.float64) * MillimeterToPixel).astype(np.int64)
+        if len(self.workList) > 0:
+            self.findXYExtremas(self.workList[:, 0], self.workList[:, 1])
             self.computeCenterOfExtremes()
-            workList.append(Coord)
 
     #Draws the printed Object
     def drawGCodeLines(self,img):
-        i = 0
-        while i < len(workList) - 1:
-            xStart = workList[i].x
-            yStart = workList[i].y
-            xEnd = workList[i + 1].x
-            yEnd = workList[i + 1].y
-            img.drawBlueLines(xStart, yStart, xEnd, yEnd)
-            i += 1
+        for start, end in zip(self.workList[:-1], self.workList[1:]):
+            img.drawBlueLines(int(start[0]), int(start[1]), int(end[0]), int(end[1]))
 
     #Draws the path the Camera will take
     def drawCameraLines(self,img):
-        i = 0
-        while i < len(CameraCoords) - 1:
-            xStart = int(CameraCoords[i].x)
-            yStart = int(CameraCoords[i].y)
-            xEnd = int(CameraCoords[i + 1].x)
-            yEnd = int(CameraCoords[i + 1].y)
-            img.drawCameraLines(xStart, yStart, xEnd, yEnd)
-            i += 1
+        for start, end in zip(self.CameraCoords[:-1], self.CameraCoords[1:]):
+            img.drawCameraLines(int(start[0]), int(start[1]), int(end[0]), int(end[1]))
 
     #Draws the found Camerasectorboxes on the Screen
     def drawAllFoundCameraPositions(self,img):
-        for eachItem in CameraCoords:
-            print(eachItem.x,eachItem.y)
-            img.drawBoxFromCenter(int(eachItem.x), int(eachItem.y))
+        for eachItem in self.CameraCoords:
+            print(eachItem[0],eachItem[1])
+            img.drawBoxFromCenter(int(eachItem[0]), int(eachItem[1]), self.CamPixelX, self.CamPixelY)
 
-    #Find the Extrema for the Bounding Box
-    def findXYExtremas(self,NewX,NewY):
-        global minX
-        global minY
-        global maxX
-        global maxY
-        #Initialize with some base values other than zero
-        if (minX == None):
-            minX = NewX
-            maxX = NewX
-            minY = NewY
-            maxY = NewY
-        else:
-            if(NewX < minX):
-                minX = NewX
-            elif(NewX > maxX):
-                maxX = NewX
+    #Draws the corners of the Bounding Box
+    def drawExtremaBounds(self,img):
+        img.drawExtremaBounds(self.minX, self.minY, self.maxX, self.maxY)
 
-            if(NewY < minY):
-                minY = NewY
-            elif(NewY > maxY):
-                maxY = NewY
+    #Find the Extrema for the Bounding Box
+    def findXYExtremas(self,xValues,yValues):
+        self.minX = int(np.min(xValues))
+        self.maxX = int(np.max(xValues))
+        self.minY = int(np.min(yValues))
+        self.maxY = int(np.max(yValues))
 
     def findYMinMaxInList(self,inputList,mode):
-        result = None
+        yValues = np.asarray(inputList).reshape(-1, 2)[:, 1]
+        if(len(yValues) == 0):
+            return None
         if(mode == 'min'):
-            previous = None
-            for each in inputList:
-                #Initilize
-                if(previous == None):
-                    previous = each.y
-                if(each < previous):
-                    previous = each.y
-            result = previous
-
+            return yValues.min()
         if(mode == 'max'):
-            previous = None
-            for each in inputList:
-                #Initilize
-                if(previous == None):
-                    previous = each.y
-                if(each > previous):
-                    previous = each.y
-            result = previous
-
-        return result
+            return yValues.max()
+        return None
 
     #Compute the Center of the printed Object
     def computeCenterOfExtremes(self):
-        global centerX
-        global centerY
-        centerX = (maxX+minX) / 2
-        centerY = (maxY+minY) / 2
-
-    #Makes a points symmetrical copy of the upper Camerasectorgrid
-    def makePointSymmetry(self,inputList):
-        symmetryList = []
-        for eachItem in inputList:
-            distX = centerX - eachItem.x
-            distY = centerY - eachItem.y
-
-            if(distY != 0):
-                symmetryX = centerX + distX
-                symmetryY = centerY + distY
-                newCoord = Coordinate(symmetryX,symmetryY)
-                symmetryList.insert(0, newCoord)
-
-        return symmetryList
+        self.centerX = (self.maxX+self.minX) / 2
+        self.centerY = (self.maxY+self.minY) / 2
 
     #===============================================================================
     # Main Camera Grid computation Algortihm
     #===============================================================================
-    def createCameraLookUpGrid(self):
-        global CameraCoords
-
-        currentXPos = centerX
-        seeRight = currentXPos
-        walkRight = currentXPos
-        #Walk all the way right first until maxX bound is reached
-        while(True):
-            seeRight = (currentXPos + CamPixelX)
-            walkRight = (currentXPos + CamPixelX / 2)
-            if(walkRight < maxX):
-                if(seeRight < maxX):
-                    currentXPos += CamPixelX
-                elif(seeRight > maxX):
-                    currentXPos += CamPixelX
-                    break
-            else:
-                break
-
-        #Once the most right is reached
-        #fill the Camcoords list from right to left
-        seeLeft = currentXPos
-        walkLeft = currentXPos
-        while(True):
-            seeLeft = (currentXPos - CamPixelX)
-            walkLeft = (currentXPos - CamPixelX / 2)
-            if(walkLeft > minX):
-                if(seeLeft > minX):
-                    newCoord = Coordinate(currentXPos, centerY)
-                    CameraCoords.append(newCoord)
-                    currentXPos -= CamPixelX
-                elif(seeLeft < minX):
-                    newCoord = Coordinate(currentXPos, centerY)
-                    CameraCoords.append(newCoord)
-                    currentXPos -= CamPixelX
-                    newCoord = Coordinate(currentXPos, centerY)
-                    CameraCoords.append(newCoord)
-                    break
-            else:
-                newCoord = Coordinate(currentXPos, centerY)
-                CameraCoords.append(newCoord)
-                break
-
-
-        #Now create the x-Axis lines
-        cacheList = []
-        currentYPos = centerY
-        while(True):
-            switcher = 0
-            #Rows that have the switcher module result
-            #of 0 fill from left to right
-            if(switcher % 2 == 0):
-                reverserList = []
-                seeUp = (currentYPos - CamPixelY)
-                walkUp = (currentYPos - CamPixelY / 2)
-                if(walkUp > minY):
-                    if(seeUp > minY):
-                        for eachItem in CameraCoords:
-                            newCoord = Coordinate(eachItem.x, seeUp)
-                            reverserList.append(newCoord)
-
-                        reverserList.reverse()
-                        reverserList.extend(cacheList)
-                        cacheList = reverserList
-                        currentYPos = seeUp
-                        switcher += 1
-                    elif(seeUp < minY):
-                        for eachItem in CameraCoords:
-                            newCoord = Coordinate(eachItem.x, seeUp)
-                            reverserList.append(newCoord)
-
-                        reverserList.reverse()
-                        reverserList.extend(cacheList)
-                        cacheList = reverserList
-                        currentYPos = seeUp
-                        switcher += 1
-                        break
-                else:
-                    break
-            #Rows that have the switcher module result
-            # of 1 fill from right to left
-            if(switcher % 2 == 1):
-                localList = []
-                seeUp = (currentYPos - CamPixelY)
-                walkUp = (currentYPos - CamPixelY / 2)
-                if(walkUp > minY):
-                    if(seeUp > minY):
-                        for eachItem in CameraCoords:
-                            newCoord = Coordinate(eachItem.x, seeUp)
-                            localList.append(newCoord)
-
-                        localList.extend(cacheList)
-                        cacheList = localList
-                        currentYPos = seeUp
-                        switcher += 1
-                    elif(seeUp < minY):
-                        for eachItem in CameraCoords:
-                            newCoord = Coordinate(eachItem.x, seeUp)
-                            localList.append(newCoord)
-
-                        localList.extend(cacheList)
-                        cacheList = localList
-                        currentYPos = seeUp
-                        switcher += 1
-                        break
-                else:
-                    break
-
-        #Insert the new list items into the Cameracoordinate List
-        cacheList.extend(CameraCoords)
-        CameraCoords = cacheList
-
-        #Create the lower half of the Grid
-        #by making a point symmetrical Copy
-        CameraCoords.extend(self.makePointSymmetry(cacheList))
+    #Covers the layer with camera tiles, only tiles containing printed material are
+    #kept (see CameraTilePlanner). The tiles are planned in mm, CameraCoords holds
+    #them in pixel for drawing.
+    def createCameraLookUpGrid(self, overlap = 0.0, ordering = CameraTilePlanner.ORDER_SERPENTINE):
+        planner = CameraTilePlanner([self.CamPixelX / MillimeterToPixel, self.CamPixelY / MillimeterToPixel],
+                                    overlap, ordering = ordering)
+        self.cameraPositions = planner.plan(self.CordList)
+        self.CameraCoords = self.cameraPositions * MillimeterToPixel
+
+    #Head camera positions in mm in the order they are to be visited
+    def getCameraPositions(self):
+        return self.cameraPositions
+
+    def getCameraCoords(self):
+        return self.CameraCoords
@@ -37,7 +37,7 @@ newGridMaker.drawCameraLines(Image)
 
 #Image.drawGridBox(0, 0, 50, 50)
 #Draw Maximums and Minimums
-Image.drawExtremaBounds()
+newGridMaker.drawExtremaBounds(Image)
 #Draw Center of of the Extremes
 #Image.drawCenterCircle(int(centerX), int(centerY))
 #Image.drawBoxFromCenter(int(centerX), int(centerY))
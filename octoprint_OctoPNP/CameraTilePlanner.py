@@ -0,0 +1,184 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import numpy as np
+
+# Plans the head camera positions to inspect a layer. The toolpath is rasterized into
+# an occupancy grid, the bounding box of the layer is covered by camera tiles with the
+# given overlap and only tiles containing printed material are kept. The tiles are
+# visited in serpentine order (row by row, alternating direction) or along a nearest
+# neighbour tour improved by 2-opt, whichever is shorter for "tsp".
+#
+# All values are in the unit of the toolpath, usually mm. The returned positions are the
+# centers of the tiles and can be passed to the camera helper of the plugin.
+class CameraTilePlanner():
+
+    ORDER_SERPENTINE = "serpentine"
+    ORDER_TSP = "tsp"
+
+    # 2-opt passes over the whole tour
+    MAX_PASSES = 20
+
+    # field_of_view: [width, height] of the camera image or a single value for square images
+    # overlap: fraction of the field of view shared by neighbouring tiles [0:1)
+    # resolution: cell size of the occupancy grid, a 20th of the field of view by default
+    def __init__(self, field_of_view, overlap = 0.1, resolution = None, ordering = ORDER_SERPENTINE):
+        self._fov = np.resize(np.asarray(field_of_view, dtype=np.float64), 2)
+        self._step = self._fov * (1.0 - min(max(overlap, 0.0), 0.9))
+        self._resolution = float(resolution) if resolution else float(self._fov.min()) / 20
+        self._ordering = ordering
+
+    # toolpath: (N, 2) array of consecutive positions, start: optional [x, y] of the camera
+    # returns the tile centers as (M, 2) array in the order they are to be visited
+    def plan(self, toolpath, start = None):
+        toolpath = np.asarray(toolpath, dtype=np.float64).reshape(-1, 2)
+        if len(toolpath) == 0:
+            return np.zeros((0, 2))
+
+        lower = toolpath.min(axis=0)
+        upper = toolpath.max(axis=0)
+        occupancy = self._rasterize(toolpath, lower, upper)
+        selected, centers = self._selectTiles(occupancy, lower, upper)
+
+        order = self._serpentine(selected, centers, start)
+        if self._ordering == self.ORDER_TSP and len(order) > 2:
+            tour = self._improve(self._nearestNeighbour(centers[order], start), centers[order], start)
+            if self._length(centers[order][tour], start) < self._length(centers[order], start):
+                order = [order[i] for i in tour]
+        return centers[order]
+
+    # travel along the given positions, from start if given
+    def pathLength(self, positions, start = None):
+        return self._length(np.asarray(positions, dtype=np.float64).reshape(-1, 2), start)
+
+    # occupancy grid of the toolpath, cell [row, column] covers y, x. Segments between
+    # consecutive positions are sampled at half the cell size.
+    def _rasterize(self, toolpath, lower, upper):
+        resolution = self._resolution
+        shape = (int((upper[1] - lower[1]) / resolution) + 1, int((upper[0] - lower[0]) / resolution) + 1)
+        occupancy = np.zeros(shape, dtype=bool)
+
+        points = toolpath
+        if len(toolpath) > 1:
+            segments = np.diff(toolpath, axis=0)
+            samples = np.maximum(1, np.ceil(np.hypot(segments[:, 0], segments[:, 1]) / (resolution / 2))).astype(np.int64)
+            index = np.repeat(np.arange(len(segments)), samples)
+            offsets = np.repeat(np.cumsum(samples) - samples, samples)
+            t = (np.arange(len(index)) - offsets) / np.repeat(samples, samples).astype(np.float64)
+            points = np.vstack((toolpath[index] + segments[index] * t[:, np.newaxis], toolpath[-1:]))
+
+        cells = ((points - lower) / resolution).astype(np.int64)
+        occupancy[np.minimum(cells[:, 1], shape[0] - 1), np.minimum(cells[:, 0], shape[1] - 1)] = True
+        return occupancy
+
+    # covers the bounding box with tiles centered on the box. Returns a (rows, columns)
+    # array of tiles containing material and the centers of all tiles, row by row.
+    def _selectTiles(self, occupancy, lower, upper):
+        fov, step, resolution = self._fov, self._step, self._resolution
+        size = upper - lower
+        counts = np.where(size > fov, np.ceil((size - fov) / step) + 1, 1).astype(np.int64)
+        first = (lower + upper) / 2 - (counts - 1) * step / 2
+        x = first[0] + np.arange(counts[0]) * step[0]
+        y = first[1] + np.arange(counts[1]) * step[1]
+
+        # summed area table, a tile contains material if any cell touching the tile is occupied
+        table = np.zeros((occupancy.shape[0] + 1, occupancy.shape[1] + 1), dtype=np.int64)
+        table[1:, 1:] = occupancy.cumsum(axis=0).cumsum(axis=1)
+        columns = self._cellRange(x, fov[0], lower[0], occupancy.shape[1])
+        rows = self._cellRange(y, fov[1], lower[1], occupancy.shape[0])
+        r0, r1 = rows[0][:, np.newaxis], rows[1][:, np.newaxis]
+        c0, c1 = columns[0][np.newaxis, :], columns[1][np.newaxis, :]
+        selected = (table[r1, c1] - table[r0, c1] - table[r1, c0] + table[r0, c0]) > 0
+
+        grid_x, grid_y = np.meshgrid(x, y)
+        return selected, np.column_stack((grid_x.ravel(), grid_y.ravel()))
+
+    # first and last + 1 grid cell touched by tiles with the given centers
+    def _cellRange(self, centers, fov, lower, cells):
+        first = np.floor((centers - fov / 2 - lower) / self._resolution).astype(np.int64)
+        last = np.floor((centers + fov / 2 - lower) / self._resolution).astype(np.int64) + 1
+        return np.clip(first, 0, cells), np.clip(last, 0, cells)
+
+    # row by row, alternating direction. Starts at the corner closest to start.
+    def _serpentine(self, selected, centers, start):
+        rows, columns = selected.shape
+        best, best_length = [], None
+        for reverse_rows in [False, True]:
+            for reverse_first in [False, True]:
+                order = []
+                row_order = range(rows)[::-1] if reverse_rows else range(rows)
+                for n, row in enumerate(row_order):
+                    column_order = range(columns)
+                    if (n % 2 == 1) != reverse_first:
+                        column_order = column_order[::-1]
+                    order += [row * columns + column for column in column_order if selected[row, column]]
+                length = self._length(centers[order], start)
+                if best_length is None or length < best_length:
+                    best, best_length = order, length
+        return best
+
+    # nearest neighbour tour over the given positions, from the position closest to start
+    def _nearestNeighbour(self, positions, start):
+        distances = self._distances(positions)
+        visited = np.zeros(len(positions), dtype=bool)
+        if start is None:
+            current = 0
+        else:
+            current = int(np.argmin(np.hypot(*(positions - np.asarray(start, dtype=np.float64)[:2]).T)))
+        order = [current]
+        visited[current] = True
+        for i in range(len(positions) - 1):
+            current = int(np.argmin(np.where(visited, np.inf, distances[current])))
+            order.append(current)
+            visited[current] = True
+        return order
+
+    # 2-opt on an open path: reverse the segment order[i:j+1] as long as this shortens the path
+    def _improve(self, order, positions, start):
+        order = list(order)
+        if start is not None:
+            # the start is a fixed first node
+            positions = np.vstack((np.asarray(start, dtype=np.float64)[:2], positions))
+            order = [0] + [i + 1 for i in order]
+        distances = self._distances(positions)
+        first = 1 if start is not None else 0
+        count = len(order)
+
+        for iteration in range(self.MAX_PASSES):
+            improved = False
+            for i in range(first, count - 1):
+                path = np.asarray(order)
+                a = path[i]
+                b = path[i + 1:]
+                # change of the edges before the segment and after the segment
+                delta = np.zeros(len(b))
+                if i > 0:
+                    delta += distances[path[i - 1], b] - distances[path[i - 1], a]
+                following = path[i + 2:]
+                delta[:-1] += distances[a, following] - distances[b[:-1], following]
+                j = int(np.argmin(delta))
+                if delta[j] < -1e-9:
+                    j += i + 1
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = True
+            if not improved:
+                break
+
+        if start is not None:
+            order = [i - 1 for i in order[1:]]
+        return order
+
+    def _distances(self, positions):
+        return np.hypot(positions[:, np.newaxis, 0] - positions[np.newaxis, :, 0],
+                        positions[:, np.newaxis, 1] - positions[np.newaxis, :, 1])
+
+    def _length(self, positions, start):
+        if start is not None and len(positions):
+            positions = np.vstack((np.asarray(start, dtype=np.float64)[:2], positions))
+        if len(positions) < 2:
+            return 0.0
+        return float(np.hypot(*np.diff(positions, axis=0).T).sum())
@@ -0,0 +1,165 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import datetime
+import os
+import re
+import threading
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+import cv2
+
+# Writes captured frames and annotated analysis results for debugging and documentation.
+# Images are queued and written by a background thread into one directory per day:
+#
+#   <directory>/2024-05-17/093512-123456_part12_head.png
+#   <directory>/2024-05-17/093512-123456_part12_head_result.png
+#
+# If the queue is full, images are dropped instead of blocking the placement. Day
+# directories older than max_age days are removed, and the oldest images are removed
+# as long as all day directories together exceed the quota.
+class DebugImageLogger():
+
+    DAY_DIRECTORY = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+    # the size of the image directories is checked again after this number of images,
+    # including images which could not be written
+    EVICTION_INTERVAL = 50
+
+    # directory: base directory of the day directories
+    # queue_size: number of images waiting to be written
+    # quota: MB, max_age: days, 0 disables the limit
+    # jpeg_quality: 0 writes lossless PNG, 1-100 JPEG
+    def __init__(self, directory, queue_size = 8, quota = 500, max_age = 30, jpeg_quality = 0, logger = None):
+        self._directory = directory
+        self._queue = queue.Queue(max(1, queue_size))
+        self._quota = quota * 1024 * 1024
+        self._max_age = max_age
+        self._jpeg_quality = jpeg_quality
+        self._logger = logger
+        self._written = 0
+        self._dropped = 0
+        self._size = 0
+        self._unchecked = 0
+
+        self._thread = threading.Thread(target = self._run, name = "OctoPNP image logger")
+        self._thread.daemon = True
+        self._thread.start()
+
+    # queue the frame and the optional result image of the given part
+    # returns False if the images are dropped
+    def log(self, partnr, name, frame, result_img = None):
+        try:
+            self._queue.put_nowait((datetime.datetime.now(), partnr, name, frame, result_img))
+            return True
+        except queue.Full:
+            self._dropped += 1
+            if self._logger: self._logger.info("Image logging queue full, dropped %s image of part %s", name, partnr)
+            return False
+
+    def getStatistics(self):
+        return dict(written = self._written, dropped = self._dropped, queue_depth = self._queue.qsize())
+
+    # write all queued images, then terminate the thread and wait for it. With drop, the
+    # queued images are discarded and only the image being written is waited for.
+    # Another logger for the same directory must not be started before, both would evict concurrently.
+    def stop(self, drop = False):
+        if drop:
+            try:
+                while True:
+                    self._queue.get_nowait()
+                    self._dropped += 1
+            except queue.Empty:
+                pass
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        self._checkedEvict()
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            try:
+                self._write(*entry)
+            except Exception:
+                if self._logger: self._logger.exception("Unable to write debug image")
+            self._unchecked += 1
+            if (self._quota > 0 and self._size > self._quota) or self._unchecked >= self.EVICTION_INTERVAL:
+                self._checkedEvict()
+
+    # errors of the eviction must not terminate the writer thread
+    def _checkedEvict(self):
+        self._unchecked = 0
+        try:
+            self._evict()
+        except Exception:
+            if self._logger: self._logger.exception("Unable to remove old debug images")
+
+    def _write(self, timestamp, partnr, name, frame, result_img):
+        directory = os.path.join(self._directory, timestamp.strftime("%Y-%m-%d"))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        base = os.path.join(directory, timestamp.strftime("%H%M%S-%f") + "_part" + str(partnr) + "_" + name)
+        for path, image in [(base, frame), (base + "_result", result_img)]:
+            if image is None:
+                continue
+            if self._jpeg_quality > 0:
+                path += ".jpg"
+                cv2.imwrite(path, image, [int(cv2.IMWRITE_JPEG_QUALITY), self._jpeg_quality])
+            else:
+                path += ".png"
+                cv2.imwrite(path, image)
+            if os.path.isfile(path):
+                self._size += os.path.getsize(path)
+        self._written += 1
+
+    # only files in day directories are removed, the base directory may contain other files
+    def _evict(self):
+        if not os.path.isdir(self._directory):
+            self._size = 0
+            return
+
+        oldest_day = None
+        if self._max_age > 0:
+            oldest_day = (datetime.date.today() - datetime.timedelta(days = self._max_age)).strftime("%Y-%m-%d")
+
+        files = []
+        for day in sorted(os.listdir(self._directory)):
+            directory = os.path.join(self._directory, day)
+            if not self.DAY_DIRECTORY.match(day) or not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                path = os.path.join(directory, filename)
+                if oldest_day and day < oldest_day:
+                    self._remove(path)
+                elif os.path.isfile(path):
+                    files.append((path, os.path.getsize(path)))
+
+        # files are sorted by day and time of capture. Some space below the quota is freed,
+        # so the directories are not scanned again for every written image.
+        self._size = sum(size for path, size in files)
+        for path, size in files:
+            if self._quota <= 0 or self._size <= self._quota * 0.9:
+                break
+            self._remove(path)
+            self._size -= size
+
+        for day in os.listdir(self._directory):
+            directory = os.path.join(self._directory, day)
+            if self.DAY_DIRECTORY.match(day) and os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            if self._logger: self._logger.info("Unable to remove debug image " + path)
@@ -5,51 +5,63 @@ Created on 03.06.2017
 
 '''
 
+import array
+import multiprocessing
 import re
 
+import numpy as np
+
 #===============================================================================
 # RegEx Pattern to retrieve the info from the file
 # extractFileInfo = re.match('.*X:\s*(\d+.\d+).*Y:\s*(\d+.\d+', line)
 #===============================================================================
+extruderPattern = re.compile(r'T\d')
+zPattern = re.compile(r'G1 Z(\d+.\d+)')
+xyPattern = re.compile(r'G1 X(\d+.\d+) Y(\d+.\d+)')
 
 #===============================================================================
 # Help Classes
 #===============================================================================
 
-class Coordinate:
+#Layers are stored as float32 (N, 2) arrays of x and y, Coordinate is only
+#used to hand out single points to callers of the former object based API
+class Coordinate(object):
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
 
+#Convert a layer given as array or as list of Coordinate to a float32 (N, 2) array
+def toCoordinateArray(coordinates):
+    if len(coordinates) > 0 and isinstance(coordinates[0], Coordinate):
+        coordinates = [(each.x, each.y) for each in coordinates]
+    return np.asarray(coordinates, dtype=np.float32).reshape(-1, 2)
+
 #===============================================================================
 # Refactored extracted methods
 #===============================================================================
 class CameraGCodeExtraction:
     
-    desiredExtruder = ''
-    z_stepping = 0.0
-    currentLayer = 1
-    Z_layer = 0.0
-    
-    #Z_layer = 1.0           #Define the Z-Layer Threshold where the T1 extruder is working at
-    current_extruder = ''   #Stores the currently selected Extruder beein T0/T1
-    currentExtruderZPos = 0.0      #Stores the last Z Position of the extruder
-    lastExtruderZPos = 0.0
-    
-    CoordList = []
-    shortCoordList = []
-    masterCoordList = []
-    
     #desiredExtruder = raw_input('Enter your input Extruder: ')
     #Z_layer = float(raw_input('Enter your input Layer: '))
 
-    
+    #All state belongs to the instance, results of one extraction never
+    #show up in another one. The coordinates of a layer are kept as
+    #float32 (N, 2) arrays of x and y.
     def __init__(self,zSteps,targetExtruder):
         self.desiredExtruder = targetExtruder
         self.z_stepping = float(zSteps)
-        self.Z_layer = self.z_stepping * self.currentLayer
-        self.currentExtruderZPos = self.Z_layer
+        self.currentLayer = 1
+        self.Z_layer = self.z_stepping * self.currentLayer  #Z-Layer the extruder is working at
+        self.current_extruder = ''   #Stores the currently selected Extruder beein T0/T1
+        self.currentExtruderZPos = self.Z_layer      #Stores the last Z Position of the extruder
         self.lastExtruderZPos = self.Z_layer
+        self.extruder_state = None
+        
+        self.CoordList = []
+        self.shortCoordList = []
+        self.masterCoordList = []
 
     def validZValues(self, z_values ):
         return z_values != None
@@ -66,20 +78,25 @@ class CameraGCodeExtraction:
         text_file.close()
         return
     
+    """Read the lines of the file one by one, so large files are never loaded
+    into memory as a whole. The returned generator can only be iterated once.
+    """
     def openFiles(self, inputName):
-        gcode = open( inputName, 'r' )
-        readData = gcode.readlines()
-        gcode.close()
-        return readData
+        with open( inputName, 'r' ) as gcode:
+            for line in gcode:
+                yield line
     
     def findAllZValues(self,Data):
         zValueList = []
+        zValueSet = set()
         for line in Data:
-            z_values = re.match('G1 Z(\d+.\d+)', line)
+            z_values = zPattern.match(line)
             
             if(self.validZValues(z_values)):
-                if(not zValueList.__contains__(float(z_values.group(1)))):
-                    zValueList.append(float(z_values.group(1)))
+                zValue = float(z_values.group(1))
+                if(zValue not in zValueSet):
+                    zValueSet.add(zValue)
+                    zValueList.append(zValue)
         return zValueList
 
     """Do some RegEx to find the entries of value for us.
@@ -88,8 +105,8 @@ class CameraGCodeExtraction:
     """
     def findAllGCodesInLayer(self, Data):
         for line in Data:
-            self.extruder_state = re.match('T\d', line)
-            z_values = re.match('G1 Z(\d+.\d+)', line)
+            self.extruder_state = extruderPattern.match(line)
+            z_values = zPattern.match(line)
             #Get the currently selected extruder from File (T1 or T0)
             if self.extruder_state != None:
                 self.current_extruder = self.extruder_state.group(0)
@@ -99,31 +116,114 @@ class CameraGCodeExtraction:
 
             #Get the X and Y values of the extruder at the specified layer
             if self.extruder_working(self.desiredExtruder):
-                xy_values = re.match('G1 X(\d+.\d+) Y(\d+.\d+)', line)
+                xy_values = xyPattern.match(line)
                 if xy_values != None:
-                    newCoord = Coordinate(
+                    self.shortCoordList.append((
                         float(xy_values.group(1)), 
-                        float(xy_values.group(2)))
-                    self.shortCoordList.append(newCoord)
+                        float(xy_values.group(2))))
                     
         if(len(self.shortCoordList) >= 3):
-            self.masterCoordList.append(self.shortCoordList)
+            self.masterCoordList.append(toCoordinateArray(self.shortCoordList))
                     
         self.shortCoordList = []
 
+    """Collect the X and Y values of the desired extruder in a single pass over the lines.
+    The Z position is tracked for all extruders, the coordinates are bucketed by extruder
+    and Z position of this extruder. Moves of other extruders are not buffered, so the
+    memory grows with the extracted layers only. The Z values are kept in the order of
+    their first appearance in the file.
+    
+    :param Data: Iterable of gcode lines, e.g. the generator returned by openFiles
+    :returns: Dict of (extruder, Z) -> float32 (N, 2) array of X and Y and the list of Z values
+    """
+    def scanGCode(self, Data):
+        layerBuckets = {}
+        zValueList = []
+        zValueSet = set()
+        extruderZPos = {}
+        startZPos = self.z_stepping * self.currentLayer
+        current_extruder = self.current_extruder
+        desiredExtruder = self.desiredExtruder
+        
+        for line in Data:
+            # cheap prefix tests first, most lines are moves with extrusion
+            if line.startswith('G1 X'):
+                if current_extruder == desiredExtruder:
+                    xy_values = xyPattern.match(line)
+                    if xy_values != None:
+                        key = (current_extruder, extruderZPos.get(current_extruder, startZPos))
+                        bucket = layerBuckets.get(key)
+                        if bucket is None:
+                            # flat buffer of x, y values, much smaller than a list of objects
+                            bucket = layerBuckets[key] = array.array('f')
+                        bucket.append(float(xy_values.group(1)))
+                        bucket.append(float(xy_values.group(2)))
+            elif line.startswith('G1 Z'):
+                z_values = zPattern.match(line)
+                if z_values != None:
+                    zValue = float(z_values.group(1))
+                    if zValue not in zValueSet:
+                        zValueSet.add(zValue)
+                        zValueList.append(zValue)
+                    if current_extruder:
+                        extruderZPos[current_extruder] = zValue
+            elif line.startswith('T'):
+                self.extruder_state = extruderPattern.match(line)
+                if self.extruder_state != None:
+                    current_extruder = self.extruder_state.group(0)
+        
+        self.current_extruder = current_extruder
+        self.currentExtruderZPos = extruderZPos.get(self.desiredExtruder, startZPos)
+        for key, bucket in layerBuckets.items():
+            layerBuckets[key] = np.frombuffer(bucket, dtype=np.float32).reshape(-1, 2)
+        return layerBuckets, zValueList
+
     def extractCameraGCode(self, Data):
-        zWorkList = self.findAllZValues(Data)
+        layerBuckets, zWorkList = self.scanGCode(Data)
         for eachItem in zWorkList:
             self.Z_layer = eachItem
-            self.findAllGCodesInLayer(Data)
+            coordinates = layerBuckets.get((self.desiredExtruder, eachItem))
+            if(coordinates is not None and len(coordinates) >= 3):
+                self.masterCoordList.append(coordinates)
         
         
     def getCoordList(self):
         return self.masterCoordList
+
+    def getLayerCoordinates(self, layer):
+        return [Coordinate(x, y) for x, y in self.masterCoordList[layer].tolist()]
     
     def properSelectedExtruder(self, z_values):
         return self.validZValues(z_values) and self.current_extruder == self.desiredExtruder
 
+#===============================================================================
+# Extraction of several files
+#===============================================================================
+def extractCameraGCodeFromFile(fileName, zSteps, targetExtruder):
+    extractor = CameraGCodeExtraction(zSteps, targetExtruder)
+    extractor.extractCameraGCode(extractor.openFiles(fileName))
+    return extractor.getCoordList()
+
+def _extractCameraGCodeFromFile(arguments):
+    return extractCameraGCodeFromFile(*arguments)
+
+"""Extract the layer coordinates of several files in parallel worker processes.
+
+:param fileNames: List of gcode files
+:param processes: Number of worker processes, None for the number of CPUs
+:returns: List with the layer coordinates of every file, in the order of fileNames
+"""
+def extractCameraGCodeFromFiles(fileNames, zSteps, targetExtruder, processes = None):
+    arguments = [(fileName, zSteps, targetExtruder) for fileName in fileNames]
+    if len(arguments) <= 1 or processes == 1:
+        return [_extractCameraGCodeFromFile(each) for each in arguments]
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_extractCameraGCodeFromFile, arguments)
+    finally:
+        pool.close()
+        pool.join()
+
 #===============================================================================
 # writeFiles(CoordList, desiredExtruder + "_ExtruderPositions.txt")
 # writeFiles(shortCoordList, desiredExtruder + "_positions.txt")
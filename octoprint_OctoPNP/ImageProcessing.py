@@ -21,19 +21,62 @@
 import cv2
 import numpy as np
 import math
-import os
-import shutil
+from collections import namedtuple, OrderedDict
+
+# cv2.cv has been removed in OpenCV 3, cv2.boxPoints replaces cv2.cv.BoxPoints
+_boxPoints = getattr(cv2, "boxPoints", None) or cv2.cv.BoxPoints
+
+
+# Combined result of analyzePart
+PartAnalysis = namedtuple("PartAnalysis", ["orientation", "displacement", "confidence"])
+
+
+# Result of the last image processing step: the measured value (or False),
+# the annotated image for the UI and an error message if the step failed.
+class ProcessingResult(object):
+    __slots__ = ["value", "image", "error"]
+
+    def __init__(self, value, image, error = ""):
+        self.value = value
+        self.image = image
+        self.error = error
+
+
+# Preallocated images for _maskBackground, reused for every image of the same resolution
+class _MaskBuffers(object):
+    __slots__ = ["blur", "hsv", "mask", "corners"]
+
+    def __init__(self, h, w):
+        self.blur = np.empty((h, w, 3), np.uint8)
+        self.hsv = np.empty((h, w, 3), np.uint8)
+        self.mask = np.empty((h, w), np.uint8)
+        # white outside of a circle touching the image boundaries
+        self.corners = np.empty((h, w), np.uint8)
+        self.corners[:, :] = 255
+        cv2.circle(self.corners, (w//2, h//2), min(w//2, h//2), 0, -1)
+
 
 class ImageProcessing:
 
-    def __init__(self, box_size, bed_cam_binary_thresh, head_cam_binary_thresh):
+    # number of resolutions to keep mask buffers for (head and bed camera)
+    MASK_BUFFER_COUNT = 4
+
+    # further pyramid levels lose too much of the box outline, the coarse box then
+    # differs from the full resolution box by several mm on the test images
+    MAX_BOX_DETECTION_LEVELS = 1
+
+    # box_detection_levels: number of image pyramid levels used to detect the tray box
+    #      in locatePartInBox, 0 detects the box on the full resolution image,
+    #      values above MAX_BOX_DETECTION_LEVELS are reduced to it
+    def __init__(self, box_size, bed_cam_binary_thresh, head_cam_binary_thresh, box_detection_levels = 0):
         self.box_size=box_size
         self.bed_binary_thresh = bed_cam_binary_thresh
         self.head_binary_thresh = head_cam_binary_thresh
+        self.box_detection_levels = min(box_detection_levels, self.MAX_BOX_DETECTION_LEVELS)
         self.lower_mask_color = np.array([22,28,26]) # green default
         self.upper_mask_color = np.array([103,255,255])
-        self._img_path = ""
-        self._last_saved_image_path = None
+        self._last_result = ProcessingResult(False, None)
+        self._mask_buffers = OrderedDict()
         self._last_error = ""
         self._interactive=False
         self._debug = True
@@ -43,18 +86,18 @@ class ImageProcessing:
 # one box with white background.
 # Returns displacement with respect to the center of the box if a part is detected, False otherwise.
 # boolean relative_to_camera sets wether the offset should be relative to the box or to the camera.
+# img can be a file path or a BGR image array, see _loadImage.
 #===================================================================================================
-    def locatePartInBox(self,img_path, relative_to_camera):
+    def locatePartInBox(self, img, relative_to_camera):
         result = False
+        result_img = None
 
-        self._img_path = img_path
-        # open image file
-        img=cv2.imread(img_path,cv2.IMREAD_COLOR)
+        img = self._loadImage(img)
 
         #detect box boundaries
-        rotated_crop_rect = self._rotatedBoundingBox(img, self.head_binary_thresh, 0.6, 0.95)
+        rotated_crop_rect = self._locateBox(img)
         if(rotated_crop_rect):
-            rotated_box = cv2.cv.BoxPoints(rotated_crop_rect)
+            rotated_box = _boxPoints(rotated_crop_rect)
 
             left_x = int(min(rotated_box[0][0],rotated_box[1][0]))
             right_x = int(max(rotated_box[2][0],rotated_box[3][0]))
@@ -84,10 +127,7 @@ class ImageProcessing:
 
                 # Generate result image and return
                 cv2.circle(img_crop,(int(cm_x),int(cm_y)), 5, (0,255,0), -1)
-                filename="/finalcm_"+os.path.basename(self._img_path)
-                finalcm_path=os.path.dirname(self._img_path)+filename
-                cv2.imwrite(finalcm_path,img_crop)
-                self._last_saved_image_path = finalcm_path
+                result_img = img_crop
 
                 if self._interactive: cv2.imshow("Part in box: ",img_crop)
                 if self._interactive: cv2.waitKey(0)
@@ -96,6 +136,7 @@ class ImageProcessing:
         else:
             self._last_error = "Unable to locate box"
 
+        self._setResult(result, result_img)
         return result
 
 
@@ -103,12 +144,10 @@ class ImageProcessing:
 # and determining the main orientation of this box
 # Returns the angle of main edges relativ to the
 # next main axis [-45°:45°]
-    def getPartOrientation(self,img_path, pxPerMM, offset=0):
-        self._img_path = img_path
+    def getPartOrientation(self, img, pxPerMM, offset=0):
         result = False
 
-        # open image file
-        img=cv2.imread(img_path,cv2.IMREAD_COLOR)
+        img = self._loadImage(img)
 
         mask = self._maskBackground(img)
 
@@ -118,18 +157,12 @@ class ImageProcessing:
 
         if(rect):
             # draw rotated bounding box for visualization
-            box = cv2.cv.BoxPoints(rect)
+            box = _boxPoints(rect)
             box = np.int0(box)
             cv2.drawContours(img,[box],0,(0,0,255),2)
 
             # compute rotation offset
-            rotation = rect[2] + offset
-            # normalize to positive PI range
-            if rotation < 0:
-                rotation = (rotation % -180) + 180
-
-            rotation = rotation % 90
-            result = -rotation if rotation < 45 else 90-rotation
+            result = self._normalizeOrientation(rect[2] + offset)
 
             if self._debug: print "Part deviation measured by bed camera: " + str(result)
         else:
@@ -140,11 +173,8 @@ class ImageProcessing:
         if self._interactive: cv2.imshow("contours",img)
         if self._interactive: cv2.waitKey(0)
 
-        #save result as image for GUI
-        filename="/orientation_"+os.path.basename(self._img_path)
-        orientation_img_path=os.path.dirname(self._img_path)+filename
-        cv2.imwrite(orientation_img_path, img)
-        self._last_saved_image_path = orientation_img_path
+        #keep result image for GUI
+        self._setResult(result, img)
 
         return result
 
@@ -152,12 +182,10 @@ class ImageProcessing:
 # Find the position of a (already rotated) part. Returns the offset between the
 # center of the image and the parts center of mass, 0,0 if no part is detected.
 #==============================================================================
-    def getPartPosition(self, img_path, pxPerMM):
-        self._img_path = img_path
+    def getPartPosition(self, img, pxPerMM):
         result = False
 
-        # open image file
-        img=cv2.imread(img_path,cv2.IMREAD_COLOR)
+        img = self._loadImage(img)
 
         mask = self._maskBackground(img)
 
@@ -169,35 +197,75 @@ class ImageProcessing:
         rect = self._rotatedBoundingBox(img, 50, min_area_factor, 0.7, mask)
 
         if(rect):
-            cm_x = rect[0][0]
-            cm_y = rect[0][1]
+            result = self._displacement(rect, res_x, res_y, pxPerMM)
 
-            displacement_x=(cm_x-res_x/2)/pxPerMM
-            displacement_y=((res_y-cm_y)-res_y/2)/pxPerMM
-            result = [displacement_x, -displacement_y]
+            # mark center of mass for UI
+            cv2.circle(img,(int(rect[0][0]),int(rect[0][1])),5,(0,255,0),-1)
         else:
             if self._debug: print "Unable to locate part for correcting the position"
             self._last_error = "Unable to locate part for correcting the position"
             result = False
 
-        # write image for UI
-        cv2.circle(img,(int(cm_x),int(cm_y)),5,(0,255,0),-1)
-        filename="/final_"+os.path.basename(self._img_path)
-        final_img_path=os.path.dirname(self._img_path)+filename
-        cv2.imwrite(final_img_path,img)
-        self._last_saved_image_path = final_img_path
+        self._setResult(result, img)
 
         if self._interactive: cv2.imshow("Center of Mass",img)
         if self._interactive: cv2.waitKey(0)
 
         return result
 
+# Compute orientation and position of a part on the bed camera image in a single pass.
+# The image is loaded and masked once and the contours are shared by both measurements.
+# Returns a PartAnalysis with the orientation (see getPartOrientation), the displacement
+# (see getPartPosition) and a confidence score [0:1], which is the fraction of the rotated
+# bounding box covered by the detected contours. orientation and displacement are False
+# if the part can't be located.
 #==============================================================================
-    def getLastSavedImagePath(self):
-        if self._last_saved_image_path:
-            return self._last_saved_image_path
+    def analyzePart(self, img, pxPerMM, offset=0):
+        img = self._loadImage(img)
+        res_x = img.shape[1]
+        res_y = img.shape[0]
+
+        mask = self._maskBackground(img)
+        contours = self._findContours(img, 50, mask)
+
+        orientation = False
+        confidence = 0.0
+        rect, accepted = self._boundingBoxOfContours(img, contours, mask.shape, 0.005, 0.7)
+        if(rect):
+            orientation = self._normalizeOrientation(rect[2] + offset)
+            rect_area = rect[1][0] * rect[1][1]
+            if rect_area > 0:
+                confidence = min(1.0, sum([cv2.contourArea(contour) for contour in accepted]) / rect_area)
+            if self._debug: print "Part deviation measured by bed camera: " + str(orientation)
         else:
-            return False
+            self._last_error = "Unable to locate part for finding the orientation"
+
+        displacement = False
+        # we should use actual object size here
+        min_area_factor = pxPerMM**2 / (res_x * res_y) # 1mm²
+        rect, accepted = self._boundingBoxOfContours(img, contours, mask.shape, min_area_factor, 0.7)
+        if(rect):
+            displacement = self._displacement(rect, res_x, res_y, pxPerMM)
+            cv2.circle(img,(int(rect[0][0]),int(rect[0][1])),5,(0,255,0),-1)
+        else:
+            self._last_error = "Unable to locate part for correcting the position"
+
+        if self._interactive: cv2.imshow("Part analysis",img)
+        if self._interactive: cv2.waitKey(0)
+
+        result = PartAnalysis(orientation, displacement, confidence)
+        self._setResult(result if (orientation is not False or displacement is not False) else False, img)
+        return result
+
+#==============================================================================
+    def getLastResult(self):
+        return self._last_result
+
+
+#==============================================================================
+    # annotated image of the last processing step, None if no image was produced
+    def getLastResultImage(self):
+        return self._last_result.image
 
 
 #==============================================================================
@@ -205,76 +273,205 @@ class ImageProcessing:
         return self._last_error
 
 
+# Images are either given as path to an image file or as BGR array, e.g. from
+# a capture backend. Arrays are copied since annotations are drawn into the image.
 #==============================================================================
-    def _rotatedBoundingBox(self, img, binary_thresh, min_area_factor, max_area_factor, binary_img = ()):
-        result = False
+    def _loadImage(self, img):
+        if isinstance(img, np.ndarray):
+            return img.copy()
+        return cv2.imread(img, cv2.IMREAD_COLOR)
+
+
+#==============================================================================
+    def _setResult(self, value, img):
+        self._last_result = ProcessingResult(value, img, "" if value is not False else self._last_error)
+
+
+# Find the tray box in a head camera image. With box_detection_levels > 0 the box is
+# detected on a downscaled image first, then the box corners are refined on the full
+# resolution image around the coarse corners. If the coarse box can not be confirmed
+# at full resolution, the box is searched on the full resolution image.
+#==============================================================================
+    def _locateBox(self, img):
+        rect = False
+        if self.box_detection_levels > 0:
+            rect = self._refineCoarseBox(img, self.box_detection_levels)
+        if not rect:
+            rect = self._rotatedBoundingBox(img, self.head_binary_thresh, 0.6, 0.95)
+        return rect
+
+
+# Returns the refined box or False if the box was not found on the downscaled image,
+# touches the image border (the downscaled border is inaccurate) or a corner could
+# not be confirmed on the full resolution image.
+#==============================================================================
+    def _refineCoarseBox(self, img, levels):
+        small = img
+        for level in range(levels):
+            small = cv2.pyrDown(small)
+        coarse_rect = self._rotatedBoundingBox(small, self.head_binary_thresh, 0.6, 0.95)
+        if not coarse_rect:
+            return False
+
+        # refine the box corners on small full resolution patches around the coarse corners,
+        # the search window covers the downscaling error
+        scale = 2**levels
+        win = 2*scale
+        half = 2*win + 3
+        refined = []
+        for corner in np.array(_boxPoints(coarse_rect)) * scale:
+            left_x = int(corner[0]) - half
+            upper_y = int(corner[1]) - half
+            if left_x < 0 or upper_y < 0 or int(corner[0]) + half >= img.shape[1] or int(corner[1]) + half >= img.shape[0]:
+                return False
+            patch = img[upper_y:int(corner[1]) + half + 1, left_x:int(corner[0]) + half + 1]
+            gray_patch = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+            point = np.array([[corner[0] - left_x, corner[1] - upper_y]], dtype=np.float32)
+            cv2.cornerSubPix(gray_patch, point, (win, win), (-1, -1), (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 0.1))
+            # a corner leaving the patch is not the corner of the coarse box
+            if not (0 <= point[0][0] <= 2*half and 0 <= point[0][1] <= 2*half):
+                return False
+            refined.append(point[0] + [left_x, upper_y])
+
+        return cv2.minAreaRect(np.array(refined, dtype=np.float32))
+
+
+# Normalize a rotation to the deviation from the next main axis [-45°:45°]
+#==============================================================================
+    def _normalizeOrientation(self, rotation):
+        # normalize to positive PI range
+        if rotation < 0:
+            rotation = (rotation % -180) + 180
+
+        rotation = rotation % 90
+        return -rotation if rotation < 45 else 90-rotation
+
 
+# Offset between the image center and the center of rect in mm
+#==============================================================================
+    def _displacement(self, rect, res_x, res_y, pxPerMM):
+        cm_x = rect[0][0]
+        cm_y = rect[0][1]
+
+        displacement_x=(cm_x-res_x/2)/pxPerMM
+        displacement_y=((res_y-cm_y)-res_y/2)/pxPerMM
+        return [displacement_x, -displacement_y]
+
+
+#==============================================================================
+    def _rotatedBoundingBox(self, img, binary_thresh, min_area_factor, max_area_factor, binary_img = ()):
         if (len(binary_img) == 0):
             #convert image to grey and blur
             gray_img=cv2.cvtColor(img,cv2.COLOR_BGR2GRAY)
             gray_img=cv2.blur(gray_img, (3,3))
             ret, binary_img = cv2.threshold(gray_img, binary_thresh, 255, cv2.THRESH_BINARY)
 
-        contours, hierarchy = cv2.findContours(binary_img, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE, (0, 0));
+        contours = self._findContours(img, binary_thresh, binary_img)
+        rect, accepted = self._boundingBoxOfContours(img, contours, binary_img.shape, min_area_factor, max_area_factor)
+        return rect
+
+
+#==============================================================================
+    def _findContours(self, img, binary_thresh, binary_img):
+        # the hierarchy is not used, but nested contours are needed: the tray box and
+        # the parts are found as holes, which RETR_EXTERNAL would drop
+        # OpenCV 3 returns the image as additional first value
+        contours, hierarchy = cv2.findContours(binary_img, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)[-2:]
 
         #cv2.drawContours(img, contours, -1, (0,255,0), 3) # draw basic contours
+        if self._interactive: cv2.imshow("Binarized image",binary_img)
+        if self._interactive: cv2.waitKey(0)
+
+        return contours
+
+
+# Computes the rotated bounding box around all contours with a size between
+# min_area_factor and max_area_factor of the image size.
+# Returns the box (or False) and the list of contours inside the box.
+#==============================================================================
+    def _boundingBoxOfContours(self, img, contours, shape, min_area_factor, max_area_factor):
+        result = False
 
-        minArea = binary_img.shape[0] * binary_img.shape[1] * min_area_factor; # how to find a better value??? input from part description?
-        maxArea = binary_img.shape[0] * binary_img.shape[1] * max_area_factor # Y*X | don't detect full image
+        minArea = shape[0] * shape[1] * min_area_factor; # how to find a better value??? input from part description?
+        maxArea = shape[0] * shape[1] * max_area_factor # Y*X | don't detect full image
 
-        rectPoints = [];
+        accepted = []
+        boxes = []
 
-        for contour in contours:
-            rect = cv2.minAreaRect(contour)
+        # the minimum area rect is never larger than the upright bounding rect and never
+        # smaller than the contour itself, so most contours are rejected in bulk
+        # before minAreaRect is computed for the remaining candidates
+        for i in self._candidateContours(contours, minArea, maxArea):
+            rect = cv2.minAreaRect(contours[i])
             rectArea = rect[1][0] * rect[1][1]
             if(rectArea > minArea and rectArea < maxArea):
-                box = cv2.cv.BoxPoints(rect)
-                for point in box:
-                    rectPoints.append(np.array(point, dtype=np.int32))
+                accepted.append(contours[i])
+                box = _boxPoints(rect)
+                boxes.append(box)
                 if self._interactive: box = np.int0(box)
                 if self._interactive: cv2.drawContours(img,[box],0,(0,0,255),2)
-            #cv2.imshow("contours",binary_img)
-            #cv2.waitKey(0)
-        if self._interactive: cv2.imshow("Binarized image",binary_img)
-        if self._interactive: cv2.waitKey(0)
         if self._interactive: cv2.imshow("contours",img)
         if self._interactive: cv2.waitKey(0)
 
-        if (len(rectPoints) >= 4):
-            rectArray = np.array(rectPoints)
+        if (len(boxes) > 0):
+            rectArray = np.array(boxes).reshape(-1, 2).astype(np.int32)
             rect = cv2.minAreaRect(rectArray)
 
             # draw rotated bounding box for visualization
-            box = cv2.cv.BoxPoints(rect)
+            box = _boxPoints(rect)
             box = np.int0(box)
             cv2.drawContours(img,[box],0,(0,0,255),2)
             result = rect
         else:
             self._last_error = "Unable to find contour in image"
 
-        return result
+        return result, accepted
+
+# Indices of all contours whose minimum area rect may lie between minArea and maxArea.
+# Bounding rects and contour areas are computed for all contours at once.
+#==============================================================================
+    def _candidateContours(self, contours, minArea, maxArea):
+        if len(contours) == 0:
+            return []
+
+        lengths = np.array([len(contour) for contour in contours])
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        points = np.concatenate(contours).reshape(-1, 2).astype(np.float64)
+
+        # upright bounding rects (in pixel units as cv2.boundingRect, which is one pixel
+        # larger than the point extent and thus an upper bound for the rect area)
+        lower = np.minimum.reduceat(points, starts)
+        upper = np.maximum.reduceat(points, starts)
+        extent = upper - lower + 1
+        candidates = extent[:, 0] * extent[:, 1] > minArea
+
+        # shoelace formula per contour, equivalent to cv2.contourArea
+        following = np.roll(points, -1, axis=0)
+        following[starts + lengths - 1] = points[starts]
+        cross = points[:, 0] * following[:, 1] - following[:, 0] * points[:, 1]
+        areas = np.abs(np.add.reduceat(cross, starts)) / 2
+        candidates &= areas < maxArea
+
+        return np.flatnonzero(candidates)
+
 
 # Compute a binary image / mask by removing all pixels in the given color range
 # mask_corners: remove all pixels outside a circle touching the image boundaries
 #      to crop badly illuminated corners
+# The returned mask is a reused buffer and only valid until the next call.
 #==============================================================================
     def _maskBackground(self, img, mask_corners = True):
         h,w,c = np.shape(img)
+        buffers = self._getMaskBuffers(h, w)
 
-        blur_img=cv2.blur(img, (5,5))
-        hsv = cv2.cvtColor(blur_img, cv2.COLOR_BGR2HSV)
-
-        lower_color = np.array([22,28,26])
-        upper_color = np.array([103,255,255])
+        cv2.blur(img, (5,5), buffers.blur)
+        cv2.cvtColor(buffers.blur, cv2.COLOR_BGR2HSV, buffers.hsv)
 
         # create binary mask by finding background color range
-        mask = cv2.inRange(hsv, self.lower_mask_color, self.upper_mask_color)
+        mask = cv2.inRange(buffers.hsv, self.lower_mask_color, self.upper_mask_color, buffers.mask)
         # remove the corners from mask since they are prone to illumination problems
         if(mask_corners):
-            circle_mask = np.zeros((h, w), np.uint8)
-            circle_mask[:, :] = 255
-            cv2.circle(circle_mask,(w/2, h/2), min(w/2, h/2), 0, -1)
-            mask = cv2.bitwise_or(mask,circle_mask)
+            mask = cv2.bitwise_or(mask, buffers.corners, mask)
         # invert mask to get white objects on black background
         #inverse_mask = 255 - mask
 
@@ -282,3 +479,14 @@ class ImageProcessing:
         if self._interactive: cv2.waitKey(0)
 
         return mask
+
+
+#==============================================================================
+    def _getMaskBuffers(self, h, w):
+        buffers = self._mask_buffers.pop((h, w), None)
+        if buffers is None:
+            buffers = _MaskBuffers(h, w)
+            if len(self._mask_buffers) >= self.MASK_BUFFER_COUNT:
+                self._mask_buffers.popitem(last = False)
+        self._mask_buffers[(h, w)] = buffers
+        return buffers
@@ -0,0 +1,141 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import math
+import re
+
+# Generates the moves of the pick and place process from a kinematics profile
+# (MotionSettings). The planner keeps track of the last commanded position, so
+# Z is only lifted when needed:
+#
+# - with a safe travel height (safe_z > 0), XY travel below this height is preceded by
+#   a lift to safe_z. Travel above safe_z is combined into a single XYZ move.
+# - without safe travel height, Z is raised before and lowered after the XY move. If the
+#   current Z is unknown (e.g. after the print job has moved the head), a relative Z-hop is used.
+#
+# Tool changes clear the tracked position: the offsets between the tools may be set in the
+# firmware, so the position of the new tool is unknown and the next travel starts with a lift.
+#
+# All methods return lists of gcode lines, which can be sent with printer.commands().
+class MotionPlanner():
+
+    # parameters of a G0/G1/G4 command in estimate()
+    PARAMETER = re.compile(r"([XYZEFPS])(-?\d+\.?\d*)")
+
+    def __init__(self, profile):
+        self._profile = profile
+        self._position = [None, None, None]
+
+    # forget the position, e.g. after moves sent by others
+    def reset(self):
+        self._position = [None, None, None]
+
+    def toolChange(self, tool):
+        self.reset()
+        return ["T" + str(tool)]
+
+    # travel to the given position
+    def travel(self, x, y, z):
+        profile = self._profile
+        current_z = self._position[2]
+        commands = []
+
+        if self._position[0] == x and self._position[1] == y:
+            if current_z != z:
+                commands.append(self._move(z = z, feedrate = profile.z_feedrate))
+            return commands
+
+        if profile.safe_z > 0:
+            if current_z is None or current_z < profile.safe_z:
+                commands.append(self._move(z = profile.safe_z, feedrate = profile.z_feedrate))
+            if z >= profile.safe_z and self._position[0] is not None:
+                commands.append(self._move(x, y, z, self._combinedFeedrate(x, y, z)))
+            else:
+                commands.append(self._move(x, y, feedrate = profile.xy_feedrate))
+                commands.append(self._move(z = z, feedrate = profile.z_feedrate))
+            return commands
+
+        # no safe travel height: raise before, lower after the XY move
+        if current_z is None:
+            commands += self.lift(profile.z_hop)
+        elif z > current_z:
+            commands.append(self._move(z = z, feedrate = profile.z_feedrate))
+        commands.append(self._move(x, y, feedrate = profile.xy_feedrate))
+        if self._position[2] != z:
+            commands.append(self._move(z = z, feedrate = profile.z_feedrate))
+        return commands
+
+    # relative Z move by the given distance, the resulting height is unknown
+    def lift(self, distance):
+        self._position[2] = None
+        return ["G91", "G1 Z" + self._format(distance) + " F" + self._format(self._profile.z_feedrate), "G90"]
+
+    # XY move at the current height
+    def move(self, x, y):
+        return [self._move(x, y, feedrate = self._profile.xy_feedrate)]
+
+    # slow Z move to pick or place a part
+    def approach(self, z):
+        return [self._move(z = z, feedrate = self._profile.approach_feedrate)]
+
+    # rotate the part on the vacuum nozzle by the given angle
+    def rotate(self, angle):
+        return ["G92 E0", "G1 E" + self._format(angle) + " F" + self._format(self._profile.e_feedrate)]
+
+    # number of moves and estimated duration in seconds of the given gcode lines.
+    # Moves are assumed to run at their feedrate, acceleration is not taken into account.
+    def estimate(self, commands, feedrate = None):
+        feedrate = feedrate or self._profile.xy_feedrate
+        position = [0.0, 0.0, 0.0, 0.0]
+        relative = False
+        moves = 0
+        duration = 0.0
+        for command in commands:
+            code = command.split(" ")[0]
+            parameters = dict((axis, float(value)) for axis, value in self.PARAMETER.findall(command))
+            if code == "G90":
+                relative = False
+            elif code == "G91":
+                relative = True
+            elif code == "G92":
+                position[3] = parameters.get("E", 0.0)
+            elif code == "G4":
+                duration += parameters.get("P", 0.0) / 1000.0 + parameters.get("S", 0.0)
+            elif code in ("G0", "G1"):
+                feedrate = parameters.get("F", feedrate)
+                target = list(position)
+                for i, axis in enumerate("XYZE"):
+                    if axis in parameters:
+                        target[i] = position[i] + parameters[axis] if relative else parameters[axis]
+                distance = math.sqrt(sum((target[i] - position[i]) ** 2 for i in range(3)))
+                if distance == 0:
+                    distance = abs(target[3] - position[3])
+                if distance > 0:
+                    moves += 1
+                    duration += distance / (feedrate / 60.0)
+                position = target
+        return moves, duration
+
+    # feedrate of a combined move, limited by the Z feedrate
+    def _combinedFeedrate(self, x, y, z):
+        profile = self._profile
+        dz = abs(z - self._position[2])
+        if dz == 0:
+            return profile.xy_feedrate
+        length = math.sqrt((x - self._position[0]) ** 2 + (y - self._position[1]) ** 2 + dz ** 2)
+        return min(profile.xy_feedrate, profile.z_feedrate * length / dz)
+
+    def _move(self, x = None, y = None, z = None, feedrate = None):
+        command = "G1"
+        for i, (axis, value) in enumerate(zip("XYZ", [x, y, z])):
+            if value is not None:
+                command += " " + axis + self._format(value)
+                self._position[i] = value
+        return command + " F" + self._format(feedrate)
+
+    def _format(self, value):
+        return ("%.3f" % value).rstrip("0").rstrip(".")
@@ -0,0 +1,118 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Persistent LRU cache for the sanitized part description of gcode files.
+# Entries are keyed by path, size and modification time of the gcode file and the
+# number of header lines scanned for the part description, so a modified file or a
+# changed setting is never served from the cache. Every entry is stored as a
+# separate XML file in the cache folder, the index file keeps the LRU order.
+# Files without part information are cached as an empty string.
+class PartCache():
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, folder, max_bytes):
+        self._folder = folder
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+
+        if not os.path.isdir(self._folder):
+            os.makedirs(self._folder)
+        self._loadIndex()
+
+    # returns the cached XML string, "" if the file contains no parts or None on a cache miss.
+    # Only the memory copy of the index is updated, the LRU order is written with the next put.
+    def get(self, path, header_lines):
+        key = self._key(path, header_lines)
+        if key is None:
+            return None
+
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry is None:
+                return None
+            try:
+                with open(os.path.join(self._folder, entry["file"]), 'r') as f:
+                    xml = f.read()
+            except IOError:
+                return None
+            # most recently used entries are kept at the end
+            self._index[key] = entry
+        return xml
+
+    def put(self, path, header_lines, xml):
+        key = self._key(path, header_lines)
+        if key is None:
+            return
+
+        with self._lock:
+            filename = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".xml"
+            with open(os.path.join(self._folder, filename), 'w') as f:
+                f.write(xml)
+            self._index.pop(key, None)
+            self._index[key] = dict(file = filename, size = len(xml))
+            self._evict()
+            self._saveIndex()
+
+    # drop the entry of a file, e.g. if the cached XML can not be parsed
+    def remove(self, path, header_lines):
+        key = self._key(path, header_lines)
+        with self._lock:
+            if key in self._index:
+                self._remove(key)
+                self._saveIndex()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._index.keys()):
+                self._remove(key)
+            self._saveIndex()
+
+    def getSize(self):
+        return sum(entry["size"] for entry in self._index.values())
+
+    def _key(self, path, header_lines):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return "%s|%d|%r|%d" % (os.path.abspath(path), stat.st_size, stat.st_mtime, header_lines)
+
+    # drop least recently used entries until the cache fits into max_bytes. An entry
+    # larger than max_bytes is not kept either.
+    def _evict(self):
+        size = self.getSize()
+        while size > self._max_bytes and self._index:
+            key = next(iter(self._index))
+            size -= self._index[key]["size"]
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._index.pop(key)
+        try:
+            os.remove(os.path.join(self._folder, entry["file"]))
+        except OSError:
+            pass
+
+    def _loadIndex(self):
+        try:
+            with open(os.path.join(self._folder, self.INDEX_FILE), 'r') as f:
+                self._index = OrderedDict(json.load(f))
+        except (IOError, ValueError, TypeError):
+            # missing or corrupted index, start with an empty cache
+            self._index = OrderedDict()
+
+    def _saveIndex(self):
+        with open(os.path.join(self._folder, self.INDEX_FILE), 'w') as f:
+            json.dump(list(self._index.items()), f)
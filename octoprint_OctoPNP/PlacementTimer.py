@@ -0,0 +1,129 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import collections
+import contextlib
+import csv
+import json
+import threading
+import time
+
+import numpy as np
+
+# Records where the time goes for every placed part. Durations in seconds are
+# accumulated per stage for the part in progress and stored in a ring buffer
+# when the part is finished:
+#
+# camera, pick, align, place: time spent in the steps of the state machine
+# grab_head, grab_bed: image capture
+# analysis: ImageProcessing calls
+# ui: UI messages including image encoding
+# motion: waiting for the printer to finish the moves, without dwell
+# dwell: configured dwell times
+#
+# Finished records can be appended to a CSV or JSONL file for offline analysis.
+class PlacementTimer():
+
+    STEPS = ["camera", "pick", "align", "place"]
+    STAGES = STEPS + ["grab_head", "grab_bed", "analysis", "ui", "motion", "dwell"]
+
+    def __init__(self, size = 1000, export_path = None, export_format = None):
+        self._records = collections.deque(maxlen = max(1, size))
+        self._export_path = export_path
+        self._export_format = export_format
+        self._lock = threading.Lock()
+        self._current = None
+        self._step = None
+        self._step_started = 0.0
+        self._pending_dwell = 0.0
+
+    # start recording the given part, the first step is the camera move
+    def start(self, partnr):
+        with self._lock:
+            now = time.time()
+            self._current = dict((stage, 0.0) for stage in self.STAGES)
+            self._current["part"] = partnr
+            self._current["start"] = now
+            self._step = self.STEPS[0]
+            self._step_started = now
+            self._pending_dwell = 0.0
+
+    # the state machine moved on to the given step
+    def transition(self, step):
+        with self._lock:
+            if self._current is None:
+                return
+            now = time.time()
+            self._current[self._step] += now - self._step_started
+            self._step = step
+            self._step_started = now
+
+    def finish(self):
+        with self._lock:
+            record = self._current
+            if record is None:
+                return
+            now = time.time()
+            record[self._step] += now - self._step_started
+            record["total"] = now - record["start"]
+            self._records.append(record)
+            self._current = None
+        if self._export_format:
+            self._export(record)
+
+    def add(self, stage, duration):
+        with self._lock:
+            if self._current is not None:
+                self._current[stage] += duration
+                if stage == "dwell":
+                    self._pending_dwell += duration
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.add(stage, time.time() - started)
+
+    # wait for the printer, dwell times added since the last synchronization are not counted
+    def syncFinished(self, started):
+        with self._lock:
+            if self._current is not None:
+                self._current["motion"] += max(0.0, time.time() - started - self._pending_dwell)
+            self._pending_dwell = 0.0
+
+    # p50 and p95 of all stages over the buffered parts and the resulting throughput
+    def getSummary(self):
+        with self._lock:
+            records = list(self._records)
+        summary = dict(parts = len(records), parts_per_hour = 0.0, stages = {})
+        if not records:
+            return summary
+
+        totals = np.array([record["total"] for record in records])
+        summary["parts_per_hour"] = 3600.0 * len(records) / totals.sum() if totals.sum() > 0 else 0.0
+        for stage in self.STAGES + ["total"]:
+            durations = np.array([record[stage] for record in records])
+            summary["stages"][stage] = dict(p50 = float(np.percentile(durations, 50)),
+                                            p95 = float(np.percentile(durations, 95)))
+        return summary
+
+    def _export(self, record):
+        try:
+            if self._export_format == "csv":
+                columns = ["part", "start", "total"] + self.STAGES
+                with open(self._export_path, "ab") as f:
+                    writer = csv.writer(f)
+                    if f.tell() == 0:
+                        writer.writerow(columns)
+                    writer.writerow([record[column] for column in columns])
+            else:
+                with open(self._export_path, "a") as f:
+                    f.write(json.dumps(record, sort_keys = True) + "\n")
+        except IOError:
+            pass
@@ -0,0 +1,137 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+from collections import namedtuple
+
+from .TrayGeometry import TrayGeometry
+
+# Immutable, typed snapshots of the plugin settings. A snapshot is created once
+# after startup and replaced as a whole when the settings are saved, so the
+# pick and place process never has to query the settings manager for every part.
+
+CameraSettings = namedtuple("CameraSettings", ["x", "y", "z", "pxPerMM", "path", "binary_thresh", "grabScriptPath",
+                                               "backend", "device"])
+
+# the tray box is only detected in head camera images
+HeadCameraSettings = namedtuple("HeadCameraSettings", CameraSettings._fields + ("box_detection_levels",))
+
+VacnozzleSettings = namedtuple("VacnozzleSettings", ["x", "y", "z_pressure", "extruder_nr",
+                                                     "grip_vacuum_gcode", "release_vacuum_gcode",
+                                                     "lower_nozzle_gcode", "lift_nozzle_gcode"])
+
+XmlSettings = namedtuple("XmlSettings", ["header_lines", "cache_size"])
+
+VisionSettings = namedtuple("VisionSettings", ["timeout"])
+
+# dwell times in ms
+SyncSettings = namedtuple("SyncSettings", ["mode", "timeout", "position_tolerance",
+                                           "settle_dwell", "vacuum_dwell", "release_dwell"])
+
+BatchSettings = namedtuple("BatchSettings", ["enabled", "collect_timeout", "lookahead"])
+
+# kinematics profile of the MotionPlanner, feedrates in mm/min, heights in mm
+MotionSettings = namedtuple("MotionSettings", ["xy_feedrate", "z_feedrate", "approach_feedrate", "e_feedrate",
+                                               "safe_z", "z_hop"])
+
+# export: "", "csv" or "jsonl"
+TimingSettings = namedtuple("TimingSettings", ["buffer_size", "export"])
+
+# camera images in the UI, max_size in px
+PreviewSettings = namedtuple("PreviewSettings", ["max_size", "quality"])
+
+# quota in MB, max_age in days
+ImageLogSettings = namedtuple("ImageLogSettings", ["directory", "queue_size", "quota", "max_age", "jpeg_quality"])
+
+SettingsSnapshot = namedtuple("SettingsSnapshot", ["tray", "vacnozzle", "head", "bed", "image_logging", "xml", "vision",
+                                                   "sync", "batch", "motion", "timing", "preview", "image_log"])
+
+
+def createSnapshot(settings, tray = None):
+    # reuse the tray geometry if tray settings did not change
+    if tray is None:
+        tray = TrayGeometry(settings.get(["tray", "x"]),
+                            settings.get(["tray", "y"]),
+                            settings.get(["tray", "z"]),
+                            settings.get(["tray", "rows"]),
+                            settings.get(["tray", "columns"]),
+                            settings.get(["tray", "boxsize"]),
+                            settings.get(["tray", "rimsize"]))
+
+    vacnozzle = VacnozzleSettings(float(settings.get(["vacnozzle", "x"])),
+                                  float(settings.get(["vacnozzle", "y"])),
+                                  float(settings.get(["vacnozzle", "z_pressure"])),
+                                  int(settings.get(["vacnozzle", "extruder_nr"])),
+                                  tuple(settings.get(["vacnozzle", "grip_vacuum_gcode"]).splitlines()),
+                                  tuple(settings.get(["vacnozzle", "release_vacuum_gcode"]).splitlines()),
+                                  tuple(settings.get(["vacnozzle", "lower_nozzle_gcode"]).splitlines()),
+                                  tuple(settings.get(["vacnozzle", "lift_nozzle_gcode"]).splitlines()))
+
+    xml = XmlSettings(int(settings.get(["xml", "header_lines"])),
+                      int(settings.get(["xml", "cache_size"])))
+
+    vision = VisionSettings(float(settings.get(["vision", "timeout"])))
+
+    sync = SyncSettings(settings.get(["sync", "mode"]),
+                        float(settings.get(["sync", "timeout"])),
+                        float(settings.get(["sync", "position_tolerance"])),
+                        int(settings.get(["sync", "settle_dwell"])),
+                        int(settings.get(["sync", "vacuum_dwell"])),
+                        int(settings.get(["sync", "release_dwell"])))
+
+    batch = BatchSettings(bool(settings.get(["batch", "enabled"])),
+                          float(settings.get(["batch", "collect_timeout"])),
+                          bool(settings.get(["batch", "lookahead"])))
+
+    motion = MotionSettings(float(settings.get(["motion", "xy_feedrate"])),
+                            float(settings.get(["motion", "z_feedrate"])),
+                            float(settings.get(["motion", "approach_feedrate"])),
+                            float(settings.get(["motion", "e_feedrate"])),
+                            float(settings.get(["motion", "safe_z"])),
+                            float(settings.get(["motion", "z_hop"])))
+
+    timing = TimingSettings(int(settings.get(["timing", "buffer_size"])),
+                            settings.get(["timing", "export"]) or "")
+
+    preview = PreviewSettings(int(settings.get(["preview", "max_size"])),
+                              int(settings.get(["preview", "quality"])))
+
+    image_log = ImageLogSettings(settings.get(["image_log", "directory"]) or "",
+                                 int(settings.get(["image_log", "queue_size"])),
+                                 float(settings.get(["image_log", "quota"])),
+                                 float(settings.get(["image_log", "max_age"])),
+                                 int(settings.get(["image_log", "jpeg_quality"])))
+
+    return SettingsSnapshot(tray,
+                            vacnozzle,
+                            _createHeadCameraSettings(settings),
+                            _createCameraSettings(settings, "bed"),
+                            bool(settings.get(["camera", "image_logging"])),
+                            xml,
+                            vision,
+                            sync,
+                            batch,
+                            motion,
+                            timing,
+                            preview,
+                            image_log)
+
+
+def _createCameraSettings(settings, camera):
+    return CameraSettings(float(settings.get(["camera", camera, "x"])),
+                          float(settings.get(["camera", camera, "y"])),
+                          float(settings.get(["camera", camera, "z"])),
+                          float(settings.get(["camera", camera, "pxPerMM"])),
+                          settings.get(["camera", camera, "path"]),
+                          int(settings.get(["camera", camera, "binary_thresh"])),
+                          settings.get(["camera", camera, "grabScriptPath"]),
+                          settings.get(["camera", camera, "backend"]),
+                          settings.get(["camera", camera, "device"]))
+
+
+def _createHeadCameraSettings(settings):
+    return HeadCameraSettings(*(_createCameraSettings(settings, "head") +
+                                (int(settings.get(["camera", "head", "box_detection_levels"])),)))
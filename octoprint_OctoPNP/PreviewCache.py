@@ -0,0 +1,52 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import hashlib
+import threading
+
+import cv2
+import numpy as np
+
+# Downscaled JPEG previews of the last camera images for the UI. Every image is
+# encoded once when it is shown, the browsers load it from the preview route of the
+# plugin. Only the version of the preview is sent through the websocket.
+class PreviewCache():
+
+    def __init__(self, max_size = 640, quality = 80):
+        self._max_size = max_size
+        self._quality = quality
+        self._lock = threading.Lock()
+        self._previews = {}
+        self._version = 0
+
+    # image: BGR array or path to an image file.
+    # Returns the version of the new preview or None if the image can't be encoded.
+    def update(self, name, image):
+        if not isinstance(image, np.ndarray):
+            image = cv2.imread(image, cv2.IMREAD_COLOR)
+            if image is None:
+                return None
+
+        scale = float(self._max_size) / max(image.shape[0], image.shape[1])
+        if scale < 1:
+            image = cv2.resize(image, (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale))),
+                               interpolation = cv2.INTER_AREA)
+        ok, buf = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), self._quality])
+        if not ok:
+            return None
+        data = buf.tostring()
+        etag = hashlib.md5(data).hexdigest()
+
+        with self._lock:
+            self._version += 1
+            self._previews[name] = (self._version, etag, data)
+            return self._version
+
+    # returns (version, etag, jpeg data) of the last preview or None
+    def get(self, name):
+        with self._lock:
+            return self._previews.get(name)
@@ -0,0 +1,160 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import re
+import threading
+
+# Synchronizes the pick and place process with the printer. waitForMoves() queues
+# commands which complete only after all previous moves have been executed and invokes
+# the callback afterwards:
+#
+# position: M400 followed by M114. The firmware does not process the M114 before the
+#      moves are finished, so the position report is the confirmation. It is matched in
+#      the gcode received hook (onReceived) and compared to the expected target. The M114
+#      is tagged, reports of other M114 (e.g. OctoPrint's pause position) are ignored.
+# padding: M400 followed by "G4 P1" commands as clearance buffer and a M362, which is
+#      suppressed in the gcode sending hook (onSending). Works with every firmware, but
+#      adds the processing time of the padding to every step.
+#
+# getPosition() always uses the position report, in both modes, and returns the position.
+#
+# Without position report within the timeout the position is unconfirmed, the callback
+# is not invoked and expired() is called instead.
+class PrinterSync():
+
+    MODE_POSITION = "position"
+    MODE_PADDING  = "padding"
+
+    SYNC_COMMAND = "M362 OctoPNP"
+    PADDING = 10
+
+    # OctoPrint command tag of the M114 requested by the plugin
+    REPORT_TAG = "plugin:OctoPNP:position_report"
+
+    # position report of M114, e.g. "X:10.00 Y:20.00 Z:5.00 E:0.00 Count X:800 Y:1600 Z:2000"
+    POSITION_REPORT = re.compile(r"X:\s*(-?\d+(?:\.\d*)?)\s*Y:\s*(-?\d+(?:\.\d*)?)\s*Z:\s*(-?\d+(?:\.\d*)?)")
+
+    def __init__(self, printer, settings, logger = None):
+        self._printer = printer
+        self._settings = settings
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._pending = None
+
+    # new settings apply to the next synchronization
+    def setSettings(self, settings):
+        self._settings = settings
+
+    # callback() is invoked once all moves queued before are finished.
+    # target: expected [x, y] position, deviations are logged
+    # expired: invoked instead of the callback if the moves are not confirmed in time
+    def waitForMoves(self, callback, target = None, expired = None):
+        sync = _PendingSync(callback, target, expired)
+        with self._lock:
+            self._pending = sync
+
+        if self._settings.mode == self.MODE_PADDING:
+            self._printer.commands("M400")
+            self._printer.commands("G4 P1")
+            self._printer.commands("M400")
+            for i in range(self.PADDING):
+                self._printer.commands("G4 P1")
+            self._printer.commands(self.SYNC_COMMAND)
+        else:
+            self._requestReport(sync)
+
+    # callback([x, y, z]) is invoked with the reported position once all moves queued before are finished.
+    # expired: invoked instead of the callback if the position is not reported in time
+    def getPosition(self, callback, expired = None):
+        sync = _PendingSync(callback, None, expired)
+        sync.report = True
+        with self._lock:
+            self._pending = sync
+        self._requestReport(sync)
+
+    def _requestReport(self, sync):
+        if self._settings.timeout > 0:
+            sync.timer = threading.Timer(self._settings.timeout, self._expire, [sync])
+            sync.timer.daemon = True
+            sync.timer.start()
+        self._printer.commands("M400")
+        self._printer.commands("M114", tags = {self.REPORT_TAG})
+
+    # send commands after all moves are finished, dwell in ms before and after them
+    def sendSettled(self, commands, dwell_after):
+        self._printer.commands("M400")
+        self.dwell(self._settings.settle_dwell)
+        for line in commands:
+            self._printer.commands(line)
+        self.dwell(dwell_after)
+
+    def dwell(self, milliseconds):
+        if milliseconds > 0:
+            self._printer.commands("G4 P" + str(int(milliseconds)))
+
+    # to be called from the gcode sending hook with the tags of the command,
+    # returns True if the command is to be suppressed
+    def onSending(self, cmd, tags = None):
+        with self._lock:
+            sync = self._pending
+            if sync is None:
+                return False
+            if self._settings.mode != self.MODE_PADDING or sync.report:
+                # the next position report answers this request
+                if cmd.startswith("M114") and tags and self.REPORT_TAG in tags:
+                    sync.armed = True
+                return False
+            if cmd.strip() != self.SYNC_COMMAND:
+                return False
+            self._pending = None
+        self._complete(sync, None)
+        return True
+
+    # to be called from the gcode received hook
+    def onReceived(self, line):
+        with self._lock:
+            sync = self._pending
+            if sync is None or not sync.armed:
+                return
+            match = self.POSITION_REPORT.search(line)
+            if not match:
+                return
+            self._pending = None
+        self._complete(sync, [float(match.group(1)), float(match.group(2)), float(match.group(3))])
+
+    def _expire(self, sync):
+        with self._lock:
+            if self._pending is not sync:
+                return
+            self._pending = None
+        if self._logger: self._logger.info("No position report within " + str(self._settings.timeout) + "s")
+        if sync.expired:
+            sync.expired()
+
+    def _complete(self, sync, position):
+        if sync.timer:
+            sync.timer.cancel()
+        if position and sync.target and self._logger:
+            deviation = max(abs(position[0] - sync.target[0]), abs(position[1] - sync.target[1]))
+            if deviation > self._settings.position_tolerance:
+                self._logger.info("Reported position " + str(position[:2]) + " differs from target " + str(sync.target))
+        if sync.report:
+            sync.callback(position)
+        else:
+            sync.callback()
+
+
+class _PendingSync(object):
+    __slots__ = ("callback", "target", "expired", "report", "armed", "timer")
+
+    def __init__(self, callback, target, expired):
+        self.callback = callback
+        self.target = target
+        self.expired = expired
+        self.report = False
+        self.armed = False
+        self.timer = None
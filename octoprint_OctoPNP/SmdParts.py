@@ -5,23 +5,60 @@ __author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 
-import xml.etree.ElementTree as ET
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+import numpy as np
+
+# Compact record for a single part, shape and pads are packed into float arrays.
+# Destination and height are stored in the arrays of SmdParts at index row.
+class _Part(object):
+    __slots__ = ["row", "name", "box", "shape", "pads"]
+
+    def __init__(self, row, name, box, shape, pads):
+        self.row = row
+        self.name = name
+        self.box = box
+        self.shape = shape
+        self.pads = pads
+
 
 class SmdParts():
 
     def __init__(self):
         self._et = None
-        pass
-
-    def load(self, xmlstring):
-        self._et = ET.fromstring(xmlstring)
-        sane, msg = self._sanitize()
-        if not sane:
+        self._ids = []
+        self._parts = {}
+        self._destinations = np.zeros((0, 4))
+        self._heights = np.zeros(0)
+
+    # accepts either a XML string or an already parsed root element.
+    # sanitize can be disabled for data that has already been sanitized (e.g. cached parts)
+    def load(self, xml, sanitize = True):
+        if ET.iselement(xml):
+            self._et = xml
+        else:
+            self._et = ET.fromstring(xml)
+        sane, msg = True, ""
+        if sanitize:
+            sane, msg = self._sanitize()
+        if sane:
+            self._buildIndex()
+        else:
             self.unload()
         return sane, msg
 
     def unload(self):
         self._et = None
+        self._ids = []
+        self._parts = {}
+        self._destinations = np.zeros((0, 4))
+        self._heights = np.zeros(0)
+
+    # serialize the (sanitized) part description
+    def toString(self):
+        return ET.tostring(self._et)
 
     def isFileLoaded(self):
         if self._et is not None:
@@ -30,50 +67,80 @@ class SmdParts():
             return False
 
     def getPartCount(self):
-        count = 0
-        for elem in self._et.findall("./part"):
-            count += 1
-        return count
+        return len(self._ids)
 
 
     # returns a list of all available parts
     def getPartIds(self):
-        result = []
-        for elem in self._et.findall("./part"):
-            result.append(int(elem.get("id")))
-        return result
+        return list(self._ids)
 
     #return the nr of the box this part is supposed to be in
     def getPartPosition(self, partnr):
-        return int(self._et.find("./part[@id='" + str(partnr) + "']/position").get("box"))
+        return self._parts[int(partnr)].box
+
+    # returns the box numbers of the given parts (all parts if partnrs is None) as array
+    def getPartPositions(self, partnrs = None):
+        if partnrs is None:
+            partnrs = self._ids
+        return np.array([self._parts[int(partnr)].box for partnr in partnrs], dtype=np.int64)
 
     def getPartName(self, partnr):
-        return self._et.find("./part[@id='" + str(partnr) + "']").get("name")
+        return self._parts[int(partnr)].name
 
     def getPartHeight(self, partnr):
-        return float(self._et.find("./part[@id='" + str(partnr) + "']/size").get("height"))
+        return float(self._heights[self._parts[int(partnr)].row])
 
     def getPartShape(self, partnr):
-        result = []
-        if(self._et.find("./part[@id='" + str(partnr) + "']/shape") is not None):
-            for elem in self._et.find("./part[@id='" + str(partnr) + "']/shape"):
-                result.append([float(elem.get("x")), float(elem.get("y"))])
-        return result
+        return self._parts[int(partnr)].shape.tolist()
 
     def getPartPads(self, partnr):
-        result = []
-        if( self._et.find("./part[@id='" + str(partnr) + "']/pads") is not None):
-            for elem in self._et.find("./part[@id='" + str(partnr) + "']/pads"):
-                result.append([float(elem.get("x1")), float(elem.get("y1")), float(elem.get("x2")), float(elem.get("y2"))])
-        return result
+        return self._parts[int(partnr)].pads.tolist()
 
 
     def getPartDestination(self, partnr):
-        x = float(self._et.find("./part[@id='" + str(partnr) + "']/destination").get("x"))
-        y = float(self._et.find("./part[@id='" + str(partnr) + "']/destination").get("y"))
-        z = float(self._et.find("./part[@id='" + str(partnr) + "']/destination").get("z"))
-        orientation = float(self._et.find("./part[@id='" + str(partnr) + "']/destination").get("orientation"))
-        return [x, y, z, orientation]
+        return self._destinations[self._parts[int(partnr)].row].tolist()
+
+    # returns the destinations of the given parts as (n, 4) array
+    def getPartDestinations(self, partnrs):
+        return self._destinations[[self._parts[int(partnr)].row for partnr in partnrs]]
+
+    # Build the lookup structures for all getters once after loading, so every
+    # getter is a dictionary lookup instead of a XPath search over the whole tree.
+    # If a part id appears more than once, the first occurrence is used.
+    def _buildIndex(self):
+        self._ids = []
+        self._parts = {}
+        destinations = []
+        heights = []
+
+        for part in self._et.findall("./part"):
+            partnr = int(part.get("id"))
+            self._ids.append(partnr)
+            if partnr in self._parts:
+                continue
+
+            shape = []
+            if part.find("shape") is not None:
+                for elem in part.find("shape"):
+                    shape.append([float(elem.get("x")), float(elem.get("y"))])
+            pads = []
+            if part.find("pads") is not None:
+                for elem in part.find("pads"):
+                    pads.append([float(elem.get("x1")), float(elem.get("y1")), float(elem.get("x2")), float(elem.get("y2"))])
+
+            destination = part.find("destination")
+            destinations.append([float(destination.get("x")), float(destination.get("y")),
+                                 float(destination.get("z")), float(destination.get("orientation"))])
+            heights.append(float(part.find("size").get("height")))
+
+            self._parts[partnr] = _Part(len(heights) - 1,
+                                        part.get("name"),
+                                        int(part.find("position").get("box")),
+                                        np.array(shape, dtype=np.float64).reshape(-1, 2),
+                                        np.array(pads, dtype=np.float64).reshape(-1, 4))
+
+        self._destinations = np.array(destinations, dtype=np.float64).reshape(-1, 4)
+        self._heights = np.array(heights, dtype=np.float64)
 
     def _sanitize(self):
         result = True
@@ -0,0 +1,55 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import numpy as np
+
+# Precomputed geometry of the part tray. Boxes are numbered row by row,
+# starting with 1 at the [0,0] corner of the tray. The center of every box
+# is computed once and stored in a table, so lookups do not touch the settings.
+class TrayGeometry():
+
+    def __init__(self, x, y, z, rows, columns, boxsize, rimsize):
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+        self.rows = int(rows)
+        self.columns = int(columns)
+        self.boxsize = float(boxsize)
+        self.rimsize = float(rimsize)
+
+        # box centers for all rows x columns, index is box number - 1
+        self._centers = self._computeCenters(np.arange(1, self.rows * self.columns + 1))
+
+    # returns [row, col] of the given box
+    def getBoxRowCol(self, box):
+        return [(box - 1) // self.columns + 1, (box - 1) % self.columns + 1]
+
+    # get the position of the box (center of the box) relative to the [0,0] corner of the tray
+    def getBoxPosition(self, box):
+        if 1 <= box <= len(self._centers):
+            return self._centers[box - 1].tolist()
+        # boxes outside the configured tray are computed on the fly
+        return self._computeCenters(np.array([box]))[0].tolist()
+
+    # returns a (n, 3) array with the positions of all given boxes
+    def getBoxPositions(self, boxes):
+        boxes = np.asarray(boxes, dtype=np.int64)
+        result = np.empty((len(boxes), 3))
+        inside = (boxes >= 1) & (boxes <= len(self._centers))
+        result[inside] = self._centers[boxes[inside] - 1]
+        if not inside.all():
+            result[~inside] = self._computeCenters(boxes[~inside])
+        return result
+
+    def _computeCenters(self, boxes):
+        row = (boxes - 1) // self.columns + 1
+        col = (boxes - 1) % self.columns + 1
+        centers = np.empty((len(boxes), 3))
+        centers[:, 0] = (col - 1) * self.boxsize + self.boxsize / 2 + col * self.rimsize + self.x
+        centers[:, 1] = (row - 1) * self.boxsize + self.boxsize / 2 + row * self.rimsize + self.y
+        centers[:, 2] = self.z
+        return centers
@@ -0,0 +1,152 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import threading
+import time
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+# Runs camera capture and image analysis outside of OctoPrint's communication thread.
+# Jobs are queued and executed one after another by a single worker thread, the image
+# processing keeps state between the analysis and the result image. The callback of a
+# job receives the result of the job, or the fallback value if the job failed. The
+# timeout starts when the job is taken from the queue. If a job does not finish in time,
+# expired(stage) is invoked instead of the callback, or the callback receives the
+# fallback if the job has no expired handler. Results of expired jobs are dropped, so
+# every job completes exactly once.
+class VisionWorker():
+
+    def __init__(self, timeout = 30.0, logger = None):
+        self._queue = queue.Queue()
+        self._timeout = float(timeout)
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._timeouts = 0
+        self._errors = 0
+
+        self._thread = threading.Thread(target = self._run, name = "OctoPNP vision worker")
+        self._thread.daemon = True
+        self._thread.start()
+
+    # queue function(*args) for execution, callback(result) is invoked from the worker
+    # thread. expired(stage) or callback(fallback) is invoked from a timer thread if the
+    # job has expired, while the job itself may still be running.
+    def submit(self, stage, function, args, callback, fallback = None, expired = None):
+        self._queue.put(_Job(stage, function, args, callback, fallback, expired))
+
+    def getQueueDepth(self):
+        return self._queue.qsize()
+
+    # queue depth, number of expired and failed jobs and latencies per stage in seconds
+    def getStatistics(self):
+        with self._lock:
+            return dict(
+                queue_depth = self._queue.qsize(),
+                timeout = self._timeout,
+                timeouts = self._timeouts,
+                errors = self._errors,
+                stages = dict((stage, stats.toDict()) for stage, stats in self._stages.items())
+            )
+
+    # finish all queued jobs, then terminate the worker thread
+    def stop(self):
+        self._queue.put(None)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            started = time.time()
+            if self._timeout > 0:
+                job.timer = threading.Timer(self._timeout, self._expire, [job])
+                job.timer.daemon = True
+                job.timer.start()
+            try:
+                result = job.function(*job.args)
+            except Exception:
+                if self._logger: self._logger.exception("Vision job " + job.stage + " failed")
+                with self._lock:
+                    self._errors += 1
+                result = job.fallback
+            finished = time.time()
+
+            with self._lock:
+                if job.stage not in self._stages:
+                    self._stages[job.stage] = _StageStatistics()
+                self._stages[job.stage].add(started - job.submitted, finished - started)
+            self._complete(job, job.callback, result)
+
+    def _expire(self, job):
+        if job.expired:
+            completed = self._complete(job, job.expired, job.stage)
+        else:
+            completed = self._complete(job, job.callback, job.fallback)
+        if completed:
+            with self._lock:
+                self._timeouts += 1
+            if self._logger: self._logger.info("Vision job " + job.stage + " timed out after " + str(self._timeout) + "s")
+
+    # returns False if the job has already been completed
+    def _complete(self, job, callback, result):
+        with self._lock:
+            if job.done:
+                return False
+            job.done = True
+        if job.timer:
+            job.timer.cancel()
+        try:
+            callback(result)
+        except Exception:
+            if self._logger: self._logger.exception("Callback of vision job " + job.stage + " failed")
+        return True
+
+
+class _Job(object):
+    __slots__ = ("stage", "function", "args", "callback", "fallback", "expired", "submitted", "timer", "done")
+
+    def __init__(self, stage, function, args, callback, fallback, expired):
+        self.stage = stage
+        self.function = function
+        self.args = args
+        self.callback = callback
+        self.fallback = fallback
+        self.expired = expired
+        self.submitted = time.time()
+        self.timer = None
+        self.done = False
+
+
+class _StageStatistics(object):
+    __slots__ = ("count", "wait_total", "wait_max", "run_total", "run_max", "run_last")
+
+    def __init__(self):
+        self.count = 0
+        self.wait_total = self.wait_max = 0.0
+        self.run_total = self.run_max = self.run_last = 0.0
+
+    def add(self, wait, run):
+        self.count += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self.run_total += run
+        self.run_max = max(self.run_max, run)
+        self.run_last = run
+
+    def toDict(self):
+        return dict(
+            count = self.count,
+            wait_avg = self.wait_total / self.count,
+            wait_max = self.wait_max,
+            run_avg = self.run_total / self.count,
+            run_max = self.run_max,
+            run_last = self.run_last
+        )
@@ -0,0 +1,66 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__author__ = "Florens Wasserfall <wasserfall@kalanka.de>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import re
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+# Extracts the commented XML part description from a gcode file in a single pass.
+# Only comment lines are inspected and the XML is fed into an incremental parser
+# line by line, so the file is never held in memory and scanning stops as soon as
+# the closing </object> tag has been parsed.
+class XmlExtractor():
+
+    _TAG_PATTERN = re.compile("<.*>")
+
+    # header_lines: only scan the first n lines of a file, 0 scans the whole file
+    def __init__(self, header_lines = 0):
+        self.header_lines = header_lines
+
+    # Returns the root element of the XML data or None if the file contains no XML.
+    # Raises ET.ParseError for malformed XML.
+    def extract(self, path):
+        parser = None
+        wrapped = False
+
+        with open(path, 'r') as f:
+            for nr, line in enumerate(f):
+                if self.header_lines and nr >= self.header_lines:
+                    break
+
+                # cheap string tests first, most lines are plain gcode
+                if "<" not in line:
+                    continue
+                comment = line.find(";")
+                if comment < 0:
+                    continue
+                expression = self._TAG_PATTERN.search(line, comment)
+                if not expression:
+                    continue
+
+                fragment = expression.group()
+                if parser is None:
+                    parser = ET.XMLParser()
+                    #check for root node existence
+                    if not fragment.startswith("<object"):
+                        parser.feed("<object name=\"defaultpart\">\n")
+                        wrapped = True
+
+                parser.feed(fragment + "\n")
+
+                # everything we need has been parsed
+                if not wrapped and "</object>" in fragment:
+                    break
+
+        if parser is None:
+            return None
+
+        if wrapped:
+            parser.feed("\n</object>")
+        return parser.close()
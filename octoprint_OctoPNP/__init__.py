@@ -24,15 +24,30 @@ from __future__ import absolute_import
 import octoprint.plugin
 import flask
 import re
-from subprocess import call
 import os
 import time
-import datetime
-import base64
-import shutil
+import threading
+import cv2
+import numpy as np
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
 
 from .SmdParts import SmdParts
+from .XmlExtractor import XmlExtractor
+from .PartCache import PartCache
+from . import PnpSettings
 from .ImageProcessing import ImageProcessing
+from . import CameraCapture
+from .VisionWorker import VisionWorker
+from .PrinterSync import PrinterSync
+from .BatchPlanner import BatchPlanner
+from .MotionPlanner import MotionPlanner
+from .PlacementTimer import PlacementTimer
+from .PreviewCache import PreviewCache
+from .DebugImageLogger import DebugImageLogger
+from .CameraTilePlanner import CameraTilePlanner
 
 
 __plugin_name__ = "OctoPNP"
@@ -46,12 +61,15 @@ def __plugin_load__():
     __plugin_implementation__ = octopnp
 
     global __plugin_hooks__
-    __plugin_hooks__ = {'octoprint.comm.protocol.gcode.sending': octopnp.hook_gcode_sending, 'octoprint.comm.protocol.gcode.queuing': octopnp.hook_gcode_queuing}
+    __plugin_hooks__ = {'octoprint.comm.protocol.gcode.sending': octopnp.hook_gcode_sending, 'octoprint.comm.protocol.gcode.queuing': octopnp.hook_gcode_queuing,
+                        'octoprint.comm.protocol.gcode.received': octopnp.hook_gcode_received}
 
     global __plugin_helpers__
     __plugin_helpers__ = dict(
         get_head_camera_pxPerMM = octopnp._helper_get_head_camera_pxPerMM,
-        get_head_camera_image   = octopnp._helper_get_head_camera_image_xy # parameter: [x, y, callback, adjust_focus=True]
+        get_head_camera_image   = octopnp._helper_get_head_camera_image_xy, # parameter: [x, y, callback, adjust_focus=True]
+        get_head_camera_images  = octopnp._helper_get_head_camera_images_xy, # parameter: [positions, callback, finished=None, adjust_focus=True]
+        plan_head_camera_positions = octopnp._helper_plan_head_camera_positions # parameter: [toolpath, field_of_view, overlap=0.1, ordering="serpentine", start=None]
     )
 
 
@@ -69,7 +87,8 @@ class OctoPNP(octoprint.plugin.StartupPlugin,
     STATE_PLACE    = 3
     STATE_EXTERNAL = 9 # used if helper functions are called by external plugins
 
-    FEEDRATE = 4000.000
+    # XY target of a G0/G1 move
+    TRAVEL_MOVE = re.compile(r"G[01] .*X(-?\d+\.?\d*) .*Y(-?\d+\.?\d*)")
 
     smdparts = SmdParts()
 
@@ -79,12 +98,49 @@ class OctoPNP(octoprint.plugin.StartupPlugin,
 
         # store callback to send result of an image capture request back to caller
         self._helper_callback = None
+        # running multi shot request of the camera helper
+        self._externalShots = None
+        # reported position of the printhead before an external request and whether it was lifted
+        self._externalPosition = None
+        self._externalFocus = False
+
+        # batch mode: parts of consecutive M361 commands and the command following them
+        self._batchLock = threading.Lock()
+        self._batchParts = []
+        self._batchTimer = None
+        self._batchOrder = []
+        self._batchHeld = None
+        # planned and commanded travel of the running batch
+        self._batchPlanned = None
+        self._batchTravel = 0.0
+        self._batchPosition = None
+        # look-ahead inspection of the next tray box in a batch: part -> event, part -> offset.
+        # Written from the vision worker and timer threads, guarded by _batchLock.
+        self._lookaheadEvents = {}
+        self._lookaheadOffsets = {}
 
 
     def on_after_startup(self):
-        self.imgproc = ImageProcessing(float(self._settings.get(["tray", "boxsize"])), int(self._settings.get(["camera", "bed", "binary_thresh"])), int(self._settings.get(["camera", "head", "binary_thresh"])))
+        # immutable settings snapshot, replaced as a whole in on_settings_save
+        self._config = PnpSettings.createSnapshot(self._settings)
+        self.imgproc = self._createImageProcessing(self._config)
+        self._cameras = self._createCameras(self._config)
         #used for communication to UI
         self._pluginManager = octoprint.plugin.plugin_manager()
+        # cache for part descriptions of already known gcode files
+        self._partCache = PartCache(os.path.join(self.get_plugin_data_folder(), "partcache"), self._config.xml.cache_size * 1024 * 1024)
+        # image capture and analysis run outside of the printer communication thread
+        self._visionWorker = self._createVisionWorker(self._config)
+        # confirms that the printer has finished all moves before the next step
+        self._sync = PrinterSync(self._printer, self._config.sync, self._logger)
+        # generates the moves from the kinematics profile
+        self._motion = MotionPlanner(self._config.motion)
+        # durations of the pick and place stages of the last parts
+        self._timing = self._createTimer(self._config)
+        # downscaled camera images for the UI, served by getPreview
+        self._previews = self._createPreviewCache(self._config)
+        # writes images for debugging in the background if camera.image_logging is enabled
+        self._imageLogger = self._createImageLogger(self._config)
 
 
     def get_settings_defaults(self):
@@ -118,7 +174,10 @@ class OctoPNP(octoprint.plugin.StartupPlugin,
                     "pxPerMM": 50.0,
                     "path": "",
                     "binary_thresh": 150,
-                    "grabScriptPath": ""
+                    "grabScriptPath": "",
+                    "backend": "script", # script, opencv or replay
+                    "device": "0", # opencv device index or url, folder for replay
+                    "box_detection_levels": 0 # pyramid levels for the tray box detection, 0 = full resolution
                 },
                 "bed": {
                     "x": 0,
@@ -127,12 +186,82 @@ class OctoPNP(octoprint.plugin.StartupPlugin,
                     "pxPerMM": 50.0,
                     "path": "",
                     "binary_thresh": 150,
-                    "grabScriptPath": ""
+                    "grabScriptPath": "",
+                    "backend": "script", # script, opencv or replay
+                    "device": "0" # opencv device index or url, folder for replay
                 },
                 "image_logging": False
+            },
+            "xml": {
+                "header_lines": 0,
+                "cache_size": 10 # MB
+            },
+            "vision": {
+                "timeout": 30 # seconds until a pick and place step is stopped without vision result
+            },
+            "sync": {
+                "mode": "position", # position (M400 + M114) or padding (M400 + G4 P1 + M362)
+                "timeout": 60, # seconds to wait for the position report
+                "position_tolerance": 0.1, # mm, larger deviations of the reported position are logged
+                "settle_dwell": 1000, # ms before vacuum and nozzle commands
+                "vacuum_dwell": 1000, # ms after vacuum and nozzle commands
+                "release_dwell": 2000 # ms to release the part at the destination
+            },
+            "batch": {
+                "enabled": False, # place consecutive M361 parts in one optimized run
+                "collect_timeout": 2.0, # seconds without further command until a batch is started
+                "lookahead": False # image the tray box of the next part after picking the current one. The lowered nozzle with the part must clear the tray at camera focus height
+            },
+            "motion": {
+                "xy_feedrate": 4000, # mm/min
+                "z_feedrate": 4000,
+                "approach_feedrate": 1000, # lowering the nozzle onto a part or the destination
+                "e_feedrate": 4000, # rotation of the vacuum nozzle
+                "safe_z": 0, # absolute height for XY travel, 0 = lift only before moving up
+                "z_hop": 5 # relative lift if the current height is unknown
+            },
+            "timing": {
+                "buffer_size": 1000, # parts kept for the statistics
+                "export": "" # append the timing of every part to timing.csv or timing.jsonl in the plugin data folder: "", "csv" or "jsonl"
+            },
+            "preview": {
+                "max_size": 640, # px, longer side of the camera images shown in the UI
+                "quality": 80 # JPEG quality
+            },
+            "image_log": {
+                "directory": "", # day directories of the logged images, empty for "images" in the plugin data folder
+                "queue_size": 8, # images waiting to be written, further images are dropped
+                "quota": 500, # MB, 0 = unlimited
+                "max_age": 30, # days, 0 = unlimited
+                "jpeg_quality": 0 # 0 = PNG, 1-100 = JPEG
             }
         }
 
+    def on_settings_save(self, data):
+        octoprint.plugin.SettingsPlugin.on_settings_save(self, data)
+        # the tray geometry is only recomputed if tray settings have changed
+        tray = None if "tray" in data else self._config.tray
+        config = PnpSettings.createSnapshot(self._settings, tray)
+        # generate new imageProcessing object with updated settings
+        self.imgproc = self._createImageProcessing(config)
+        self._cameras = self._createCameras(config, self._cameras)
+        if config.vision != self._config.vision:
+            # queued jobs are finished by the old worker
+            self._visionWorker.stop()
+            self._visionWorker = self._createVisionWorker(config)
+        self._sync.setSettings(config.sync)
+        self._motion = MotionPlanner(config.motion)
+        if config.timing != self._config.timing:
+            self._timing = self._createTimer(config)
+        if config.preview != self._config.preview:
+            self._previews = self._createPreviewCache(config)
+        if config.image_log != self._config.image_log:
+            # queued images are dropped, the old logger finishes the image being written
+            # before the new one starts
+            self._imageLogger.stop(drop = True)
+            self._imageLogger = self._createImageLogger(config)
+        self._config = config
+
     def get_template_configs(self):
         return [
             dict(type="tab", template="OctoPNP_tab.jinja2", custom_bindings=True),
@@ -148,44 +277,81 @@ class OctoPNP(octoprint.plugin.StartupPlugin,
         )
 
     # Flask endpoint for the GUI to request camera images. Possible request parameters are "BED" and "HEAD".
+    # Returns the version of the new preview, the image is loaded from the preview endpoint.
     @octoprint.plugin.BlueprintPlugin.route("/camera_image", methods=["GET"])
     def getCameraImage(self):
         result = ""
         if "imagetype" in flask.request.values:
             camera = flask.request.values["imagetype"]
             if ((camera == "HEAD") or (camera == "BED")):
-                if self._grabImages(camera):
-                    imagePath = self._settings.get(["camera", camera.lower(), "path"])
-                    try:
-                        f = open(imagePath,"r")
-                        result = flask.jsonify(src="data:image/" + os.path.splitext(imagePath)[1] + ";base64,"+base64.b64encode(bytes(f.read())))
-                    except IOError:
-                        result = flask.jsonify(error="Unable to open Image after fetching. Image path: " + imagePath)
+                frame = self._grabImages(camera)
+                version = self._previews.update(camera, frame) if frame is not None else None
+                if version is not None:
+                    result = flask.jsonify(version=version)
                 else:
                     result = flask.jsonify(error="Unable to fetch image. Check octoprint log for details.")
         return flask.make_response(result, 200)
 
+    # Flask endpoint for the preview of the last "HEAD" or "BED" image. The version parameter
+    # of the url only distinguishes the images for the browser cache, the last preview is returned.
+    @octoprint.plugin.BlueprintPlugin.route("/preview/<camera>", methods=["GET"])
+    def getPreview(self, camera):
+        preview = self._previews.get(camera)
+        if preview is None:
+            return flask.make_response("", 404)
+        version, etag, data = preview
+        response = flask.make_response(data)
+        response.headers["Content-Type"] = "image/jpeg"
+        response.headers["Cache-Control"] = "no-cache"
+        response.set_etag(etag)
+        return response.make_conditional(flask.request)
+
+    # SimpleApi GET: state of the vision worker (queue depth, timeouts, latencies per stage)
+    # and p50/p95 durations of the pick and place stages with the resulting parts per hour
+    def on_api_get(self, request):
+        return flask.jsonify(vision = self._visionWorker.getStatistics(),
+                             timing = self._timing.getSummary())
+
     # Use the on_event hook to extract XML data every time a new file has been loaded by the user
     def on_event(self, event, payload):
         #extraxt part informations from inline xmly
         if event == "FileSelected":
             self._currentPart = None
-            xml = "";
-            f = open(payload.get("file"), 'r')
-            for line in f:
-                expression = re.search("<.*>", line)
-                if expression:
-                    xml += expression.group() + "\n"
-            if xml:
-                #check for root node existence
-                if not re.search("<object.*>", xml.splitlines()[0]):
-                    xml = "<object name=\"defaultpart\">\n" + xml + "\n</object>"
+            path = payload.get("file")
+
+            # known files are loaded from the cache without scanning and sanitizing them again
+            cached = self._partCache.get(path, self._config.xml.header_lines)
+            if cached:
+                try:
+                    self.smdparts.load(cached, sanitize = False)
+                    self._logger.info("Loaded information on %d parts for gcode file %s from cache", self.smdparts.getPartCount(), path)
+                except ET.ParseError as e:
+                    # corrupted cache entry, the gcode file is scanned again
+                    self._logger.info("Dropped unreadable cache entry of gcode file %s: %s", path, str(e))
+                    self._partCache.remove(path, self._config.xml.header_lines)
+                    cached = None
+            elif cached is not None:
+                self.smdparts.unload()
+            if cached is not None:
+                self._updateUI("FILE", "")
+                return
 
+            extractor = XmlExtractor(self._config.xml.header_lines)
+            try:
+                xml = extractor.extract(path)
+            except ET.ParseError as e:
+                self.smdparts.unload()
+                self._logger.info("XML parsing error: " + str(e))
+                self._updateUI("ERROR", "XML parsing error: " + str(e))
+                return
+
+            if xml is not None:
                 #parse xml data
                 sane, msg = self.smdparts.load(xml)
                 if sane:
                     #TODO: validate part informations against tray
-                    self._logger.info("Extracted information on %d parts from gcode file %s", self.smdparts.getPartCount(), payload.get("file"))
+                    self._logger.info("Extracted information on %d parts from gcode file %s", self.smdparts.getPartCount(), path)
+                    self._partCache.put(path, self._config.xml.header_lines, self.smdparts.toString())
                     self._updateUI("FILE", "")
                 else:
                     self._logger.info("XML parsing error: " + msg)
@@ -193,386 +359,686 @@ class OctoPNP(octoprint.plugin.StartupPlugin,
             else:
                 #gcode file contains no part information -> clear smdpart object
                 self.smdparts.unload()
+                self._partCache.put(path, self._config.xml.header_lines, "")
                 self._updateUI("FILE", "")
 
 
 
     """
     Use the gcode hook to interrupt the printing job on custom M361 commands.
+    In batch mode consecutive M361 commands are collected. The batch is placed as soon as
+    the next command is queued, this command is held back until all parts are placed.
     """
     def hook_gcode_queuing(self, comm_instance, phase, cmd, cmd_type, gcode, *args, **kwargs):
         if "M361" in cmd:
             if self._state == self.STATE_NONE:
-                self._state = self.STATE_PICK
-                command = re.search("P\d*", cmd).group() #strip the M361
-                self._currentPart = int(command[1:])
+                command = re.search(r"P\d*", cmd).group() #strip the M361
+                partnr = int(command[1:])
+
+                self._logger.info( "Received M361 command to place part: " + str(partnr))
+                # the print job has moved the head since the last part
+                self._motion.reset()
 
-                self._logger.info( "Received M361 command to place part: " + str(self._currentPart))
+                if self._config.batch.enabled:
+                    self._collectBatchPart(partnr)
+                    return (None,) # suppress command
 
                 # pause running printjob to prevent octoprint from sending new commands from the gcode file during the interactive PnP process
                 if self._printer.is_printing():
                     self._printer.pause_print()
 
-                self._updateUI("OPERATION", "pick")
-
-                self._logger.info( "Move camera to part: " + str(self._currentPart))
-                self._moveCameraToPart(self._currentPart)
-
-                self._printer.commands("M400")
-                self._printer.commands("G4 P1")
-                self._printer.commands("M400")
-                for i in range(10):
-                    self._printer.commands("G4 P1")
-
-                self._printer.commands("M362 OctoPNP")
-
+                self._startPart(partnr)
 
                 return (None,) # suppress command
             else:
                 self._logger.info( "ERROR, received M361 command while placing part: " + str(self._currentPart))
+        elif self._batchParts and self._state == self.STATE_NONE:
+            if self._startBatch(cmd):
+                return (None,) # suppress command, sent after the batch
+
+    def _startPart(self, partnr):
+        self._currentPart = partnr
+        self._state = self.STATE_PICK
+        self._timing.start(partnr)
+
+        self._updateUI("OPERATION", "pick")
+
+        # the tray box has already been imaged while the previous part was picked
+        with self._batchLock:
+            inspected = partnr in self._lookaheadEvents
+        if inspected:
+            self._nextStep()
+            return
+
+        self._logger.info( "Move camera to part: " + str(partnr))
+        target = self._moveCameraToPart(partnr)
+
+        self._waitForMoves(self._nextStep, target)
+
+    def _collectBatchPart(self, partnr):
+        with self._batchLock:
+            self._batchParts.append(partnr)
+            # start the batch if no other command follows, e.g. at the end of the file
+            if self._batchTimer:
+                self._batchTimer.cancel()
+            self._batchTimer = threading.Timer(self._config.batch.collect_timeout, self._startBatch)
+            self._batchTimer.daemon = True
+            self._batchTimer.start()
+
+    # place all collected parts with a single pause and resume of the printjob.
+    # held: command following the batch, sent after the last part
+    # returns False if the batch has already been started
+    def _startBatch(self, held = None):
+        with self._batchLock:
+            partnrs, self._batchParts = self._batchParts, []
+            if self._batchTimer:
+                self._batchTimer.cancel()
+                self._batchTimer = None
+        if not partnrs:
+            return False
+
+        # pause running printjob to prevent octoprint from sending new commands from the gcode file during the interactive PnP process
+        if self._printer.is_printing():
+            self._printer.pause_print()
+
+        # the order is planned by the vision worker instead of the printer communication
+        # thread. OctoPNP is busy from now on, the first part is started with the plan.
+        self._state = self.STATE_PICK
+        config = self._config
+        planner = BatchPlanner([config.head.x, config.head.y],
+                               [config.vacnozzle.x, config.vacnozzle.y],
+                               [config.bed.x, config.bed.y],
+                               config.batch.lookahead)
+        self._visionWorker.submit("batch", planner.plan,
+                                  [self._getTrayPosFromPartNrs(partnrs), self.smdparts.getPartDestinations(partnrs)],
+                                  lambda plan: self._placeBatch(partnrs, held, plan))
+        return True
+
+    # plan: order, planned and given travel of BatchPlanner.plan, None to place the parts in file order
+    def _placeBatch(self, partnrs, held, plan):
+        if plan is None:
+            order, planned, given = list(range(len(partnrs))), None, None
+            self._logger.info("Placing batch of %d parts in file order %s", len(partnrs), str(partnrs))
+        else:
+            order, planned, given = plan
+            self._logger.info("Placing batch of %d parts in order %s, planned travel %.1fmm (%.1fmm in file order)",
+                              len(partnrs), str([partnrs[i] for i in order]), planned, given)
+
+        self._batchOrder = [partnrs[i] for i in order]
+        self._batchHeld = held
+        with self._batchLock:
+            self._lookaheadEvents = {}
+            self._lookaheadOffsets = {}
+        self._batchPlanned = (planned, given)
+        self._batchTravel = 0.0
+        self._batchPosition = None
+        self._startPart(self._batchOrder.pop(0))
+
+    # sum up the XY travel of the commands sent during a batch
+    def _trackTravel(self, cmd):
+        match = self.TRAVEL_MOVE.match(cmd)
+        if match:
+            position = [float(match.group(1)), float(match.group(2))]
+            if self._batchPosition:
+                self._batchTravel += np.hypot(position[0] - self._batchPosition[0], position[1] - self._batchPosition[1])
+            self._batchPosition = position
+
+    def _finishBatch(self):
+        planned, given = self._batchPlanned
+        if planned is None:
+            message = "Batch placed in file order, %.1fmm commanded" % self._batchTravel
+        else:
+            message = "Batch placed, travel %.1fmm planned (%.1fmm expected saving to file order), %.1fmm commanded" \
+                      % (planned, given - planned, self._batchTravel)
+        self._logger.info(message)
+        self._updateUI("INFO", message)
+        self._batchPlanned = None
+
+        held, self._batchHeld = self._batchHeld, None
+        if held is not None:
+            self._printer.commands(held)
 
     """
-    This hook is designed as some kind of a "state machine". The reason is,
+    The pick and place process is designed as some kind of a "state machine". The reason is,
     that we have to circumvent the buffered gcode execution in the printer.
     To take a picture, the buffer must be emptied to ensure that the printer has executed all previous moves
-    and is now at the desired position. To achieve this, a M400 command is injected after the
-    camera positioning command, followed by a M362. This causes the printer to send the
-    next acknowledging ok not until the positioning is finished. Since the next command is a M362,
-    octoprint will call the gcode hook again and we are back in the game, iterating to the next state.
-    Since both, Octoprint and the printer firmware are using a queue, we inject some "G4 P1" commands
-    as a "clearance buffer". Those commands simply cause the printer to wait for a millisecond.
+    and is now at the desired position. To achieve this, the printer sync injects a M400 command after the
+    camera positioning command, followed by a M114. The printer executes the M114 not until the
+    positioning is finished, so the position report received in the gcode received hook
+    confirms the position and we are back in the game, iterating to the next state.
+    (see PrinterSync for the padding mode used with firmwares without a usable position report)
+
+    The next step only queues the image capture and analysis for the vision worker, since it
+    is called from octoprint's communication thread. The gcode of the next step, including the
+    next synchronization, is injected by the callback as soon as the result is available.
     """
 
     def hook_gcode_sending(self, comm_instance, phase, cmd, cmd_type, gcode, *args, **kwargs):
-        if "M362 OctoPNP" in cmd:
-            if self._state == self.STATE_PICK:
-                self._state = self.STATE_ALIGN
-                self._logger.info("Pick part " + str(self._currentPart))
-
-                # generate new imageProcessing object with updated settings
-                self.imgproc = ImageProcessing(float(self._settings.get(["tray", "boxsize"])), int(self._settings.get(["camera", "bed", "binary_thresh"])), int(self._settings.get(["camera", "head", "binary_thresh"])))
-
-                self._pickPart(self._currentPart)
-                self._printer.commands("M400")
-                self._printer.commands("G4 P1")
-                self._printer.commands("M400")
-
-                for i in range(10):
-                    self._printer.commands("G4 P1")
-
-                self._printer.commands("M362 OctoPNP")
-
-                return (None,) # suppress command
-
-            if self._state == self.STATE_ALIGN:
-                self._state = self.STATE_PLACE
-                self._logger.info("Align part " + str(self._currentPart))
+        if self._batchPlanned is not None:
+            self._trackTravel(cmd)
+        if self._sync.onSending(cmd, kwargs.get("tags")):
+            return (None,) # suppress command
 
-                self._alignPart(self._currentPart)
-                self._printer.commands("M400")
-                self._printer.commands("G4 P1")
-                self._printer.commands("M400")
+    def hook_gcode_received(self, comm_instance, line, *args, **kwargs):
+        self._sync.onReceived(line)
+        return line
 
-                for i in range(10):
-                    self._printer.commands("G4 P1")
+    def _nextStep(self):
+        partnr = self._currentPart
+        if self._state == self.STATE_PICK:
+            self._state = self.STATE_ALIGN
+            self._timing.transition("pick")
+            self._logger.info("Pick part " + str(partnr))
 
-                self._printer.commands("M362 OctoPNP")
+            self._visionWorker.submit("pick", self._locatePartInTray, [partnr],
+                                      lambda part_offset: self._pickPart(partnr, part_offset), [0, 0], self._visionExpired)
 
-                return (None,) # suppress command
-
-            if self._state == self.STATE_PLACE:
-                self._logger.info("Place part " + str(self._currentPart))
-
-                self._placePart(self._currentPart)
-                self._printer.commands("M400")
-                self._printer.commands("G4 P1")
-                self._printer.commands("M400")
-
-                for i in range(10):
-                    self._printer.commands("G4 P1")
+        elif self._state == self.STATE_ALIGN:
+            self._state = self.STATE_PLACE
+            self._timing.transition("align")
+            self._logger.info("Align part " + str(partnr))
 
-                self._logger.info("Finished placing part " + str(self._currentPart))
-                self._state = self.STATE_NONE
+            self._visionWorker.submit("align", self._measureOrientation, [partnr],
+                                      lambda orientation_offset: self._alignPart(partnr, orientation_offset), 0.0, self._visionExpired)
 
-                # resume paused printjob into normal operation
-                if self._printer.is_paused():
-                    self._printer.resume_print()
+        elif self._state == self.STATE_PLACE:
+            self._timing.transition("place")
+            self._logger.info("Place part " + str(partnr))
 
-                return (None,) # suppress command
+            self._visionWorker.submit("place", self._measurePlacement, [partnr],
+                                      lambda displacement: self._placePart(partnr, displacement), [0, 0], self._visionExpired)
 
         # handle camera positioning for external request (helper function)
-        if "M362 OctoPNP_camera_external" in cmd:
-            result = self._grabImages("HEAD")
-
-            # the current printjob is resumed and octoPNP is set into default state
-            # before returning the obtained image by callback to allow recursive executions
-            # of the camera_helper by 3. party plugins (the camera helper is triggered from within the callback method).
+        elif self._state == self.STATE_EXTERNAL:
+            if self._externalShots is not None:
+                self._visionWorker.submit("external", self._grabImages, ["HEAD"], self._returnExternalShot, None)
+            else:
+                self._visionWorker.submit("external", self._grabExternalImage, [], self._returnExternalImage, False)
 
-            # resume paused printjob into normal operation
-            if self._printer.is_paused():
-                self._printer.resume_print
+    # a vision step did not finish in time. The job may still be running, its result is dropped.
+    def _visionExpired(self, stage):
+        self._abortPlacement("Vision step " + stage + " of part " + str(self._currentPart) + " timed out, placement stopped")
 
-            # leave external state
-            self._state = self.STATE_NONE
+    # the printer did not confirm the moves in time, the camera position is unknown
+    def _syncExpired(self):
+        self._abortPlacement("Printer did not report its position within " + str(self._config.sync.timeout) + "s, placement stopped")
 
-            if result:
-                if self._helper_callback:
-                    self._helper_callback(self._settings.get(["camera", "head", "path"]))
-            else:
-                if self._helper_callback:
-                    self._helper_callback(False)
+    # Instead of continuing without correction or at an unconfirmed position the placement
+    # is stopped and the printjob stays paused. External plugins receive a failed result.
+    def _abortPlacement(self, message):
+        self._logger.info(message)
+        self._updateUI("ERROR", message)
 
-            if not self._helper_callback:
-                self._logger.info("Unable to return image to calling plugin, invalid callback")
+        if self._printer.is_printing():
+            self._printer.pause_print()
+        external = self._state == self.STATE_EXTERNAL
+        self._state = self.STATE_NONE
+        if external:
+            self._abortExternal()
+            return
 
-            # suppress the magic command (M365)
-            return (None,)
+        # the remaining parts of a batch are not placed, the command following the batch
+        # is sent as after a complete batch and executed when the printjob is resumed
+        self._batchOrder = []
+        self._batchPlanned = None
+        held, self._batchHeld = self._batchHeld, None
+        if held is not None:
+            self._printer.commands(held)
 
 
     def _moveCameraToPart(self, partnr):
         # switch to pimary extruder, since the head camera is relative to this extruder and the offset to PNP nozzle might not be known (firmware offset)
-        self._printer.commands("T0")
+        self._printer.commands(self._motion.toolChange(0))
         # move camera to part position
+        head = self._config.head
         tray_offset = self._getTrayPosFromPartNr(partnr) # get box position on tray
-        camera_offset = [tray_offset[0]-float(self._settings.get(["camera", "head", "x"])), tray_offset[1]-float(self._settings.get(["camera", "head", "y"])), float(self._settings.get(["camera", "head", "z"])) + tray_offset[2]]
-        cmd = "G1 X" + str(camera_offset[0]) + " Y" + str(camera_offset[1]) + " F" + str(self.FEEDRATE)
-        self._logger.info("Move camera to: " + cmd)
-        self._printer.commands("G91") # relative positioning
-        self._printer.commands("G1 Z5 F" + str(self.FEEDRATE)) # lift printhead
-        self._printer.commands("G90") # absolute positioning
-        self._printer.commands(cmd)
-        self._printer.commands("G1 Z" + str(camera_offset[2]) + " F" + str(self.FEEDRATE)) # lower printhead
-
+        camera_offset = [tray_offset[0]-head.x, tray_offset[1]-head.y, head.z + tray_offset[2]]
+        moves = self._motion.travel(*camera_offset)
+        self._logger.info("Move camera to: " + str(moves))
+        self._printer.commands(moves)
+        return camera_offset[:2]
+
+
+    # vision job of the pick step: offset of the part from the center of its tray box
+    def _locatePartInTray(self, partnr):
+        # use the look-ahead result if the tray box has already been imaged
+        with self._batchLock:
+            event = self._lookaheadEvents.pop(partnr, None)
+        if event is not None:
+            if event.wait(self._config.vision.timeout):
+                self._logger.info("Using look-ahead offset for part " + str(partnr))
+                with self._batchLock:
+                    return self._lookaheadOffsets.pop(partnr)
+            self._logger.info("No look-ahead offset for part " + str(partnr))
+            return [0, 0]
 
-    def _pickPart(self, partnr):
         # wait n seconds to make sure cameras are ready
         #time.sleep(1) # is that necessary?
 
-        part_offset = [0, 0]
-
         self._logger.info("Taking head picture NOW") # Debug output
 
         # take picture
-        if self._grabImages("HEAD"):
-            headPath = self._settings.get(["camera", "head", "path"])
+        frame = self._grabImages("HEAD")
+        if frame is None:
+            self._updateUI("ERROR", "Camera not ready")
+            return [0, 0]
+        return self._analyzeTrayBox(partnr, frame)
+
+    def _analyzeTrayBox(self, partnr, frame):
+        #update UI
+        self._updateUI("HEADIMAGE", frame)
+
+        #extract position information
+        with self._timing.measure("analysis"):
+            part_offset = self.imgproc.locatePartInBox(frame, True)
+        if not part_offset:
+            self._updateUI("ERROR", self.imgproc.getLastErrorMessage())
+            part_offset = [0, 0]
+        else:
+            # update UI
+            self._updateUI("HEADIMAGE", self.imgproc.getLastResultImage())
 
-            #update UI
-            self._updateUI("HEADIMAGE", headPath)
+            # Log image for debugging and documentation
+            self._saveDebugImage(partnr, "head", frame, self.imgproc.getLastResultImage())
 
-            #extract position information
-            part_offset = self.imgproc.locatePartInBox(headPath, True)
-            if not part_offset:
-                self._updateUI("ERROR", self.imgproc.getLastErrorMessage())
-                part_offset = [0, 0]
-            else:
-                # update UI
-                self._updateUI("HEADIMAGE", self.imgproc.getLastSavedImagePath())
+        return part_offset
 
-                # Log image for debugging and documentation
-                if self._settings.get(["camera", "image_logging"]): self._saveDebugImage(headPath)
-        else:
-            cm_x=cm_y=0
+    # vision job of the look-ahead: only the exposure needs the head to stand still,
+    # the analysis runs while the current part is moved to the bed camera
+    def _inspectNextTrayBox(self, partnr, nextnr, frame):
+        event = threading.Event()
+        with self._batchLock:
+            self._lookaheadEvents[nextnr] = event
+        # the head camera is relative to the primary extruder, switch back to the vacuum nozzle
+        self._printer.commands(self._motion.toolChange(self._config.vacnozzle.extruder_nr))
+        self._moveToBedCamera(partnr)
+
+        if frame is None:
             self._updateUI("ERROR", "Camera not ready")
+            offset = [0, 0]
+        else:
+            offset = self._analyzeTrayBox(nextnr, frame)
+        with self._batchLock:
+            self._lookaheadOffsets[nextnr] = offset
+        event.set()
 
+    def _pickPart(self, partnr, part_offset):
+        config = self._config
         self._logger.info("PART OFFSET:" + str(part_offset))
 
         tray_offset = self._getTrayPosFromPartNr(partnr)
-        vacuum_dest = [tray_offset[0]+part_offset[0]-float(self._settings.get(["vacnozzle", "x"])),\
-                         tray_offset[1]+part_offset[1]-float(self._settings.get(["vacnozzle", "y"])),\
-                         tray_offset[2]+self.smdparts.getPartHeight(partnr)-float(self._settings.get(["vacnozzle", "z_pressure"]))]
+        vacnozzle = config.vacnozzle
+        vacuum_dest = [tray_offset[0]+part_offset[0]-vacnozzle.x,\
+                         tray_offset[1]+part_offset[1]-vacnozzle.y,\
+                         tray_offset[2]+self.smdparts.getPartHeight(partnr)-vacnozzle.z_pressure]
 
         # move vac nozzle to part and pick
-        self._printer.commands("T" + str(self._settings.get(["vacnozzle", "extruder_nr"])))
-        cmd = "G1 X" + str(vacuum_dest[0]) + " Y" + str(vacuum_dest[1]) + " F" + str(self.FEEDRATE)
-        self._printer.commands(cmd)
-        self._printer.commands("G1 Z" + str(vacuum_dest[2]+10))
+        self._printer.commands(self._motion.toolChange(vacnozzle.extruder_nr))
+        self._printer.commands(self._motion.travel(vacuum_dest[0], vacuum_dest[1], vacuum_dest[2]+10))
         self._releaseVacuum()
         self._lowerVacuumNozzle()
-        self._printer.commands("G1 Z" + str(vacuum_dest[2]) + "F1000")
+        self._printer.commands(self._motion.approach(vacuum_dest[2]))
         self._gripVacuum()
-        self._printer.commands("G4 S1")
-        self._printer.commands("G1 Z" + str(vacuum_dest[2]+5) + "F1000")
+        self._printer.commands(self._motion.approach(vacuum_dest[2]+5))
+
+        # in a batch the head camera passes over the tray box of the next part on the way
+        # to the bed camera, the image is taken before the nozzle moves on. The vacuum nozzle
+        # stays lowered with the part at camera focus height, so the look-ahead is disabled by
+        # default and only suitable if the part clears the tray at this height.
+        if config.batch.lookahead and self._batchOrder:
+            nextnr = self._batchOrder[0]
+            target = self._moveCameraToPart(nextnr)
+            self._waitForMoves(lambda: self._visionWorker.submit("lookahead", self._grabImages, ["HEAD"],
+                lambda frame: self._inspectNextTrayBox(partnr, nextnr, frame)), target)
+        else:
+            self._moveToBedCamera(partnr)
+
+    def _moveToBedCamera(self, partnr):
+        config = self._config
+        vacnozzle = config.vacnozzle
 
         # move to bed camera
-        vacuum_dest = [float(self._settings.get(["camera", "bed", "x"]))-float(self._settings.get(["vacnozzle", "x"])),\
-                       float(self._settings.get(["camera", "bed", "y"]))-float(self._settings.get(["vacnozzle", "y"])),\
-                       float(self._settings.get(["camera", "bed", "z"]))+self.smdparts.getPartHeight(partnr)]
+        vacuum_dest = [config.bed.x-vacnozzle.x,\
+                       config.bed.y-vacnozzle.y,\
+                       config.bed.z+self.smdparts.getPartHeight(partnr)]
 
-        self._printer.commands("G1 X" + str(vacuum_dest[0]) + " Y" + str(vacuum_dest[1]) + " F"  + str(self.FEEDRATE))
-        self._printer.commands("G1 Z" + str(vacuum_dest[2]) + " F"  + str(self.FEEDRATE))
-        self._logger.info("Moving to bed camera: %s", cmd)
+        self._printer.commands(self._motion.travel(*vacuum_dest))
+        self._logger.info("Moving to bed camera: %s", vacuum_dest)
 
-    def _alignPart(self, partnr):
-        orientation_offset = 0
+        self._waitForMoves(self._nextStep, vacuum_dest[:2])
 
-        # find destination at the object
-        destination = self.smdparts.getPartDestination(partnr)
+    # vision job of the align step: orientation of the part on the vacuum nozzle
+    def _measureOrientation(self, partnr):
+        orientation_offset = 0
+        config = self._config
 
         # take picture
         self._logger.info("Taking bed align picture NOW")
-        bedPath = self._settings.get(["camera", "bed", "path"])
-        if self._grabImages("BED"):
+        frame = self._grabImages("BED")
+        if frame is not None:
             #update UI
-            self._updateUI("BEDIMAGE", bedPath)
+            self._updateUI("BEDIMAGE", frame)
 
             # get rotation offset
-            orientation_offset = self.imgproc.getPartOrientation(bedPath, float(self._settings.get(["camera", "bed", "pxPerMM"])), 0)
+            with self._timing.measure("analysis"):
+                orientation_offset = self.imgproc.getPartOrientation(frame, config.bed.pxPerMM, 0)
             if not orientation_offset:
                 self._updateUI("ERROR", self.imgproc.getLastErrorMessage())
                 orientation_offset = 0.0
             # update UI
-            self._updateUI("BEDIMAGE", self.imgproc.getLastSavedImagePath())
+            self._updateUI("BEDIMAGE", self.imgproc.getLastResultImage())
 
             # Log image for debugging and documentation
-            if self._settings.get(["camera", "image_logging"]): self._saveDebugImage(bedPath)
+            self._saveDebugImage(partnr, "align", frame, self.imgproc.getLastResultImage())
         else:
             self._updateUI("ERROR", "Camera not ready")
 
+        return orientation_offset
+
+    def _alignPart(self, partnr, orientation_offset):
+        # find destination at the object
+        destination = self.smdparts.getPartDestination(partnr)
+
         #rotate object
-        self._printer.commands("G92 E0")
-        self._printer.commands("G1 E" + str(destination[3]-orientation_offset) + " F" + str(self.FEEDRATE))
+        self._printer.commands(self._motion.rotate(destination[3]-orientation_offset))
+
+        self._waitForMoves(self._nextStep)
 
-    def _placePart(self, partnr):
+    # vision job of the place step: displacement of the part on the vacuum nozzle.
+    # A remaining orientation error is corrected before the displacement is measured again.
+    def _measurePlacement(self, partnr):
         displacement = [0, 0]
+        orientation_offset = 0.0
+        config = self._config
 
         # find destination at the object
         destination = self.smdparts.getPartDestination(partnr)
 
         # take picture to find part offset
         self._logger.info("Taking bed offset picture NOW")
-        bedPath = self._settings.get(["camera", "bed", "path"])
-        if self._grabImages("BED"):
+        frame = self._grabImages("BED")
+        if frame is not None:
 
-            orientation_offset = self.imgproc.getPartOrientation(bedPath, float(self._settings.get(["camera", "bed", "pxPerMM"])), destination[3])
-            if not orientation_offset:
-                self._updateUI("ERROR", self.imgproc.getLastErrorMessage())
+            # orientation and position are measured on the same image
+            with self._timing.measure("analysis"):
+                analysis = self.imgproc.analyzePart(frame, config.bed.pxPerMM, destination[3])
+            self._logger.info("Part analysis confidence: " + str(analysis.confidence))
+
+            orientation_offset = analysis.orientation
+            if orientation_offset is False:
+                self._updateUI("ERROR", "Unable to locate part for finding the orientation")
                 orientation_offset = 0.0
 
-            displacement = self.imgproc.getPartPosition(bedPath, float(self._settings.get(["camera", "bed", "pxPerMM"])))
-            if not displacement:
-                self._updateUI("ERROR", self.imgproc.getLastErrorMessage())
+            displacement = analysis.displacement
+            if displacement is False:
+                self._updateUI("ERROR", "Unable to locate part for correcting the position")
                 displacement = [0, 0]
 
             #update UI
-            self._updateUI("BEDIMAGE", self.imgproc.getLastSavedImagePath())
-			
+            self._updateUI("BEDIMAGE", self.imgproc.getLastResultImage())
+
             # Log image for debugging and documentation
-            if self._settings.get(["camera", "image_logging"]):
-                self._saveDebugImage(bedPath)
-            else:
-                self._updateUI("ERROR", "Camera not ready")
+            self._saveDebugImage(partnr, "place", frame, self.imgproc.getLastResultImage())
+        else:
+            self._updateUI("ERROR", "Camera not ready")
 
         self._logger.info("displacement - x: " + str(displacement[0]) + " y: " + str(displacement[1]))
 
+        # the placement has been stopped while the image was analyzed
+        if self._state != self.STATE_PLACE or self._currentPart != partnr:
+            return displacement
+
         # Double check whether orientation is now correct. Important on unreliable hardware...
         if(abs(orientation_offset) > 0.5):
             self._updateUI("INFO", "Incorrect alignment, correcting offset of " + str(-orientation_offset) + "°")
             self._logger.info("Incorrect alignment, correcting offset of " + str(-orientation_offset) + "°")
-            self._printer.commands("G92 E0")
-            self._printer.commands("G1 E" + str(-orientation_offset) + " F" + str(self.FEEDRATE))
+            self._printer.commands(self._motion.rotate(-orientation_offset))
             # wait a second to execute the rotation
             time.sleep(2)
             # take another image for UI
-            if self._grabImages("BED"):
+            frame = self._grabImages("BED")
+            if frame is not None:
 
-                displacement = self.imgproc.getPartPosition(bedPath, float(self._settings.get(["camera", "bed", "pxPerMM"])))
+                with self._timing.measure("analysis"):
+                    displacement = self.imgproc.getPartPosition(frame, config.bed.pxPerMM)
                 #update UI
-                self._updateUI("BEDIMAGE", self.imgproc.getLastSavedImagePath())
+                self._updateUI("BEDIMAGE", self.imgproc.getLastResultImage())
 
                 # Log image for debugging and documentation
-                if self._settings.get(["camera", "image_logging"]): self._saveDebugImage(bedPath)
+                self._saveDebugImage(partnr, "correction", frame, self.imgproc.getLastResultImage())
             else:
                 self._updateUI("ERROR", "Camera not ready")
 
+        return displacement
+
+    def _placePart(self, partnr, displacement):
+        config = self._config
+
+        # find destination at the object
+        destination = self.smdparts.getPartDestination(partnr)
+
         # move to destination
-        dest_z = destination[2]+self.smdparts.getPartHeight(partnr)-float(self._settings.get(["vacnozzle", "z_pressure"]))
-        cmd = "G1 X" + str(destination[0]-float(self._settings.get(["vacnozzle", "x"]))+displacement[0]) \
-              + " Y" + str(destination[1]-float(self._settings.get(["vacnozzle", "y"]))+displacement[1]) \
-              + " F" + str(self.FEEDRATE)
-        self._logger.info("object destination: " + cmd)
-        self._printer.commands("G1 Z" + str(dest_z+10) + " F" + str(self.FEEDRATE)) # lift printhead
-        self._printer.commands(cmd)
-        self._printer.commands("G1 Z" + str(dest_z))
+        dest_z = destination[2]+self.smdparts.getPartHeight(partnr)-config.vacnozzle.z_pressure
+        dest_x = destination[0]-config.vacnozzle.x+displacement[0]
+        dest_y = destination[1]-config.vacnozzle.y+displacement[1]
+        moves = self._motion.travel(dest_x, dest_y, dest_z+10)
+        self._logger.info("object destination: " + str(moves))
+        self._printer.commands(moves)
+        self._printer.commands(self._motion.approach(dest_z))
 
         #release part
         self._releaseVacuum()
-        self._printer.commands("G4 S2") #some extra time to make sure the part has released and the remaining vacuum is gone
-        self._printer.commands("G1 Z" + str(dest_z+10) + " F" + str(self.FEEDRATE)) # lift printhead again
+        self._dwell(config.sync.release_dwell) #some extra time to make sure the part has released and the remaining vacuum is gone
+        self._printer.commands(self._motion.travel(dest_x, dest_y, dest_z+10)) # lift printhead again
         self._liftVacuumNozzle()
 
+        self._waitForMoves(lambda: self._finishPart(partnr))
+
+    def _finishPart(self, partnr):
+        self._logger.info("Finished placing part " + str(partnr))
+        self._timing.finish()
+        if self._batchOrder:
+            self._startPart(self._batchOrder.pop(0))
+            return
+
+        self._state = self.STATE_NONE
+        if self._batchPlanned is not None:
+            self._finishBatch()
+
+        # resume paused printjob into normal operation
+        if self._printer.is_paused():
+            self._printer.resume_print()
+
+    # vision job of the camera helper: returns the image path or False
+    def _grabExternalImage(self):
+        frame = self._grabImages("HEAD")
+        if frame is None:
+            return False
+        # external plugins expect the image at the configured path
+        if self._config.head.backend != "script":
+            cv2.imwrite(self._config.head.path, frame)
+        return self._config.head.path
+
+    def _returnExternalImage(self, result):
+        # the current printjob is resumed and octoPNP is set into default state
+        # before returning the obtained image by callback to allow recursive executions
+        # of the camera_helper by 3. party plugins (the camera helper is triggered from within the callback method).
+
+        # move back and resume paused printjob into normal operation
+        self._endExternal()
+
+        if self._helper_callback:
+            self._helper_callback(result)
+        else:
+            self._logger.info("Unable to return image to calling plugin, invalid callback")
+
+    # hand the image of the current position of a multi shot request to the caller and
+    # move on to the next position. The printjob is resumed after the last one.
+    def _returnExternalShot(self, frame):
+        shots = self._externalShots
+        index = shots.index
+        if frame is not None:
+            shots.captured += 1
+        else:
+            shots.failed += 1
+
+        try:
+            shots.callback(index, shots.positions[index], frame)
+        except Exception:
+            self._logger.exception("Camera helper callback failed for position " + str(index))
+
+        shots.index += 1
+        if shots.index < len(shots.positions):
+            self._moveHeadCamera(*shots.positions[shots.index])
+            return
+
+        summary = self._externalSummary(shots)
+        self._logger.info("Captured %d of %d head camera images for external plugin in %.1fs", shots.captured, len(shots.positions), summary["duration"])
+
+        # as for single images the state is reset before the caller is informed
+        self._externalShots = None
+        self._endExternal()
+
+        if shots.finished:
+            shots.finished(summary)
+
+    # the printhead is moved back to the position before the external request, above
+    # the print first and lowered afterwards. Then the printjob is resumed from there.
+    def _endExternal(self):
+        self._restoreExternalPosition()
+        if self._printer.is_paused():
+            self._printer.resume_print()
+
+        # leave external state
+        self._state = self.STATE_NONE
+
+    def _restoreExternalPosition(self):
+        position, self._externalPosition = self._externalPosition, None
+        if position is None:
+            return
+        commands = self._motion.move(position[0], position[1])
+        if self._externalFocus:
+            commands += self._motion.lift(-self._config.head.z)
+        self._printer.commands(commands)
+
+    # an external request was stopped, the remaining positions are not visited.
+    # The printhead is moved back, but the printjob stays paused.
+    def _abortExternal(self):
+        self._restoreExternalPosition()
+        shots, self._externalShots = self._externalShots, None
+        if shots is None:
+            if self._helper_callback:
+                self._helper_callback(False)
+        elif shots.finished:
+            shots.finished(self._externalSummary(shots, True))
+
+    def _externalSummary(self, shots, aborted = False):
+        duration = time.time() - shots.started
+        return dict(
+            positions=len(shots.positions),
+            captured=shots.captured,
+            failed=shots.failed,
+            aborted=aborted,
+            duration=duration,
+            per_position=duration / max(1, shots.index)
+        )
+
     # get the position of the box (center of the box) containing part x relative to the [0,0] corner of the tray
     def _getTrayPosFromPartNr(self, partnr):
         partPos = self.smdparts.getPartPosition(partnr)
-        row = (partPos-1)/int(self._settings.get(["tray", "columns"]))+1
-        col = ((partPos-1)%int(self._settings.get(["tray", "columns"])))+1
+        row, col = self._config.tray.getBoxRowCol(partPos)
         self._logger.info("Selected object: %d. Position: box %d, row %d, col %d", partnr, partPos, row, col)
+        return self._config.tray.getBoxPosition(partPos)
+
+    # get the tray positions of several parts at once, returns a (n, 3) array
+    def _getTrayPosFromPartNrs(self, partnrs):
+        return self._config.tray.getBoxPositions(self.smdparts.getPartPositions(partnrs))
+
+    def _createVisionWorker(self, config):
+        return VisionWorker(config.vision.timeout, self._logger)
+
+    def _createTimer(self, config):
+        export = config.timing.export
+        path = os.path.join(self.get_plugin_data_folder(), "timing." + export) if export else None
+        return PlacementTimer(config.timing.buffer_size, path, export)
 
-        boxsize = float(self._settings.get(["tray", "boxsize"]))
-        rimsize = float(self._settings.get(["tray", "rimsize"]))
-        x = (col-1)*boxsize + boxsize/2 + col*rimsize + float(self._settings.get(["tray", "x"]))
-        y = (row-1)*boxsize + boxsize/2 + row*rimsize + float(self._settings.get(["tray", "y"]))
-        return [x, y, float(self._settings.get(["tray", "z"]))]
+    def _createImageLogger(self, config):
+        image_log = config.image_log
+        directory = image_log.directory or os.path.join(self.get_plugin_data_folder(), "images")
+        return DebugImageLogger(directory, image_log.queue_size, image_log.quota, image_log.max_age,
+                                image_log.jpeg_quality, self._logger)
+
+    def _createPreviewCache(self, config):
+        return PreviewCache(config.preview.max_size, config.preview.quality)
+
+    def _createImageProcessing(self, config):
+        return ImageProcessing(config.tray.boxsize, config.bed.binary_thresh, config.head.binary_thresh,
+                               config.head.box_detection_levels)
 
     def _gripVacuum(self):
-        self._printer.commands("M400")
-        self._printer.commands("M400")
-        self._printer.commands("G4 S1")
-        for line in self._settings.get(["vacnozzle", "grip_vacuum_gcode"]).splitlines():
-            self._printer.commands(line)
-        self._printer.commands("G4 S1")
+        self._sendSettled(self._config.vacnozzle.grip_vacuum_gcode)
 
     def _releaseVacuum(self):
-        self._printer.commands("M400")
-        self._printer.commands("M400")
-        self._printer.commands("G4 S1")
-        for line in self._settings.get(["vacnozzle", "release_vacuum_gcode"]).splitlines():
-            self._printer.commands(line)
-        self._printer.commands("G4 S1")
+        self._sendSettled(self._config.vacnozzle.release_vacuum_gcode)
 
     def _lowerVacuumNozzle(self):
-        self._printer.commands("M400")
-        self._printer.commands("M400")
-        self._printer.commands("G4 S1")
-        for line in self._settings.get(["vacnozzle", "lower_nozzle_gcode"]).splitlines():
-            self._printer.commands(line)
-        self._printer.commands("G4 S1")
+        self._sendSettled(self._config.vacnozzle.lower_nozzle_gcode)
 
     def _liftVacuumNozzle(self):
-        self._printer.commands("M400")
-        self._printer.commands("M400")
-        self._printer.commands("G4 S1")
-        for line in self._settings.get(["vacnozzle", "lift_nozzle_gcode"]).splitlines():
-            self._printer.commands(line)
-        self._printer.commands("G4 S1")
-
+        self._sendSettled(self._config.vacnozzle.lift_nozzle_gcode)
+
+    def _sendSettled(self, commands):
+        sync = self._config.sync
+        self._sync.sendSettled(commands, sync.vacuum_dwell)
+        self._timing.add("dwell", (sync.settle_dwell + sync.vacuum_dwell) / 1000.0)
+
+    def _dwell(self, milliseconds):
+        self._sync.dwell(milliseconds)
+        self._timing.add("dwell", milliseconds / 1000.0)
+
+    # wait until the printer has finished all moves, the waiting time is recorded as motion
+    def _waitForMoves(self, callback, target = None):
+        started = time.time()
+        def finished():
+            self._timing.syncFinished(started)
+            callback()
+        self._sync.waitForMoves(finished, target, self._syncExpired)
+
+    # Returns the captured frame as BGR array or None if the camera is not ready
     def _grabImages(self, camera):
-        result = True
-        grabScript = "";
-        if(camera == "HEAD"):
-            grabScript = self._settings.get(["camera", "head", "grabScriptPath"])
-        if(camera == "BED"):
-            grabScript = self._settings.get(["camera", "bed", "grabScriptPath"])
-        #os.path.dirname(os.path.realpath(__file__)) + "/cameras/grab.sh"
+        frame = None
         try:
-            if call([grabScript]) != 0:
+            with self._timing.measure("grab_" + camera.lower()):
+                frame = self._cameras[camera].grab()
+            if frame is None:
                 self._logger.info("ERROR: " + camera + " camera not ready!")
-                result = False
         except:
-            self._logger.info("ERROR: Unable to execute " + camera + " camera grab script!")
-            self._logger.info("Script path: " + grabScript)
-            result = False
+            self._logger.info("ERROR: Unable to grab image from " + camera + " camera!")
+            if getattr(self._config, camera.lower()).backend == "script":
+                self._logger.info("Script path: " + getattr(self._config, camera.lower()).grabScriptPath)
+        return frame
+
+    # capture backends are kept open as long as the camera settings don't change
+    def _createCameras(self, config, cameras = None):
+        result = {}
+        for camera in ["HEAD", "BED"]:
+            settings = getattr(config, camera.lower())
+            if cameras and getattr(self._config, camera.lower()) == settings:
+                result[camera] = cameras[camera]
+            else:
+                if cameras:
+                    cameras[camera].close()
+                result[camera] = CameraCapture.createBackend(settings)
         return result
 
-    def _saveDebugImage(self, path):
-        name, ext = os.path.splitext(os.path.basename(path))
-        timestamp = datetime.datetime.fromtimestamp(time.time()).strftime('%Y-%m-%d-%H:%M:%S')
-        filename = "/" + name + "_" + timestamp + ext
-        dest_path = os.path.dirname(path) + filename
-        shutil.copy(path, dest_path)
-        self._logger.info("saved %s image to %s", name, dest_path)
+    # queue captured frame and annotated result of the given step for the image logger
+    def _saveDebugImage(self, partnr, step, frame, result_img = None):
+        if self._config.image_logging:
+            self._imageLogger.log(partnr, step, frame, result_img)
 
 
     def _updateUI(self, event, parameter):
+        started = time.time()
         data = dict(
             info="dummy"
         )
@@ -611,11 +1077,10 @@ class OctoPNP(octoprint.plugin.StartupPlugin,
             data = dict(
                 type = parameter,
             )
-        elif event is "HEADIMAGE" or event is "BEDIMAGE":
-            # open image and convert to base64
-            f = open(parameter,"r")
+        elif event == "HEADIMAGE" or event == "BEDIMAGE":
+            # only the version is sent, the browsers load the preview from getPreview
             data = dict(
-                src = "data:image/" + os.path.splitext(parameter)[1] + ";base64,"+base64.b64encode(bytes(f.read()))
+                version = self._previews.update(event[:-len("IMAGE")], parameter)
             )
 
         message = dict(
@@ -623,6 +1088,7 @@ class OctoPNP(octoprint.plugin.StartupPlugin,
             data=data
         )
         self._pluginManager.send_plugin_message("OctoPNP", message)
+        self._timing.add("ui", time.time() - started)
 
 
 
@@ -630,9 +1096,9 @@ class OctoPNP(octoprint.plugin.StartupPlugin,
     # Returns resolution for 'camera' (HEAD or BED).
     def _helper_get_head_camera_pxPerMM(self, camera):
         if camera == "HEAD":
-            return float(self._settings.get(["camera", "head", "pxPerMM"]))
+            return self._config.head.pxPerMM
         if camera == "BED":
-            return float(self._settings.get(["camera", "bed", "pxPerMM"]))
+            return self._config.bed.pxPerMM
         return 0.0
 
 
@@ -657,21 +1123,95 @@ class OctoPNP(octoprint.plugin.StartupPlugin,
 
             # store callback
             self._helper_callback = callback
-
-            target_position = [x-float(self._settings.get(["camera", "head", "x"])), y-float(self._settings.get(["camera", "head", "y"])), float(self._settings.get(["camera", "head", "z"]))]
-            cmd = "G1 X" + str(target_position[0]) + " Y" + str(target_position[1]) + " F" + str(self.FEEDRATE)
-            if adjust_focus:
-                self._printer.commands("G91") # relative positioning
-                self._printer.commands("G1 Z" + str(target_position[2]) + " F" + str(self.FEEDRATE)) # lift printhead
-                self._printer.commands("G90") # absolute positioning
-            self._printer.commands(cmd)
-
-            self._printer.commands("M400")
-            self._printer.commands("G4 P1")
-            self._printer.commands("M400")
-            self._printer.commands("M362 OctoPNP_camera_external")
+            self._startExternal(x, y, adjust_focus)
 
         else:
             self._logger.info("Abort, OctoPNP is busy (not in state NONE, current state: " + str(self._state) + ")")
 
         return result
+
+
+    # Helper function to provide camera access to other plugins.
+    # Takes a picture at each of the given x/y coordinates with a single pause of the
+    # printjob, e.g. to inspect a layer at the positions of plan_head_camera_positions.
+    # Each image is returned as soon as it is captured by invoking
+    # callback(index, [x, y], image) with the image as BGR array or None. After the last
+    # position the printhead is moved back, the printjob is resumed and finished(summary) is invoked with the
+    # number of positions, captured and failed images, duration and duration per position in s.
+    # If the printer does not confirm a move, the request is aborted and the printjob stays paused
+    # with the printhead moved back.
+    #
+    # adjust_focus: add camera focus distance to current z position once before the first shot
+    def _helper_get_head_camera_images_xy(self, positions, callback, finished=None, adjust_focus=True):
+        positions = [[float(position[0]), float(position[1])] for position in positions]
+
+        self._logger.info("Trying to take " + str(len(positions)) + " images for external plugin")
+
+        if not positions:
+            self._logger.info("Abort, no positions given")
+            return False
+        if self._state != self.STATE_NONE:
+            self._logger.info("Abort, OctoPNP is busy (not in state NONE, current state: " + str(self._state) + ")")
+            return False
+
+        self._state = self.STATE_EXTERNAL
+        if self._printer.is_printing(): # interrupt running printjobs to prevent octoprint from sending further gcode lines from the file
+            self._printer.pause_print()
+
+        self._externalShots = _ExternalShots(positions, callback, finished)
+        self._startExternal(positions[0][0], positions[0][1], adjust_focus)
+        return True
+
+    # the position of the printhead is recorded once the printer has finished the moves
+    # of the printjob, then the head camera is moved to the first position
+    def _startExternal(self, x, y, adjust_focus):
+        def recorded(position):
+            self._externalPosition = position
+            self._externalFocus = adjust_focus and self._config.head.z != 0
+            # the print job has moved the head
+            self._motion.reset()
+            if self._externalFocus:
+                self._liftHeadCamera()
+            self._moveHeadCamera(x, y)
+        self._externalPosition = None
+        self._sync.getPosition(recorded, self._syncExpired)
+
+    # lift the printhead by the camera focus distance
+    def _liftHeadCamera(self):
+        self._printer.commands(self._motion.lift(self._config.head.z))
+
+    # move the head camera above x/y, the image is taken in the next step
+    def _moveHeadCamera(self, x, y):
+        head = self._config.head
+        target_position = [x-head.x, y-head.y]
+        self._printer.commands(self._motion.move(*target_position))
+
+        self._waitForMoves(self._nextStep, target_position)
+
+
+    # Helper function to provide camera access to other plugins.
+    # Plans the head camera positions to inspect a toolpath, e.g. the moves of a layer.
+    # Only positions whose image contains a part of the toolpath are returned, in the
+    # order they should be passed to get_head_camera_images.
+    #
+    # toolpath: list of [x, y] in mm, field_of_view: [width, height] of the head camera image in mm
+    # ordering: "serpentine" or "tsp" for a shorter travel on sparse layers
+    # start: current [x, y] position, the tour begins at the closest position
+    def _helper_plan_head_camera_positions(self, toolpath, field_of_view, overlap=0.1, ordering=CameraTilePlanner.ORDER_SERPENTINE, start=None):
+        planner = CameraTilePlanner(field_of_view, overlap, ordering=ordering)
+        positions = planner.plan(toolpath, start)
+        self._logger.info("Planned " + str(len(positions)) + " head camera positions, travel " + str(round(planner.pathLength(positions, start), 1)) + "mm")
+        return positions.tolist()
+
+
+# progress of a multi shot request of the camera helper
+class _ExternalShots(object):
+
+    def __init__(self, positions, callback, finished):
+        self.positions = positions
+        self.callback = callback
+        self.finished = finished
+        self.index = 0
+        self.captured = 0
+        self.failed = 0
+        self.started = time.time()
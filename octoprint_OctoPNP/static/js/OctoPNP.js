@@ -82,10 +82,14 @@ $(function() {
                     self.stateString("INFO: \"" + data.data.type + "\"");
                 }
                 else if(data.event == "HEADIMAGE") {
-                    document.getElementById('headCameraImage').setAttribute( 'src', data.data.src );
+                    if(data.data.version) {
+                        document.getElementById('headCameraImage').setAttribute( 'src', PLUGIN_BASEURL + "OctoPNP/preview/HEAD?version=" + data.data.version );
+                    }
                 }
                 else if(data.event == "BEDIMAGE") {
-                    document.getElementById('bedCameraImage').setAttribute( 'src', data.data.src );
+                    if(data.data.version) {
+                        document.getElementById('bedCameraImage').setAttribute( 'src', PLUGIN_BASEURL + "OctoPNP/preview/BED?version=" + data.data.version );
+                    }
                 }
                 //self.debugvar("Plugin = OctoPNP");
             }
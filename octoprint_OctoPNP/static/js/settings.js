@@ -314,8 +314,8 @@ $(function() {
                 contentType: "application/json; charset=UTF-8",
                 //data: JSON.stringify(data),
                 success: function(response) {
-                    if(response.hasOwnProperty("src")) {
-                        self._drawImage(response.src);
+                    if(response.hasOwnProperty("version")) {
+                        self._drawImage(PLUGIN_BASEURL + "OctoPNP/preview/" + imagetype + "?version=" + response.version);
                     }
                     if(response.hasOwnProperty("error")) {
                         alert(response.error);
@@ -0,0 +1,162 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import collections
+import logging
+import os
+import re
+import sys
+import time
+
+import pytest
+
+# the plugin package is imported from the repository, OctoPrint has to be installed
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+UTILS = os.path.join(ROOT, "utils")
+GCODE_FILE = os.path.join(UTILS, "testfile_short.gcode")
+TESTIMAGES = os.path.join(UTILS, "testimages")
+
+
+# settings of the plugin as stored by OctoPrint
+class Settings():
+
+    def __init__(self, values):
+        self._values = values
+
+    def get(self, path):
+        value = self._values
+        for key in path:
+            value = value[key]
+        return value
+
+    # merge the data saved in the settings dialog
+    def update(self, data, values = None):
+        values = self._values if values is None else values
+        for key, value in data.items():
+            if isinstance(value, dict):
+                self.update(value, values[key])
+            else:
+                values[key] = value
+
+
+class PluginManager():
+
+    def __init__(self):
+        self.messages = []
+
+    def send_plugin_message(self, plugin, message):
+        self.messages.append(message)
+
+
+# Sends the commands through the gcode hooks of the plugin like OctoPrint does. The
+# printer executes moves instantly and answers M114 with the current position.
+class Printer():
+
+    MOVE = re.compile(r"([XYZ])(-?\d+\.?\d*)")
+
+    def __init__(self, plugin):
+        self._plugin = plugin
+        self._queue = collections.deque()
+        self.sent = []
+        self.position = [0.0, 0.0, 0.0]
+        self.relative = False
+        self.printing = True
+        self.paused = False
+
+    def commands(self, commands, tags = None):
+        if not isinstance(commands, list):
+            commands = [commands]
+        for cmd in commands:
+            if self._plugin.hook_gcode_queuing(None, "queuing", cmd, None, cmd.split(" ")[0], tags = tags) == (None,):
+                continue
+            self._queue.append((cmd, tags))
+
+    def is_printing(self):
+        return self.printing and not self.paused
+
+    def is_paused(self):
+        return self.paused
+
+    def pause_print(self):
+        self.paused = True
+
+    def resume_print(self):
+        self.paused = False
+
+    # send the next command, returns False if the queue is empty
+    def step(self):
+        if not self._queue:
+            return False
+        cmd, tags = self._queue.popleft()
+        if self._plugin.hook_gcode_sending(None, "sending", cmd, None, cmd.split(" ")[0], tags = tags) == (None,):
+            return True
+        self.sent.append(cmd)
+
+        code = cmd.split(" ")[0]
+        if code == "G90":
+            self.relative = False
+        elif code == "G91":
+            self.relative = True
+        elif code in ("G0", "G1"):
+            for axis, value in self.MOVE.findall(cmd):
+                i = "XYZ".index(axis)
+                self.position[i] = self.position[i] + float(value) if self.relative else float(value)
+        elif code == "M114":
+            self._plugin.hook_gcode_received(None, "X:%.2f Y:%.2f Z:%.2f E:0.00 Count X:0 Y:0 Z:0" % tuple(self.position))
+        return True
+
+    # send commands until until() is True, the vision worker runs in the background
+    def run(self, until, timeout = 10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.step():
+                continue
+            if until():
+                return True
+            time.sleep(0.001)
+        return False
+
+
+# starts plugins with the default settings, camera images are replayed from utils/testimages.
+# configure(values) can change the settings before the plugin is started.
+@pytest.fixture
+def startPlugin(tmpdir, monkeypatch):
+    import octoprint.plugin
+    import octoprint_OctoPNP
+
+    started = []
+
+    def start(configure = None):
+        octoprint_OctoPNP.__plugin_load__()
+        plugin = octoprint_OctoPNP.__plugin_implementation__
+
+        values = plugin.get_settings_defaults()
+        values["tray"]["boxsize"] = 15
+        for camera, image in [("head", "head_resistor_1206.png"), ("bed", "orientation_bed_resistor_1206_green.png")]:
+            values["camera"][camera]["backend"] = "replay"
+            values["camera"][camera]["device"] = os.path.join(TESTIMAGES, image)
+        values["camera"]["head"]["path"] = str(tmpdir.join("head.png"))
+        if configure:
+            configure(values)
+
+        data_folder = tmpdir.join("data").ensure(dir = True)
+        plugin_manager = PluginManager()
+        monkeypatch.setattr(octoprint.plugin, "plugin_manager", lambda *args, **kwargs: plugin_manager)
+        monkeypatch.setattr(octoprint.plugin.SettingsPlugin, "on_settings_save", lambda self, data: self._settings.update(data))
+        plugin._printer = Printer(plugin)
+        plugin._settings = Settings(values)
+        plugin._logger = logging.getLogger("octoprint.plugins.OctoPNP")
+        plugin.get_plugin_data_folder = lambda: str(data_folder)
+        plugin.on_after_startup()
+        started.append(plugin)
+        return plugin
+
+    yield start
+    for plugin in started:
+        plugin._visionWorker.stop()
+        plugin._imageLogger.stop()
@@ -0,0 +1,38 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import numpy as np
+import pytest
+
+from octoprint_OctoPNP.BatchPlanner import BatchPlanner
+
+
+# parts are placed where their tray box is, so the order only changes the travel between boxes
+def test_order_shortens_the_travel():
+    boxes = [[0, 0, 0], [100, 0, 0], [10, 0, 0]]
+    destinations = [[0, 0, 0, 0], [100, 0, 0, 0], [10, 0, 0, 0]]
+    order, planned, given = BatchPlanner([0, 0], [0, 0], [0, 0]).plan(boxes, destinations)
+    assert order in ([0, 2, 1], [1, 2, 0])
+    assert given - planned == pytest.approx(90.0)
+
+
+def test_single_part():
+    order, planned, given = BatchPlanner([0, 0], [0, 0], [50, 0]).plan([[10, 0, 0]], [[20, 0, 0, 0]])
+    assert order == [0]
+    assert planned == given
+
+
+@pytest.mark.parametrize("lookahead", [False, True])
+def test_never_worse_than_file_order(lookahead):
+    random = np.random.RandomState(1)
+    planner = BatchPlanner([20, 5], [-10, 3], [150, 80], lookahead)
+    for i in range(10):
+        count = random.randint(2, 12)
+        boxes = np.column_stack((random.uniform(0, 60, (count, 2)), np.zeros(count)))
+        destinations = np.column_stack((random.uniform(0, 200, (count, 2)), np.zeros((count, 2))))
+        order, planned, given = planner.plan(boxes, destinations)
+        assert sorted(order) == list(range(count))
+        assert planned <= given + 1e-9
@@ -0,0 +1,87 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import collections
+import os
+import stat
+
+import cv2
+import numpy as np
+import pytest
+
+from octoprint_OctoPNP import CameraCapture
+
+from conftest import TESTIMAGES
+
+# the fields of PnpSettings.CameraSettings used by createBackend
+Camera = collections.namedtuple("Camera", ["backend", "device", "grabScriptPath", "path"])
+
+
+def script(tmpdir, command):
+    path = tmpdir.join("grab.sh")
+    path.write("#!/bin/sh\n" + command + "\n")
+    path.chmod(stat.S_IRWXU)
+    return str(path)
+
+
+# frames filled with 0, 40, 80, ... in an MJPG video
+def video(tmpdir, frames):
+    path = str(tmpdir.join("camera.avi"))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 40, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        CameraCapture.CaptureBackend()
+
+
+def test_replay_folder_in_alphabetical_order():
+    backend = CameraCapture.ReplayCaptureBackend(TESTIMAGES)
+    files = sorted(f for f in os.listdir(TESTIMAGES) if f.endswith(".png") or f.endswith(".jpg"))
+    frames = [backend.grab() for i in range(len(files))]
+    for name, frame in zip(files, frames):
+        assert (frame == cv2.imread(os.path.join(TESTIMAGES, name))).all()
+    # starts over after the last image
+    assert (backend.grab() == frames[0]).all()
+
+
+def test_replay_missing_file():
+    assert CameraCapture.ReplayCaptureBackend(os.path.join(TESTIMAGES, "missing.png")).grab() is None
+
+
+def test_script_loads_the_written_image(tmpdir):
+    image = os.path.join(TESTIMAGES, "head_atmega_SO8.png")
+    path = str(tmpdir.join("head.png"))
+    backend = CameraCapture.ScriptCaptureBackend(script(tmpdir, "cp " + image + " " + path), path)
+    assert (backend.grab() == cv2.imread(image)).all()
+
+
+def test_failing_script(tmpdir):
+    backend = CameraCapture.ScriptCaptureBackend(script(tmpdir, "exit 1"), str(tmpdir.join("head.png")))
+    assert backend.grab() is None
+
+
+def test_opencv_drops_buffered_frames(tmpdir):
+    backend = CameraCapture.OpenCVCaptureBackend(video(tmpdir, 5), flush_frames = 2)
+    assert backend.grab().mean() == pytest.approx(80, abs = 2)
+    # end of the video, the device is opened again for the next frame
+    assert backend.grab() is None
+    assert backend.grab().mean() == pytest.approx(80, abs = 2)
+    backend.close()
+
+
+def test_opencv_missing_device(tmpdir):
+    assert CameraCapture.OpenCVCaptureBackend(str(tmpdir.join("missing.avi"))).grab() is None
+
+
+def test_create_backend(tmpdir):
+    assert isinstance(CameraCapture.createBackend(Camera("replay", TESTIMAGES, "", "")), CameraCapture.ReplayCaptureBackend)
+    assert isinstance(CameraCapture.createBackend(Camera("opencv", "0", "", "")), CameraCapture.OpenCVCaptureBackend)
+    assert isinstance(CameraCapture.createBackend(Camera("script", "", "grab.sh", "head.png")), CameraCapture.ScriptCaptureBackend)
@@ -0,0 +1,67 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import numpy as np
+import pytest
+
+from octoprint_OctoPNP.CameraTilePlanner import CameraTilePlanner
+
+
+# outline of a 100 x 60 mm rectangle with a diagonal
+TOOLPATH = [[0, 0], [100, 0], [100, 60], [0, 60], [0, 0], [100, 60]]
+
+
+# every point along the toolpath is inside at least one tile
+def assertCovered(toolpath, positions, fov):
+    toolpath = np.asarray(toolpath, dtype=np.float64)
+    for a, b in zip(toolpath[:-1], toolpath[1:]):
+        for t in np.linspace(0, 1, 50):
+            point = a + (b - a) * t
+            inside = np.all(np.abs(positions - point) <= fov / 2.0 + 1e-6, axis=1)
+            assert inside.any(), "point " + str(point) + " not covered"
+
+
+def test_empty_toolpath():
+    assert CameraTilePlanner(10).plan([]).shape == (0, 2)
+
+
+@pytest.mark.parametrize("ordering", [CameraTilePlanner.ORDER_SERPENTINE, CameraTilePlanner.ORDER_TSP])
+def test_toolpath_is_covered(ordering):
+    positions = CameraTilePlanner(10, 0.1, ordering = ordering).plan(TOOLPATH)
+    assertCovered(TOOLPATH, positions, 10)
+
+
+def test_empty_tiles_are_skipped():
+    # the bounding box of the L needs 10 x 6 tiles, the bottom row and the right column only
+    positions = CameraTilePlanner(10, 0.0).plan([[0, 0], [100, 0], [100, 60]])
+    assert len(positions) == 15
+    assert all(x == 95 or y == 5 for x, y in positions)
+
+
+def test_rectangular_field_of_view():
+    positions = CameraTilePlanner([20, 10], 0.0).plan([[0, 0], [100, 0]])
+    assertCovered([[0, 0], [100, 0]], positions, np.array([20, 10]))
+    assert len(positions) <= 6
+
+
+def test_tsp_is_not_longer_than_serpentine():
+    serpentine = CameraTilePlanner(10, 0.1)
+    tsp = CameraTilePlanner(10, 0.1, ordering = CameraTilePlanner.ORDER_TSP)
+    start = [50, 30]
+    assert tsp.pathLength(tsp.plan(TOOLPATH, start), start) <= serpentine.pathLength(serpentine.plan(TOOLPATH, start), start) + 1e-9
+
+
+def test_path_length():
+    planner = CameraTilePlanner(10)
+    assert planner.pathLength([[0, 0], [3, 4], [3, 10]]) == pytest.approx(11.0)
+    assert planner.pathLength([[3, 4]], [0, 0]) == pytest.approx(5.0)
+
+
+def test_plan_helper(startPlugin):
+    plugin = startPlugin()
+    positions = plugin._helper_plan_head_camera_positions(TOOLPATH, [10, 10], 0.1, "tsp", [50, 30])
+    assert isinstance(positions, list)
+    assertCovered(TOOLPATH, positions, 10)
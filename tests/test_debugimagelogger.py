@@ -0,0 +1,132 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import datetime
+import os
+import threading
+
+import numpy as np
+
+from octoprint_OctoPNP.DebugImageLogger import DebugImageLogger
+
+FRAME = np.zeros((20, 30, 3), np.uint8)
+
+
+# counts the scans of the image directories
+class CountingLogger(DebugImageLogger):
+
+    def __init__(self, *args, **kwargs):
+        self.evictions = 0
+        DebugImageLogger.__init__(self, *args, **kwargs)
+
+    def _evict(self):
+        self.evictions += 1
+        DebugImageLogger._evict(self)
+
+
+# writing the first image blocks until released
+class BlockingLogger(DebugImageLogger):
+
+    def __init__(self, *args, **kwargs):
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        DebugImageLogger.__init__(self, *args, **kwargs)
+
+    def _write(self, *args):
+        self.writing.set()
+        self.release.wait(5.0)
+        DebugImageLogger._write(self, *args)
+
+
+def day(days_ago):
+    return (datetime.date.today() - datetime.timedelta(days = days_ago)).strftime("%Y-%m-%d")
+
+
+def images(directory):
+    return sorted(os.path.join(path[len(directory) + 1:], name)
+                  for path, dirs, files in os.walk(directory) for name in files)
+
+
+def test_frame_and_result_are_written(tmpdir):
+    directory = str(tmpdir)
+    logger = DebugImageLogger(directory, jpeg_quality = 90)
+    assert logger.log(12, "head", FRAME, FRAME)
+    assert logger.log(13, "bed", FRAME)
+    logger.stop()
+
+    written = images(directory)
+    assert len(written) == 3
+    assert all(path.startswith(day(0) + os.sep) and path.endswith(".jpg") for path in written)
+    assert written[0].endswith("_part12_head.jpg")
+    assert written[1].endswith("_part12_head_result.jpg")
+    assert written[2].endswith("_part13_bed.jpg")
+    assert logger.getStatistics()["written"] == 2
+
+
+def test_eviction_by_age(tmpdir):
+    for days_ago in [0, 3, 10]:
+        tmpdir.join(day(days_ago), "093512-000000_part1_head.png").write("x", ensure = True)
+    tmpdir.join("notes.txt").write("kept")
+    tmpdir.join("calibration", "head.png").write("kept", ensure = True)
+
+    DebugImageLogger(str(tmpdir), max_age = 5).stop()
+    assert sorted(os.listdir(str(tmpdir))) == sorted([day(0), day(3), "calibration", "notes.txt"])
+
+
+def test_eviction_by_quota(tmpdir):
+    # 10 files of 100kB in two days
+    for i in range(10):
+        tmpdir.join(day(1 if i < 5 else 0), "09351%d-000000_part%d_head.png" % (i, i)).write("x" * 100 * 1024, ensure = True)
+
+    # the oldest images are removed until 90% of the quota are left
+    DebugImageLogger(str(tmpdir), quota = 0.5, max_age = 0).stop()
+    remaining = images(str(tmpdir))
+    assert [path.split("_")[1] for path in remaining] == ["part6", "part7", "part8", "part9"]
+    assert not tmpdir.join(day(1)).check()
+
+
+def test_images_above_the_quota_are_evicted(tmpdir):
+    logger = DebugImageLogger(str(tmpdir), quota = 0.001, max_age = 0)
+    for i in range(3):
+        logger.log(i, "head", np.random.RandomState(i).randint(0, 255, (40, 40, 3)).astype(np.uint8))
+    logger.stop()
+    # every image exceeds the quota alone
+    assert images(str(tmpdir)) == []
+
+
+def test_failed_writes_do_not_scan_for_every_image(tmpdir):
+    # the base directory can't be created
+    tmpdir.join("images").write("")
+    logger = CountingLogger(str(tmpdir.join("images")), queue_size = 100)
+    for i in range(DebugImageLogger.EVICTION_INTERVAL * 2):
+        logger.log(i, "head", FRAME)
+    logger.stop()
+    assert logger.getStatistics()["written"] == 0
+    # at startup and after every EVICTION_INTERVAL images
+    assert logger.evictions == 3
+
+
+def test_full_queue_drops_images(tmpdir):
+    logger = BlockingLogger(str(tmpdir), queue_size = 1)
+    assert logger.log(1, "head", FRAME)
+    assert logger.writing.wait(5.0)
+    assert logger.log(2, "head", FRAME)
+    assert not logger.log(3, "head", FRAME)
+    logger.release.set()
+    logger.stop()
+    assert logger.getStatistics() == dict(written = 2, dropped = 1, queue_depth = 0)
+
+
+def test_stop_drops_the_queued_images(tmpdir):
+    logger = BlockingLogger(str(tmpdir), queue_size = 4)
+    for i in range(4):
+        logger.log(i, "head", FRAME)
+    assert logger.writing.wait(5.0)
+    threading.Timer(0.1, logger.release.set).start()
+    logger.stop(drop = True)
+    # only the image being written is finished
+    assert logger.getStatistics() == dict(written = 1, dropped = 3, queue_depth = 0)
+    assert len(images(str(tmpdir))) == 1
@@ -0,0 +1,76 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import numpy as np
+
+from octoprint_OctoPNP import GCode_processor
+
+# two layers of T0, moves of T1 in between are not extracted, the last layer has too few moves
+GCODE = """T0
+G1 Z0.30
+G1 X1.00 Y1.00 E0.1
+G1 X2.00 Y1.00 E0.2
+G1 X2.00 Y2.00 E0.3
+T1
+G1 Z0.30
+G1 X50.00 Y50.00 E0.1
+G1 X51.00 Y50.00 E0.2
+G1 X51.00 Y51.00 E0.3
+T0
+G1 Z0.60
+G1 X3.00 Y3.00 E0.4
+G1 X4.00 Y3.00 E0.5
+G1 X4.00 Y4.00 E0.6
+G1 X3.00 Y4.00 E0.7
+G1 Z0.90
+G1 X5.00 Y5.00 E0.8
+"""
+
+
+def gcodeFile(tmpdir, name = "a.gcode"):
+    path = tmpdir.join(name)
+    path.write(GCODE)
+    return str(path)
+
+
+def test_scan_buffers_the_desired_extruder_only():
+    extractor = GCode_processor.CameraGCodeExtraction(0.3, "T0")
+    layers, z_values = extractor.scanGCode(GCODE.splitlines(True))
+    assert z_values == [0.3, 0.6, 0.9]
+    assert sorted(layers.keys()) == [("T0", 0.3), ("T0", 0.6), ("T0", 0.9)]
+    np.testing.assert_allclose(layers[("T0", 0.3)], [[1, 1], [2, 1], [2, 2]])
+    assert layers[("T0", 0.6)].dtype == np.float32
+
+
+def test_extract_from_file(tmpdir):
+    layers = GCode_processor.extractCameraGCodeFromFile(gcodeFile(tmpdir), 0.3, "T0")
+    assert len(layers) == 2
+    np.testing.assert_allclose(layers[1], [[3, 3], [4, 3], [4, 4], [3, 4]])
+
+
+def test_other_extruder(tmpdir):
+    layers = GCode_processor.extractCameraGCodeFromFile(gcodeFile(tmpdir), 0.3, "T1")
+    assert len(layers) == 1
+    np.testing.assert_allclose(layers[0], [[50, 50], [51, 50], [51, 51]])
+
+
+def test_layer_coordinates():
+    extractor = GCode_processor.CameraGCodeExtraction(0.3, "T0")
+    extractor.extractCameraGCode(GCODE.splitlines(True))
+    coordinates = extractor.getLayerCoordinates(0)
+    assert [(each.x, each.y) for each in coordinates] == [(1, 1), (2, 1), (2, 2)]
+    np.testing.assert_allclose(GCode_processor.toCoordinateArray(coordinates), extractor.getCoordList()[0])
+
+
+def test_extract_from_files(tmpdir):
+    files = [gcodeFile(tmpdir, "a.gcode"), gcodeFile(tmpdir, "b.gcode")]
+    sequential = GCode_processor.extractCameraGCodeFromFiles(files, 0.3, "T0", processes = 1)
+    parallel = GCode_processor.extractCameraGCodeFromFiles(files, 0.3, "T0", processes = 2)
+    assert len(parallel) == 2
+    for a, b in zip(sequential, parallel):
+        assert len(a) == len(b) == 2
+        for layer_a, layer_b in zip(a, b):
+            np.testing.assert_array_equal(layer_a, layer_b)
@@ -0,0 +1,66 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import math
+
+import pytest
+
+from octoprint_OctoPNP.MotionPlanner import MotionPlanner
+from octoprint_OctoPNP.PnpSettings import MotionSettings
+
+
+def planner(safe_z = 0.0, z_hop = 2.0):
+    return MotionPlanner(MotionSettings(6000.0, 600.0, 300.0, 1000.0, safe_z, z_hop))
+
+
+def test_z_hop_from_unknown_height():
+    assert planner().travel(10, 20, 5) == ["G91", "G1 Z2 F600", "G90", "G1 X10 Y20 F6000", "G1 Z5 F600"]
+
+
+def test_known_height():
+    motion = planner()
+    motion.travel(10, 20, 5)
+    assert motion.travel(10, 20, 5) == []
+    assert motion.travel(10, 20, 3) == ["G1 Z3 F600"]
+    assert motion.travel(30, 20, 4) == ["G1 Z4 F600", "G1 X30 Y20 F6000"]
+
+
+def test_safe_z():
+    motion = planner(safe_z = 10.0)
+    assert motion.travel(10, 20, 5) == ["G1 Z10 F600", "G1 X10 Y20 F6000", "G1 Z5 F600"]
+
+    # travel above the safe height is a single move, limited by the Z feedrate
+    commands = motion.travel(30, 20, 15)
+    assert commands[0] == "G1 Z10 F600"
+    assert commands[1].startswith("G1 X30 Y20 Z15 F")
+    feedrate = float(commands[1].split("F")[1])
+    assert feedrate == pytest.approx(600.0 * math.hypot(20, 5) / 5, abs = 1e-3)
+
+
+def test_tool_change_forgets_the_position():
+    motion = planner()
+    motion.travel(10, 20, 5)
+    assert motion.toolChange(2) == ["T2"]
+    assert motion.travel(10, 20, 5)[:3] == ["G91", "G1 Z2 F600", "G90"]
+
+
+def test_lift_move_approach_rotate():
+    motion = planner()
+    motion.travel(10, 20, 5)
+    assert motion.lift(8) == ["G91", "G1 Z8 F600", "G90"]
+    assert motion.move(12.5, 7.25) == ["G1 X12.5 Y7.25 F6000"]
+    assert motion.approach(1.5) == ["G1 Z1.5 F300"]
+    assert motion.rotate(-90) == ["G92 E0", "G1 E-90 F1000"]
+
+
+def test_estimate():
+    motion = planner()
+    assert motion.estimate(["G1 X60 F6000"]) == (1, pytest.approx(0.6))
+    assert motion.estimate(["G4 P500", "G4 S1"]) == (0, pytest.approx(1.5))
+    # relative moves and rotations of the part
+    moves, duration = motion.estimate(["G91", "G1 Z10 F600", "G1 Z-10", "G90", "G92 E0", "G1 E50 F1000"])
+    assert moves == 3
+    assert duration == pytest.approx(2.0 + 3.0)
@@ -0,0 +1,124 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+from octoprint_OctoPNP.PartCache import PartCache
+
+
+def gcodeFile(tmpdir, name, content = "G1 X1.0 Y1.0\n"):
+    path = tmpdir.join(name)
+    path.write(content)
+    return str(path)
+
+
+def test_miss_and_hit(tmpdir):
+    cache = PartCache(str(tmpdir.join("cache")), 1000)
+    path = gcodeFile(tmpdir, "a.gcode")
+    assert cache.get(path, 100) is None
+    cache.put(path, 100, "<object/>")
+    assert cache.get(path, 100) == "<object/>"
+
+
+def test_file_without_parts(tmpdir):
+    cache = PartCache(str(tmpdir.join("cache")), 1000)
+    path = gcodeFile(tmpdir, "a.gcode")
+    cache.put(path, 100, "")
+    assert cache.get(path, 100) == ""
+
+
+def test_missing_file(tmpdir):
+    cache = PartCache(str(tmpdir.join("cache")), 1000)
+    path = str(tmpdir.join("missing.gcode"))
+    cache.put(path, 100, "<object/>")
+    assert cache.get(path, 100) is None
+
+
+def test_modified_file_is_a_miss(tmpdir):
+    cache = PartCache(str(tmpdir.join("cache")), 1000)
+    path = gcodeFile(tmpdir, "a.gcode")
+    cache.put(path, 100, "<object/>")
+    gcodeFile(tmpdir, "a.gcode", "G1 X1.0 Y1.0\nG1 X2.0 Y2.0\n")
+    assert cache.get(path, 100) is None
+
+
+def test_header_lines_are_part_of_the_key(tmpdir):
+    cache = PartCache(str(tmpdir.join("cache")), 1000)
+    path = gcodeFile(tmpdir, "a.gcode")
+    cache.put(path, 100, "<object/>")
+    assert cache.get(path, 200) is None
+
+
+def test_hit_does_not_write_the_index(tmpdir):
+    folder = tmpdir.join("cache")
+    cache = PartCache(str(folder), 1000)
+    cache.put(gcodeFile(tmpdir, "a.gcode"), 100, "<a/>")
+    cache.put(gcodeFile(tmpdir, "b.gcode"), 100, "<b/>")
+    index = folder.join(PartCache.INDEX_FILE).read()
+    assert cache.get(str(tmpdir.join("a.gcode")), 100) == "<a/>"
+    assert folder.join(PartCache.INDEX_FILE).read() == index
+
+
+def test_least_recently_used_entry_is_evicted(tmpdir):
+    cache = PartCache(str(tmpdir.join("cache")), 8)
+    a = gcodeFile(tmpdir, "a.gcode")
+    b = gcodeFile(tmpdir, "b.gcode")
+    c = gcodeFile(tmpdir, "c.gcode")
+    cache.put(a, 100, "<a/>")
+    cache.put(b, 100, "<b/>")
+    cache.get(a, 100)
+    cache.put(c, 100, "<c/>")
+    assert cache.get(a, 100) == "<a/>"
+    assert cache.get(b, 100) is None
+    assert cache.get(c, 100) == "<c/>"
+    assert cache.getSize() == 8
+
+
+def test_entry_larger_than_the_cache(tmpdir):
+    cache = PartCache(str(tmpdir.join("cache")), 8)
+    a = gcodeFile(tmpdir, "a.gcode")
+    b = gcodeFile(tmpdir, "b.gcode")
+    cache.put(a, 100, "<a/>")
+    cache.put(b, 100, "<object>too large</object>")
+    assert cache.get(b, 100) is None
+    assert cache.get(a, 100) is None
+    assert cache.getSize() == 0
+
+
+def test_remove(tmpdir):
+    folder = str(tmpdir.join("cache"))
+    cache = PartCache(folder, 1000)
+    a = gcodeFile(tmpdir, "a.gcode")
+    b = gcodeFile(tmpdir, "b.gcode")
+    cache.put(a, 100, "<a/>")
+    cache.put(b, 100, "<b/>")
+    cache.remove(a, 100)
+    assert cache.get(a, 100) is None
+    assert PartCache(folder, 1000).get(b, 100) == "<b/>"
+    assert PartCache(folder, 1000).get(a, 100) is None
+
+
+def test_entries_survive_a_restart(tmpdir):
+    folder = str(tmpdir.join("cache"))
+    path = gcodeFile(tmpdir, "a.gcode")
+    PartCache(folder, 1000).put(path, 100, "<object/>")
+    assert PartCache(folder, 1000).get(path, 100) == "<object/>"
+
+
+def test_corrupted_index(tmpdir):
+    folder = tmpdir.join("cache")
+    folder.ensure(dir = True)
+    folder.join(PartCache.INDEX_FILE).write("{")
+    cache = PartCache(str(folder), 1000)
+    assert cache.getSize() == 0
+
+
+def test_clear(tmpdir):
+    folder = tmpdir.join("cache")
+    cache = PartCache(str(folder), 1000)
+    path = gcodeFile(tmpdir, "a.gcode")
+    cache.put(path, 100, "<object/>")
+    cache.clear()
+    assert cache.get(path, 100) is None
+    assert [f.basename for f in folder.listdir()] == [PartCache.INDEX_FILE]
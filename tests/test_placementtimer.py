@@ -0,0 +1,78 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import csv
+import json
+import time
+
+import pytest
+
+from octoprint_OctoPNP.PlacementTimer import PlacementTimer
+
+
+def place(timer, partnr, dwell = 0.0):
+    timer.start(partnr)
+    for step in PlacementTimer.STEPS[1:]:
+        timer.transition(step)
+    timer.add("dwell", dwell)
+    timer.finish()
+
+
+def test_ring_buffer_keeps_the_last_parts():
+    timer = PlacementTimer(3)
+    for partnr in range(1, 6):
+        place(timer, partnr, partnr)
+    assert [record["part"] for record in timer._records] == [3, 4, 5]
+    summary = timer.getSummary()
+    assert summary["parts"] == 3
+    assert summary["stages"]["dwell"]["p50"] == pytest.approx(4.0)
+
+
+def test_steps_add_up_to_the_total():
+    timer = PlacementTimer()
+    place(timer, 1)
+    record = timer._records[-1]
+    assert sum(record[step] for step in PlacementTimer.STEPS) == pytest.approx(record["total"])
+
+
+def test_dwell_is_not_counted_as_motion():
+    timer = PlacementTimer()
+    timer.start(1)
+    started = time.time()
+    timer.add("dwell", 60.0)
+    time.sleep(0.05)
+    timer.syncFinished(started)
+    # the dwell is only subtracted from the next wait
+    started = time.time()
+    time.sleep(0.05)
+    timer.syncFinished(started)
+    timer.finish()
+    assert timer._records[-1]["motion"] == pytest.approx(0.05, abs = 0.04)
+    assert timer._records[-1]["dwell"] == 60.0
+
+
+def test_without_parts():
+    summary = PlacementTimer().getSummary()
+    assert summary == dict(parts = 0, parts_per_hour = 0.0, stages = {})
+    # a part which has not been started is not recorded
+    timer = PlacementTimer()
+    timer.finish()
+    assert timer.getSummary()["parts"] == 0
+
+
+@pytest.mark.parametrize("export_format", ["csv", "jsonl"])
+def test_export(tmpdir, export_format):
+    path = str(tmpdir.join("timing." + export_format))
+    timer = PlacementTimer(1, path, export_format)
+    for partnr in range(1, 3):
+        place(timer, partnr)
+    with open(path) as f:
+        if export_format == "csv":
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f]
+    # the export is not limited by the ring buffer
+    assert [int(float(row["part"])) for row in rows] == [1, 2]
@@ -0,0 +1,99 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import os
+
+from conftest import GCODE_FILE
+
+
+def test_file_selected_uses_the_part_cache(startPlugin):
+    plugin = startPlugin()
+    plugin.on_event("FileSelected", dict(file = GCODE_FILE))
+    parts = plugin.smdparts.getPartCount()
+    assert parts > 0
+    assert plugin._partCache.get(GCODE_FILE, plugin._config.xml.header_lines)
+
+    plugin.smdparts.unload()
+    plugin.on_event("FileSelected", dict(file = GCODE_FILE))
+    assert plugin.smdparts.getPartCount() == parts
+
+
+def test_corrupted_cache_entry_is_parsed_again(startPlugin):
+    plugin = startPlugin()
+    plugin.on_event("FileSelected", dict(file = GCODE_FILE))
+    parts = plugin.smdparts.getPartCount()
+
+    folder = os.path.join(plugin.get_plugin_data_folder(), "partcache")
+    for name in os.listdir(folder):
+        if name.endswith(".xml"):
+            with open(os.path.join(folder, name), "w") as f:
+                f.write("<object><part")
+
+    plugin.smdparts.unload()
+    plugin.on_event("FileSelected", dict(file = GCODE_FILE))
+    assert plugin.smdparts.getPartCount() == parts
+    # the entry is replaced with the parts of the gcode file
+    assert plugin._partCache.get(GCODE_FILE, plugin._config.xml.header_lines).startswith("<object")
+
+
+def test_batch_is_placed_before_the_following_command(startPlugin):
+    plugin = startPlugin(lambda values: values["batch"].update(enabled = True))
+    plugin.on_event("FileSelected", dict(file = GCODE_FILE))
+    printer = plugin._printer
+
+    # every part waits 2s for the rotation
+    printer.commands(["M361 P1", "M361 P2", "G1 X0 Y0 Z10"])
+    assert printer.run(lambda: "G1 X0 Y0 Z10" in printer.sent)
+    assert printer.sent[-1] == "G1 X0 Y0 Z10"
+    assert plugin._state == plugin.STATE_NONE
+    assert not printer.paused
+    assert plugin._timing.getSummary()["parts"] == 2
+    assert any(message["event"] == "INFO" and message["data"]["type"].startswith("Batch placed")
+               for message in plugin._pluginManager.messages)
+
+
+def test_part_is_placed_at_the_approach_feedrate(startPlugin):
+    plugin = startPlugin(lambda values: values["motion"].update(approach_feedrate = 123))
+    plugin.on_event("FileSelected", dict(file = GCODE_FILE))
+    printer = plugin._printer
+
+    printer.commands("M361 P1")
+    assert printer.run(lambda: plugin._state == plugin.STATE_NONE and not printer.paused)
+    # the last move before the vacuum is finally released lowers the part onto the object
+    release = len(printer.sent) - printer.sent[::-1].index(plugin._config.vacnozzle.release_vacuum_gcode[0])
+    place = [cmd for cmd in printer.sent[:release] if cmd.startswith("G1")][-1]
+    assert place.startswith("G1 Z")
+    assert place.endswith(" F123")
+
+
+def test_head_camera_images_are_taken_at_each_position(startPlugin):
+    plugin = startPlugin(lambda values: values["camera"]["head"].update(x = 5, y = -3, z = 20))
+    printer = plugin._printer
+    printer.position = [50.0, 60.0, 5.0]
+    head = plugin._config.head
+
+    shots = []
+    summaries = []
+    def callback(index, position, image):
+        shots.append((index, position, image.shape, list(printer.position)))
+
+    assert plugin._helper_get_head_camera_images_xy([[10, 20], [30, 40]], callback, summaries.append)
+    # the printjob is paused once for all positions
+    assert printer.paused
+    assert printer.run(lambda: summaries)
+
+    frame = plugin._grabImages("HEAD").shape
+    # the camera is lifted by its focus distance once
+    assert shots == [(0, [10.0, 20.0], frame, [10.0 - head.x, 20.0 - head.y, 5.0 + head.z]),
+                     (1, [30.0, 40.0], frame, [30.0 - head.x, 40.0 - head.y, 5.0 + head.z])]
+    assert summaries[0]["positions"] == 2
+    assert summaries[0]["captured"] == 2
+    assert summaries[0]["failed"] == 0
+
+    # the printhead is moved back before the printjob is resumed
+    assert printer.run(lambda: printer.position == [50.0, 60.0, 5.0])
+    assert plugin._state == plugin.STATE_NONE
+    assert not printer.paused
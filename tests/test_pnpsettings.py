@@ -0,0 +1,71 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import pytest
+
+from octoprint_OctoPNP import OctoPNP, PnpSettings
+
+from conftest import Settings
+
+
+def defaults():
+    return Settings(OctoPNP().get_settings_defaults())
+
+
+def test_snapshot_of_the_defaults():
+    config = PnpSettings.createSnapshot(defaults())
+    assert config.tray.rows == 5
+    assert isinstance(config.head.pxPerMM, float)
+    assert isinstance(config.sync.settle_dwell, int)
+    assert config.vacnozzle.grip_vacuum_gcode == ("M340 P0 S1200",)
+    assert config.vacnozzle.lower_nozzle_gcode == ()
+
+
+def test_box_detection_levels_of_the_head_camera():
+    settings = defaults()
+    settings.update(dict(camera = dict(head = dict(box_detection_levels = "1"))))
+    config = PnpSettings.createSnapshot(settings)
+    assert config.head.box_detection_levels == 1
+    assert config.head.binary_thresh == config.bed.binary_thresh
+    assert "box_detection_levels" not in config.bed._fields
+
+
+def test_snapshot_is_immutable():
+    config = PnpSettings.createSnapshot(defaults())
+    with pytest.raises(AttributeError):
+        config.motion = None
+    with pytest.raises(AttributeError):
+        config.motion.xy_feedrate = 1.0
+
+
+def test_multi_line_gcode():
+    settings = defaults()
+    settings.update(dict(vacnozzle = dict(grip_vacuum_gcode = "M340 P0 S1200\nG4 P100")))
+    assert PnpSettings.createSnapshot(settings).vacnozzle.grip_vacuum_gcode == ("M340 P0 S1200", "G4 P100")
+
+
+def test_tray_geometry_is_reused():
+    settings = defaults()
+    tray = PnpSettings.createSnapshot(settings).tray
+    assert PnpSettings.createSnapshot(settings, tray).tray is tray
+
+
+def test_save_replaces_the_snapshot(startPlugin):
+    plugin = startPlugin()
+    config = plugin._config
+    worker = plugin._visionWorker
+
+    plugin.on_settings_save(dict(motion = dict(xy_feedrate = 1200)))
+    assert plugin._config is not config
+    assert plugin._config.motion.xy_feedrate == 1200.0
+    assert plugin._motion.move(10, 20) == ["G1 X10 Y20 F1200"]
+    # only the changed parts are created again
+    assert plugin._config.tray is config.tray
+    assert plugin._visionWorker is worker
+
+    plugin.on_settings_save(dict(tray = dict(rows = 2)))
+    assert plugin._config.tray is not config.tray
+    assert plugin._config.tray.rows == 2
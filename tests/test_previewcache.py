@@ -0,0 +1,66 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import os
+
+import cv2
+import flask
+import numpy as np
+
+from octoprint_OctoPNP.PreviewCache import PreviewCache
+
+from conftest import TESTIMAGES
+
+IMAGE = os.path.join(TESTIMAGES, "head_resistor_1206.png")
+
+
+def test_preview_is_downscaled():
+    previews = PreviewCache(200, 80)
+    assert previews.get("HEAD") is None
+    assert previews.update("HEAD", IMAGE) == 1
+    version, etag, data = previews.get("HEAD")
+    preview = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    assert max(preview.shape[:2]) == 200
+
+    # smaller images are not enlarged
+    assert previews.update("BED", np.zeros((50, 80, 3), np.uint8)) == 2
+    preview = cv2.imdecode(np.frombuffer(previews.get("BED")[2], np.uint8), cv2.IMREAD_COLOR)
+    assert preview.shape[:2] == (50, 80)
+
+
+def test_etag_changes_with_the_image():
+    previews = PreviewCache()
+    previews.update("HEAD", np.zeros((50, 80, 3), np.uint8))
+    etag = previews.get("HEAD")[1]
+    previews.update("HEAD", np.zeros((50, 80, 3), np.uint8))
+    assert previews.get("HEAD")[:2] == (2, etag)
+    previews.update("HEAD", np.full((50, 80, 3), 255, np.uint8))
+    assert previews.get("HEAD")[1] != etag
+
+
+def test_unreadable_image():
+    previews = PreviewCache()
+    assert previews.update("HEAD", os.path.join(TESTIMAGES, "missing.png")) is None
+    assert previews.get("HEAD") is None
+
+
+def test_preview_route(startPlugin):
+    plugin = startPlugin()
+    app = flask.Flask(__name__)
+    with app.test_request_context("/preview/HEAD"):
+        assert plugin.getPreview("HEAD").status_code == 404
+
+    plugin._previews.update("HEAD", IMAGE)
+    with app.test_request_context("/preview/HEAD"):
+        response = plugin.getPreview("HEAD")
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "image/jpeg"
+        etag = response.headers["ETag"]
+        assert response.get_data() == plugin._previews.get("HEAD")[2]
+
+    # the browser revalidates its cached preview
+    with app.test_request_context("/preview/HEAD", headers = {"If-None-Match": etag}):
+        assert plugin.getPreview("HEAD").status_code == 304
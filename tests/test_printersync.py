@@ -0,0 +1,107 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import time
+
+from octoprint_OctoPNP.PnpSettings import SyncSettings
+from octoprint_OctoPNP.PrinterSync import PrinterSync
+
+REPORT = "X:10.00 Y:20.00 Z:5.00 E:0.00 Count X:800 Y:1600 Z:2000"
+TAGS = {PrinterSync.REPORT_TAG}
+
+
+# records the commands, which are sent to the sync like octoprint does
+class Printer():
+
+    def __init__(self):
+        self.sent = []
+        self.tags = []
+
+    def commands(self, commands, tags = None):
+        self.sent.append(commands)
+        self.tags.append(tags)
+
+
+def sync(mode, timeout = 5.0):
+    printer = Printer()
+    return printer, PrinterSync(printer, SyncSettings(mode, timeout, 0.1, 1000, 0, 0))
+
+
+def test_position_report():
+    printer, printer_sync = sync(PrinterSync.MODE_POSITION)
+    finished = []
+    printer_sync.waitForMoves(lambda: finished.append(True), [10, 20])
+    assert printer.sent == ["M400", "M114"]
+    assert printer.tags[-1] == TAGS
+
+    # reports before the M114 has been sent answer an earlier request
+    printer_sync.onReceived(REPORT)
+    assert finished == []
+    assert not printer_sync.onSending("M114", TAGS)
+    printer_sync.onReceived("ok")
+    printer_sync.onReceived(REPORT)
+    printer_sync.onReceived(REPORT)
+    assert finished == [True]
+
+
+# e.g. OctoPrint's M400 + M114 to record the position when the print is paused
+def test_foreign_position_report_does_not_confirm():
+    printer, printer_sync = sync(PrinterSync.MODE_POSITION)
+    positions = []
+    printer_sync.getPosition(positions.append)
+
+    printer_sync.onSending("M400", {"trigger:comm.set_pause"})
+    printer_sync.onSending("M114", {"trigger:comm.set_pause"})
+    printer_sync.onReceived("X:1.00 Y:2.00 Z:3.00 E:0.00 Count X:80 Y:160 Z:1200")
+    printer_sync.onSending("M114")
+    printer_sync.onReceived("X:1.00 Y:2.00 Z:3.00 E:0.00 Count X:80 Y:160 Z:1200")
+    assert positions == []
+
+    printer_sync.onSending("M114", {"trigger:printer.commands", PrinterSync.REPORT_TAG})
+    printer_sync.onReceived(REPORT)
+    assert positions == [[10.0, 20.0, 5.0]]
+
+
+def test_padding():
+    printer, printer_sync = sync(PrinterSync.MODE_PADDING)
+    finished = []
+    printer_sync.waitForMoves(lambda: finished.append(True))
+    assert printer.sent[-1] == PrinterSync.SYNC_COMMAND
+    assert printer.sent.count("G4 P1") == PrinterSync.PADDING + 1
+    assert not printer_sync.onSending("G4 P1")
+    assert printer_sync.onSending(PrinterSync.SYNC_COMMAND)
+    assert finished == [True]
+
+
+def test_timeout_expires_without_callback():
+    printer, printer_sync = sync(PrinterSync.MODE_POSITION, 0.05)
+    finished = []
+    expired = []
+    printer_sync.waitForMoves(lambda: finished.append(True), expired = lambda: expired.append(True))
+    time.sleep(0.2)
+    printer_sync.onSending("M114", TAGS)
+    printer_sync.onReceived(REPORT)
+    assert finished == []
+    assert expired == [True]
+
+
+def test_get_position_in_both_modes():
+    for mode in [PrinterSync.MODE_POSITION, PrinterSync.MODE_PADDING]:
+        printer, printer_sync = sync(mode)
+        positions = []
+        printer_sync.getPosition(positions.append)
+        assert printer.sent == ["M400", "M114"]
+        printer_sync.onSending("M114", TAGS)
+        printer_sync.onReceived(REPORT)
+        assert positions == [[10.0, 20.0, 5.0]]
+
+
+def test_send_settled():
+    printer, printer_sync = sync(PrinterSync.MODE_POSITION)
+    printer_sync.sendSettled(["M340 P0 S1200"], 250)
+    assert printer.sent == ["M400", "G4 P1000", "M340 P0 S1200", "G4 P250"]
+    printer_sync.sendSettled(["M340 P0 S1500"], 0)
+    assert printer.sent[-1] == "M340 P0 S1500"
@@ -0,0 +1,89 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import numpy as np
+
+from octoprint_OctoPNP.SmdParts import SmdParts, ET
+from octoprint_OctoPNP.XmlExtractor import XmlExtractor
+
+from conftest import GCODE_FILE
+
+
+# the XPath lookups of the getters before the index was built at load time
+def xpathPart(et, partnr):
+    part = "./part[@id='" + str(partnr) + "']"
+    destination = et.find(part + "/destination")
+    return dict(
+        box = int(et.find(part + "/position").get("box")),
+        name = et.find(part).get("name"),
+        height = float(et.find(part + "/size").get("height")),
+        shape = [[float(elem.get("x")), float(elem.get("y"))] for elem in et.find(part + "/shape")],
+        pads = [[float(elem.get(a)) for a in ["x1", "y1", "x2", "y2"]] for elem in et.find(part + "/pads")],
+        destination = [float(destination.get(a)) for a in ["x", "y", "z", "orientation"]]
+    )
+
+
+def indexedPart(parts, partnr):
+    return dict(
+        box = parts.getPartPosition(partnr),
+        name = parts.getPartName(partnr),
+        height = parts.getPartHeight(partnr),
+        shape = parts.getPartShape(partnr),
+        pads = parts.getPartPads(partnr),
+        destination = parts.getPartDestination(partnr)
+    )
+
+
+def loadTestfile():
+    parts = SmdParts()
+    sane, msg = parts.load(XmlExtractor().extract(GCODE_FILE))
+    assert sane, msg
+    return parts
+
+
+def test_getters_match_the_xpath_lookups():
+    parts = loadTestfile()
+    et = ET.fromstring(parts.toString())
+    ids = [int(part.get("id")) for part in et.findall("./part")]
+    assert parts.getPartIds() == ids
+    assert parts.getPartCount() == len(ids)
+    for partnr in ids:
+        assert indexedPart(parts, partnr) == xpathPart(et, partnr)
+
+
+def test_array_getters():
+    parts = loadTestfile()
+    ids = parts.getPartIds()[::-1]
+    np.testing.assert_array_equal(parts.getPartPositions(ids), [parts.getPartPosition(partnr) for partnr in ids])
+    np.testing.assert_array_equal(parts.getPartDestinations(ids), [parts.getPartDestination(partnr) for partnr in ids])
+
+
+def test_cached_string_loads_without_sanitizing():
+    parts = loadTestfile()
+    cached = SmdParts()
+    cached.load(parts.toString(), sanitize = False)
+    for partnr in parts.getPartIds():
+        assert indexedPart(cached, partnr) == indexedPart(parts, partnr)
+
+
+def test_first_occurrence_of_an_id_is_used():
+    parts = SmdParts()
+    parts.load('<object name="a">'
+               '<part id="1" name="first"><position box="1"/><size height="1"/><destination x="1" y="2" z="3" orientation="0"/></part>'
+               '<part id="1" name="second"><position box="2"/><size height="2"/><destination x="4" y="5" z="6" orientation="0"/></part>'
+               '</object>')
+    assert parts.getPartName(1) == "first"
+    assert parts.getPartDestination(1) == [1.0, 2.0, 3.0, 0.0]
+    assert parts.getPartShape(1) == []
+
+
+def test_invalid_part_unloads():
+    parts = loadTestfile()
+    sane, msg = parts.load('<object name="a"><part id="1" name="R1"><position box="x"/></part></object>')
+    assert not sane
+    assert "box" in msg
+    assert not parts.isFileLoaded()
+    assert parts.getPartCount() == 0
@@ -0,0 +1,37 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import numpy as np
+
+from octoprint_OctoPNP.TrayGeometry import TrayGeometry
+
+
+# 2 rows of 3 boxes, 10mm boxes with 1mm rim, tray corner at [5, 7, 2]
+def tray():
+    return TrayGeometry(5, 7, 2, 2, 3, 10, 1)
+
+
+def test_box_row_col():
+    assert tray().getBoxRowCol(1) == [1, 1]
+    assert tray().getBoxRowCol(3) == [1, 3]
+    assert tray().getBoxRowCol(4) == [2, 1]
+
+
+def test_box_position():
+    assert tray().getBoxPosition(1) == [11.0, 13.0, 2.0]
+    assert tray().getBoxPosition(6) == [33.0, 24.0, 2.0]
+
+
+def test_box_outside_the_tray():
+    assert tray().getBoxPosition(7) == [11.0, 35.0, 2.0]
+
+
+def test_box_positions_match_single_lookups():
+    geometry = tray()
+    boxes = [4, 1, 7, 6]
+    positions = geometry.getBoxPositions(boxes)
+    assert positions.shape == (4, 3)
+    np.testing.assert_allclose(positions, [geometry.getBoxPosition(box) for box in boxes])
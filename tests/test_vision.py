@@ -0,0 +1,115 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from octoprint_OctoPNP import CameraCapture
+from octoprint_OctoPNP.ImageProcessing import ImageProcessing
+
+from conftest import TESTIMAGES
+
+
+def imageProcessing(head_binary_thresh = 150, box_detection_levels = 0):
+    im = ImageProcessing(15.0, 150, head_binary_thresh, box_detection_levels)
+    im._debug = False
+    im._interactive = False
+    return im
+
+
+# offset of the part in the tray box, measured by hand on the images (see benchmarks/VisionBenchmark.py)
+@pytest.mark.parametrize("image, expected", [
+    ("head_atmega_SO8.png", [0.84, 0.75]),
+    ("head_atmega_SO8_2.png", [-0.50, -0.22]),
+    ("head_large_component.png", [0.14, 0.57]),
+    ("head_led_1206.png", [0.62, -2.51]),
+    ("head_resistor_1206.png", [-3.35, 1.38]),
+    ("head_resistor_1206_2.png", [-2.33, 3.86])
+])
+def test_locate_part_in_box(image, expected):
+    frame = CameraCapture.ReplayCaptureBackend(os.path.join(TESTIMAGES, image)).grab()
+    assert imageProcessing().locatePartInBox(frame, False) == pytest.approx(expected, abs = 0.05)
+
+
+# the coarse-to-fine box detection has to find the same box as the full resolution detection
+@pytest.mark.parametrize("head_binary_thresh", [150, 180, 200])
+@pytest.mark.parametrize("image", sorted(name for name in os.listdir(TESTIMAGES) if name.startswith("head")))
+def test_box_detection_levels_match_the_full_resolution(image, head_binary_thresh):
+    frame = cv2.imread(os.path.join(TESTIMAGES, image))
+    reference = imageProcessing(head_binary_thresh).locatePartInBox(frame, True)
+    for levels in range(1, 4):
+        offset = imageProcessing(head_binary_thresh, levels).locatePartInBox(frame, True)
+        if reference is False:
+            assert offset is False
+        else:
+            assert offset == pytest.approx(reference, abs = 0.06)
+
+
+# at this threshold the box reaches the image border, where the downscaled image is inaccurate
+def test_box_at_the_image_border_is_detected_on_the_full_resolution():
+    frame = cv2.imread(os.path.join(TESTIMAGES, "head_atmega_SO8.png"))
+    im = imageProcessing(140, 1)
+    assert im._refineCoarseBox(frame, 1) is False
+    assert im.locatePartInBox(frame, True) == pytest.approx(imageProcessing(140).locatePartInBox(frame, True))
+
+
+def test_box_detection_levels_are_limited():
+    assert imageProcessing(box_detection_levels = 3).box_detection_levels == ImageProcessing.MAX_BOX_DETECTION_LEVELS
+
+
+
+@pytest.mark.parametrize("image", sorted(name for name in os.listdir(TESTIMAGES) if "bed" in name))
+def test_analyze_part_matches_the_single_measurements(image):
+    backend = CameraCapture.ReplayCaptureBackend(os.path.join(TESTIMAGES, image))
+    orientation = imageProcessing().getPartOrientation(backend.grab(), 55.65, 90)
+    position = imageProcessing().getPartPosition(backend.grab(), 55.65)
+
+    im = imageProcessing()
+    analysis = im.analyzePart(backend.grab(), 55.65, 90)
+    assert analysis.orientation == orientation
+    assert analysis.displacement == position
+    assert 0.0 < analysis.confidence <= 1.0
+    assert im.getLastResult().value == analysis
+
+
+
+# _maskBackground before the buffers were reused
+def maskBackground(im, img, mask_corners):
+    h, w, c = np.shape(img)
+    hsv = cv2.cvtColor(cv2.blur(img, (5, 5)), cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, im.lower_mask_color, im.upper_mask_color)
+    if mask_corners:
+        circle_mask = np.zeros((h, w), np.uint8)
+        circle_mask[:, :] = 255
+        cv2.circle(circle_mask, (w // 2, h // 2), min(w // 2, h // 2), 0, -1)
+        mask = cv2.bitwise_or(mask, circle_mask)
+    return mask
+
+
+@pytest.mark.parametrize("mask_corners", [True, False])
+def test_mask_matches_the_unbuffered_mask(mask_corners):
+    im = imageProcessing()
+    for name in sorted(os.listdir(TESTIMAGES)):
+        img = cv2.imread(os.path.join(TESTIMAGES, name))
+        # the buffers of another resolution in between
+        for frame in [img, cv2.resize(img, (320, 240)), img]:
+            assert (im._maskBackground(frame, mask_corners) == maskBackground(im, frame, mask_corners)).all()
+
+
+def test_mask_buffers_are_reused_per_resolution():
+    im = imageProcessing()
+    img = cv2.imread(os.path.join(TESTIMAGES, "bed_atmega_SO8.png"))
+    mask = im._maskBackground(img)
+    assert im._maskBackground(img.copy()) is mask
+
+    for size in range(ImageProcessing.MASK_BUFFER_COUNT):
+        im._maskBackground(cv2.resize(img, (100 + size * 10, 100)))
+    # the least recently used resolution is dropped
+    assert len(im._mask_buffers) == ImageProcessing.MASK_BUFFER_COUNT
+    assert im._maskBackground(img) is not mask
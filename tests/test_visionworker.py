@@ -0,0 +1,122 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import threading
+import time
+
+import pytest
+
+from octoprint_OctoPNP.VisionWorker import VisionWorker
+
+
+# collects the results of callbacks and expired handlers
+class Results(object):
+
+    def __init__(self):
+        self.values = []
+        self._event = threading.Event()
+
+    def __call__(self, value):
+        self.values.append(value)
+        self._event.set()
+
+    def wait(self, timeout = 5.0):
+        assert self._event.wait(timeout)
+        self._event.clear()
+
+
+@pytest.fixture
+def worker():
+    workers = []
+    def create(timeout = 30.0):
+        workers.append(VisionWorker(timeout))
+        return workers[-1]
+    yield create
+    for worker in workers:
+        worker.stop()
+
+
+def sleep(duration, value):
+    time.sleep(duration)
+    return value
+
+
+def fail():
+    raise IOError("camera disconnected")
+
+
+def test_callback_receives_the_result(worker):
+    vision = worker()
+    results = Results()
+    vision.submit("pick", sleep, [0.0, (1.0, 2.0)], results)
+    results.wait()
+    assert results.values == [(1.0, 2.0)]
+    assert vision.getStatistics()["stages"]["pick"]["count"] == 1
+
+
+def test_failed_job_returns_the_fallback(worker):
+    vision = worker()
+    results = Results()
+    vision.submit("align", fail, [], results, False)
+    results.wait()
+    assert results.values == [False]
+    assert vision.getStatistics()["errors"] == 1
+
+
+def test_expired_job_completes_once(worker):
+    vision = worker(0.1)
+    results = Results()
+    expired = Results()
+    vision.submit("place", sleep, [0.3, True], results, False, expired)
+    expired.wait()
+    assert expired.values == ["place"]
+
+    # the late result of the job is dropped
+    done = Results()
+    vision.submit("place", sleep, [0.0, True], done)
+    done.wait()
+    assert results.values == []
+    assert expired.values == ["place"]
+    assert vision.getStatistics()["timeouts"] == 1
+
+
+def test_expired_job_without_handler_returns_the_fallback(worker):
+    vision = worker(0.1)
+    results = Results()
+    vision.submit("pick", sleep, [0.3, True], results, False)
+    results.wait()
+    assert results.values == [False]
+
+    done = Results()
+    vision.submit("pick", sleep, [0.0, True], done)
+    done.wait()
+    assert results.values == [False]
+
+
+def test_timeout_starts_when_the_job_is_taken_from_the_queue(worker):
+    vision = worker(0.3)
+    results = Results()
+    expired = Results()
+    # the second job waits longer than the timeout in total, but runs shorter
+    for i in range(2):
+        vision.submit("pick", sleep, [0.2, i], results, False, expired)
+    results.wait()
+    results.wait()
+    assert results.values == [0, 1]
+    assert expired.values == []
+    statistics = vision.getStatistics()
+    assert statistics["timeouts"] == 0
+    assert statistics["stages"]["pick"]["wait_max"] >= 0.15
+
+
+def test_stop_finishes_the_queued_jobs():
+    vision = VisionWorker(0)
+    results = Results()
+    for i in range(3):
+        vision.submit("pick", sleep, [0.01, i], results)
+    vision.stop()
+    vision._thread.join(5.0)
+    assert results.values == [0, 1, 2]
@@ -0,0 +1,82 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+
+
+import os
+import re
+
+import pytest
+
+from octoprint_OctoPNP.XmlExtractor import XmlExtractor, ET
+
+GCODE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils", "testfile_short.gcode")
+
+PARTS = """;<part id="1" name="ATTINY">
+;  <position box="1"/>
+;  <destination x="100" y="90" z="2.75" orientation="90"/>
+;</part>
+"""
+
+
+# the regex scan of every line used before the XmlExtractor
+def regexScan(path):
+    xml = ""
+    with open(path, 'r') as f:
+        for line in f:
+            expression = re.search("<.*>", line)
+            if expression:
+                xml += expression.group() + "\n"
+    if not xml:
+        return None
+    if not re.search("<object.*>", xml.splitlines()[0]):
+        xml = "<object name=\"defaultpart\">\n" + xml + "\n</object>"
+    return ET.fromstring(xml)
+
+
+def assertSameTree(a, b):
+    assert ET.tostring(a) == ET.tostring(b)
+
+
+def gcodeFile(tmpdir, content):
+    path = tmpdir.join("a.gcode")
+    path.write(content)
+    return str(path)
+
+
+def test_matches_the_regex_scan():
+    assertSameTree(XmlExtractor().extract(GCODE_FILE), regexScan(GCODE_FILE))
+
+
+def test_parts_without_object_are_wrapped(tmpdir):
+    path = gcodeFile(tmpdir, "G28\n" + PARTS + "G1 X1.0 Y1.0\n")
+    root = XmlExtractor().extract(path)
+    assert root.get("name") == "defaultpart"
+    assertSameTree(root, regexScan(path))
+
+
+def test_stops_after_the_object(tmpdir):
+    # a second object would be a parse error for the old scan of the whole file
+    path = gcodeFile(tmpdir, ";<object name=\"a\">\n" + PARTS + ";</object>\n;<object name=\"b\">\n")
+    assert XmlExtractor().extract(path).get("name") == "a"
+
+
+def test_only_comments_are_scanned(tmpdir):
+    path = gcodeFile(tmpdir, "M117 <not a part>\n" + PARTS)
+    assert len(XmlExtractor().extract(path).findall("part")) == 1
+
+
+def test_file_without_xml(tmpdir):
+    assert XmlExtractor().extract(gcodeFile(tmpdir, "G28\nG1 X1.0 Y1.0\n")) is None
+
+
+def test_header_lines(tmpdir):
+    path = gcodeFile(tmpdir, "G28\n" * 10 + PARTS)
+    assert XmlExtractor(10).extract(path) is None
+    assert XmlExtractor(20).extract(path) is not None
+
+
+def test_malformed_xml(tmpdir):
+    with pytest.raises(ET.ParseError):
+        XmlExtractor().extract(gcodeFile(tmpdir, ";<object name=\"a\">\n;<part id=\"1\">\n;</object>\n"))